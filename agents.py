@@ -1,3 +1,4 @@
+import numpy as np
 from smolagents import Tool
 
 class SupplyTool(Tool):
@@ -13,6 +14,10 @@ class SupplyTool(Tool):
         supply = min(inventory, demand)
         return supply
 
+    def forward_batch(self, demand, inventory):
+        """forward() for arrays of demands and inventories, e.g. one per replica."""
+        return np.minimum(inventory, demand)
+
 class ManufactureTool(Tool):
     name = "manufacture_tool"
     description = "Manufactures goods based on raw materials and demand."
@@ -27,6 +32,10 @@ class ManufactureTool(Tool):
         production = min(capacity, raw_material, demand)
         return production
 
+    def forward_batch(self, raw_material, capacity, demand):
+        """forward() for arrays of inputs, e.g. one per replica."""
+        return np.minimum(np.minimum(capacity, raw_material), demand)
+
 class DistributeTool(Tool):
     name = "distribute_tool"
     description = "Distributes goods to retailers based on demand."
@@ -40,6 +49,10 @@ class DistributeTool(Tool):
         supply = min(inventory, demand)
         return supply
 
+    def forward_batch(self, inventory, demand):
+        """forward() for arrays of inventories and demands, e.g. one per replica."""
+        return np.minimum(inventory, demand)
+
 class RetailTool(Tool):
     name = "retail_tool"
     description = "Fulfills customer demand based on available stock."
@@ -51,4 +64,8 @@ class RetailTool(Tool):
 
     def forward(self, customer_demand: int, available_stock: int) -> int:
         fulfilled_demand = min(customer_demand, available_stock)
-        return fulfilled_demand
\ No newline at end of file
+        return fulfilled_demand
+
+    def forward_batch(self, customer_demand, available_stock):
+        """forward() for arrays of demands and stock levels, e.g. one per store."""
+        return np.minimum(customer_demand, available_stock)
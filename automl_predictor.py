@@ -1,31 +1,245 @@
 # automl_predictor.py
-import h2o
-import pandas as pd
-import joblib
+import json
+import os
+import threading
 
-import h2o
-from h2o.automl import H2OAutoML
-import pandas as pd
+import numpy as np
 
-# Initialize H2O (if not already running)
-if not h2o.connection():
-    h2o.init()
+from features import StateEncoder
+from profiling import current_timer
 
 # Define the paths to your saved model and vectorizer.
-# Update these paths as needed.
-MODEL_PATH = "./StackedEnsemble_BestOfFamily_1_AutoML_1_20250304_123221"
+# Update these paths as needed; PREDICTOR_MODEL_PATH points at another H2O
+# model, e.g. the leader `python createModel.py` saved.
+MODEL_PATH = os.environ.get("PREDICTOR_MODEL_PATH", "./StackedEnsemble_BestOfFamily_1_AutoML_1_20250304_123221")
 VECTORIZER_PATH = "tfidf_vectorizer.pkl"
+NUMPY_MODEL_PATH = "action_model.npz"
+
+# Scoring backend: "h2o" scores on the H2O cluster, "numpy" scores in-process
+# with the linear model exported by `python createModel.py --export-numpy`.
+BACKEND = os.environ.get("PREDICTOR_BACKEND", "h2o")
+
+# Feature encoding the model was trained on: "tfidf" for the legacy
+# "key=value, ..." text pipeline, "structured" for the fixed-schema
+# StateEncoder (`python createModel.py --encoder structured`).
+ENCODER = os.environ.get("PREDICTOR_ENCODER", "tfidf")
+
+
+class NumpyActionModel:
+    """Multinomial linear classifier scored with plain NumPy.
+
+    Stores one weight row and intercept per action; the predicted action
+    is the class with the highest score.
+    """
+
+    def __init__(self, coef, intercept, classes, encoder="tfidf"):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes = np.asarray(classes, dtype=str)
+        self.encoder = str(encoder)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"NumPy model not found at {path}; "
+                "export one with `python createModel.py --export-numpy`"
+            )
+        with np.load(path, allow_pickle=False) as data:
+            encoder = str(data["encoder"]) if "encoder" in data.files else "tfidf"
+            return cls(data["coef"], data["intercept"], data["classes"], encoder)
+
+    def save(self, path):
+        np.savez(path, coef=self.coef, intercept=self.intercept,
+                 classes=self.classes, encoder=self.encoder)
+
+    def predict(self, features):
+        """Predict actions for a (sparse or dense) feature matrix."""
+        scores = np.asarray(features @ self.coef.T) + self.intercept
+        return self.classes[np.argmax(scores, axis=1)].tolist()
+
+
+def model_encoder_path(model_path):
+    """Where createModel.py records the encoder an H2O model was trained on."""
+    return f"{model_path}.json"
+
+
+def save_model_encoder(model_path, encoder):
+    with open(model_encoder_path(model_path), "w", encoding="utf-8") as f:
+        json.dump({"encoder": encoder}, f)
+
+
+def load_model_encoder(model_path):
+    """Encoder an H2O model was trained on; models saved without a record are TF-IDF."""
+    path = model_encoder_path(model_path)
+    if not os.path.exists(path):
+        return "tfidf"
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["encoder"]
+
+
+def _file_signature(path):
+    """(absolute path, mtime, size) of a model artifact, or None if it is absent."""
+    if path is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def state_to_text(state: dict) -> str:
+    """Serialise a state dict in the same "key=value, ..." format as in training."""
+    return ", ".join(f"{key}={value}" for key, value in state.items())
+
+
+class Predictor:
+    """
+    Feature encoder plus action model for one backend.
+
+    Constructing a Predictor loads the model (and, for the H2O backend,
+    connects to or starts the H2O cluster), so it is only done on demand;
+    use get_predictor() for the shared per-process instance.
+
+    `fingerprint` identifies the loaded model and vectorizer files, so
+    prediction caches can tell when a different model is in use.
+    """
+
+    def __init__(self, backend=None, encoder=None, model_path=None,
+                 vectorizer_path=VECTORIZER_PATH):
+        self.backend = backend or BACKEND
+        self.encoder_name = encoder or ENCODER
+
+        self.vectorizer_path = None
+
+        # Load the feature encoder
+        if self.encoder_name == "structured":
+            self.encoder = StateEncoder()
+            self.feature_names = self.encoder.feature_names
+        else:
+            import joblib
+
+            self.vectorizer_path = vectorizer_path
+            self.vectorizer = joblib.load(vectorizer_path)
+            self.feature_names = self.vectorizer.get_feature_names_out()
+
+        # Load the model for the selected backend
+        if self.backend == "numpy":
+            self.model_path = model_path or NUMPY_MODEL_PATH
+            self.model = NumpyActionModel.load(self.model_path)
+            if self.model.encoder != self.encoder_name:
+                raise ValueError(
+                    f"{self.model_path} was trained on {self.model.encoder!r} features, "
+                    f"but the predictor encoder is {self.encoder_name!r}"
+                )
+        else:
+            self.model_path = model_path or MODEL_PATH
+            model_encoder = load_model_encoder(self.model_path)
+            if model_encoder != self.encoder_name:
+                raise ValueError(
+                    f"{self.model_path} was trained on {model_encoder!r} features, "
+                    f"but the predictor encoder is {self.encoder_name!r}"
+                )
+
+            import h2o
+
+            # Initialize H2O (if not already running)
+            if not h2o.connection():
+                h2o.init()
+            self.model = h2o.load_model(self.model_path)
+
+        self.fingerprint = (
+            self.backend,
+            self.encoder_name,
+            _file_signature(self.model_path),
+            _file_signature(self.vectorizer_path),
+        )
+
+    def predict_actions(self, states: list[dict]) -> list[str]:
+        """
+        Predict supply chain actions for a batch of states.
+
+        All states are encoded in one pass (a single sparse TF-IDF transform, or
+        one fixed-schema matrix) and scored in a single call, so the H2O backend
+        uploads one H2OFrame per batch rather than one per state, and the NumPy
+        backend never leaves the process.
+        """
+        if not states:
+            return []
+        timer = current_timer()
+
+        with timer.span("predict.vectorize"):
+            if self.encoder_name == "structured":
+                features = self.encoder.encode_batch(states)
+            else:
+                # Transform all state strings to TF-IDF features in one pass (stays sparse)
+                features = self.vectorizer.transform([state_to_text(state) for state in states])
+
+        if self.backend == "numpy":
+            with timer.span("predict.score"):
+                return self.model.predict(features)
+
+        import h2o
+        import pandas as pd
+
+        # Densify once per batch and upload it as a single H2OFrame
+        with timer.span("predict.upload"):
+            if self.encoder_name != "structured":
+                features = features.toarray()
+            df_features = pd.DataFrame(features, columns=self.feature_names)
+            hf = h2o.H2OFrame(df_features)
+
+        # The predictions H2OFrame has the predicted label in the "predict" column
+        with timer.span("predict.score"):
+            predictions = self.model.predict(hf)
+            return [str(action) for action in predictions["predict"].as_data_frame()["predict"]]
+
+    def predict_action(self, state: dict) -> str:
+        """Predict the supply chain action for a single state."""
+        if self.encoder_name == "structured" and self.backend == "numpy":
+            # Score straight from the encoder's preallocated row
+            timer = current_timer()
+            with timer.span("predict.vectorize"):
+                features = self.encoder.encode(state)
+            with timer.span("predict.score"):
+                return self.model.predict(features)[0]
+        return self.predict_actions([state])[0]
+
+
+_predictor = None
+_predictor_pid = None
+_predictor_lock = threading.Lock()
+
+
+def get_predictor():
+    """Return this process's Predictor, creating it on first use (once, even from several threads)."""
+    global _predictor, _predictor_pid
+    # A forked child must not reuse the parent's H2O connection
+    if _predictor is None or _predictor_pid != os.getpid():
+        with _predictor_lock:
+            if _predictor is None or _predictor_pid != os.getpid():
+                _predictor = Predictor()
+                _predictor_pid = os.getpid()
+    return _predictor
+
+
+def set_predictor(predictor):
+    """Install a Predictor (or any object with predict_action(s)) for this process."""
+    global _predictor, _predictor_pid
+    with _predictor_lock:
+        _predictor = predictor
+        _predictor_pid = os.getpid()
+
+
+def predict_actions(states: list[dict]) -> list[str]:
+    """Predict actions for a batch of states with the shared Predictor."""
+    return get_predictor().predict_actions(states)
 
-# Load the H2O model and the TF-IDF vectorizer
-aml_model = h2o.load_model(MODEL_PATH)
-vectorizer = joblib.load(VECTORIZER_PATH)
 
 def predict_action(state: dict) -> str:
     """
-    Given a state dictionary, convert it to a text string,
-    transform it using the saved TF-IDF vectorizer,
-    and predict the supply chain action using the H2O AutoML model.
-    
+    Given a state dictionary, encode it (as TF-IDF features of its text
+    form, or with the fixed-schema StateEncoder) and predict the supply
+    chain action using the shared Predictor.
+
     Expected state format (keys should match training):
     {
       "supplier_inventory": 100,
@@ -38,20 +252,4 @@ def predict_action(state: dict) -> str:
       "forecast_demand": 45
     }
     """
-    # Convert the state dict to a string in the same format as in training.
-    state_str = ", ".join(f"{key}={value}" for key, value in state.items())
-    
-    # Transform the state string to TF-IDF features
-    tfidf_matrix = vectorizer.transform([state_str]).toarray()
-    feature_names = vectorizer.get_feature_names_out()
-    df_features = pd.DataFrame(tfidf_matrix, columns=feature_names)
-    
-    # Convert the DataFrame to an H2OFrame
-    hf = h2o.H2OFrame(df_features)
-    
-    # Predict using the leader model
-    predictions = aml_model.predict(hf)
-    
-    # The predictions H2OFrame usually has the predicted label in the first column
-    predicted_action = predictions[0, 0]
-    return predicted_action
+    return get_predictor().predict_action(state)
@@ -0,0 +1,121 @@
+"""
+Action dispatch benchmark: registry dispatcher vs. the old if/elif chain, and batched tools.
+
+    python benchmarks/bench_dispatch.py [--calls 100000] [--replicas 1000] [--repeat 5]
+
+Replays the same action sequence on a SupplyChainState through
+  chain       the if/elif apply_action that run_simulation used before
+              dispatch.py (kept here as the baseline)
+  registry    ActionDispatcher.apply (as in run_simulation), one dict lookup per call
+and reports microseconds per call. Then applies one action to each of
+`replicas` states, looping the dispatcher over the rows vs. one
+ActionDispatcher.run_batch() call with the tools' forward_batch().
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from dispatch import ActionDispatcher  # noqa: E402
+from state import StateBatch, SupplyChainState  # noqa: E402
+from vector_sim import ACTIONS, DEFAULT_STATE  # noqa: E402
+
+
+def chain_apply_action(state, action, supply_tool, manufacture_tool, distribute_tool):
+    """The if/elif dispatch of main.apply_action before the registry."""
+    moved = {"supply": 0, "production": 0, "distribution": 0}
+    if action == "manufacture":
+        production = manufacture_tool.forward(
+            raw_material=state["manufacturer_inventory"],
+            capacity=state["manufacturer_capacity"],
+            demand=state["retailer_customer_demand"] + state["backorders"]
+        )
+        state["manufacturer_capacity"] -= production
+        state["manufacturer_inventory"] += production
+        moved["production"] = production
+        return moved
+
+    if action == "distribute":
+        distributor_intake = min(state["manufacturer_inventory"], 50 - state["distributor_inventory"])
+        state["manufacturer_inventory"] -= distributor_intake
+        state["distributor_inventory"] += distributor_intake
+        retail_supply = distribute_tool.forward(
+            inventory=state["distributor_inventory"],
+            demand=state["retailer_customer_demand"] + state["backorders"]
+        )
+        state["distributor_inventory"] -= retail_supply
+        state["retail_inventory"] += retail_supply
+        moved["distribution"] = retail_supply
+        return moved
+
+    manufacturer_demand = max(state["forecast_demand"] - state["manufacturer_inventory"], 0)
+    supply = supply_tool.forward(manufacturer_demand, state["supplier_inventory"])
+    state["supplier_inventory"] -= supply
+    moved["supply"] = supply
+    return moved
+
+
+def best_us(fns, number, repeat):
+    """Best time per unit of each fn in microseconds, alternating the fns between repeats."""
+    samples = {label: [] for label in fns}
+    for _ in range(repeat):
+        for label, fn in fns.items():
+            samples[label].append(timeit.timeit(fn, number=1))
+    return {label: min(times) / number * 1e6 for label, times in samples.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--replicas", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    actions = [rng.choice(ACTIONS) for _ in range(args.calls)]
+    dispatch = ActionDispatcher()
+    tools = dispatch.tools[:3]
+    initial = SupplyChainState.from_dict(DEFAULT_STATE).snapshot()
+    state = SupplyChainState(*initial)
+
+    def run_chain():
+        state.restore(initial)
+        for action in actions:
+            chain_apply_action(state, action, *tools)
+
+    apply = dispatch.apply
+
+    def run_registry():
+        state.restore(initial)
+        for action in actions:
+            apply(state, action)
+
+    results = best_us({"chain": run_chain, "registry": run_registry}, args.calls, args.repeat)
+
+    batch = StateBatch.from_states([DEFAULT_STATE] * args.replicas)
+    codes = np.array([rng.randrange(len(ACTIONS)) for _ in range(args.replicas)])
+    rows = list(batch)
+    names = [ACTIONS[code] for code in codes]
+
+    def run_rows():
+        for row, action in zip(rows, names):
+            dispatch(row, action)
+
+    results.update(best_us({"per-row": run_rows, "run_batch": lambda: dispatch.run_batch(batch.array, codes)},
+                           args.replicas, args.repeat))
+
+    for label in ("chain", "registry"):
+        print(f"dispatch [{label}]: {results[label]:.3f} us/call")
+    for label in ("per-row", "run_batch"):
+        print(f"{args.replicas} replicas [{label}]: {results[label]:.3f} us/replica")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Startup-time benchmark: how long does `import main` take in a fresh interpreter?
+
+    python benchmarks/bench_import.py                   # current tree
+    python benchmarks/bench_import.py --ref <git-rev>   # current tree vs. another revision
+
+Each sample runs `import main` in a new subprocess, so nothing is shared
+between samples; the minimum and median wall times are reported.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(repo_dir, module="main", repeat=5):
+    """Time `import <module>` from repo_dir in `repeat` fresh interpreters."""
+    samples = []
+    returncode = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", f"import {module}"],
+            cwd=repo_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        samples.append(time.perf_counter() - start)
+        returncode = returncode or proc.returncode
+    return {
+        "min_s": round(min(samples), 3),
+        "median_s": round(statistics.median(samples), 3),
+        "ok": returncode == 0,
+    }
+
+
+def export_revision(ref, dest):
+    """Write the tree of git revision `ref` into dest."""
+    archive = subprocess.run(
+        ["git", "archive", ref], cwd=REPO_DIR, check=True, stdout=subprocess.PIPE
+    )
+    subprocess.run(["tar", "-x", "-C", dest], input=archive.stdout, check=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ref", help="git revision to compare against")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {}
+    if args.ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            export_revision(args.ref, tmp)
+            results[args.ref] = time_import(tmp, args.module, args.repeat)
+    results["working tree"] = time_import(REPO_DIR, args.module, args.repeat)
+
+    for label, result in results.items():
+        status = "" if result["ok"] else "  (import failed)"
+        print(f"import {args.module} [{label}]: min {result['min_s']}s, "
+              f"median {result['median_s']}s{status}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Network step benchmark: time per SupplyNetwork step at growing network sizes.
+
+    python benchmarks/bench_network.py [--nodes 10 100 10000] [--steps 200]
+
+Builds SupplyNetwork.with_nodes(n) for each size, runs `steps` steps with
+seeded demand and resupply, and reports the mean step time along with the
+node and lane counts, so the cost per lane can be checked to stay flat.
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from network import SupplyNetwork  # noqa: E402
+
+
+def time_steps(n_nodes, steps, lead_time=2, seed=0):
+    network = SupplyNetwork.with_nodes(n_nodes, inventory=100, lead_time=lead_time)
+    network.run(5, seed=seed)  # warm-up
+    start = time.perf_counter()
+    network.run(steps, seed=seed)
+    step_s = (time.perf_counter() - start) / steps
+    return {
+        "nodes": network.n_nodes,
+        "lanes": network.n_lanes,
+        "step_us": round(step_s * 1e6, 1),
+        "ns_per_lane": round(step_s * 1e9 / max(network.n_lanes, 1), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 100, 10_000])
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--lead-time", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    results = []
+    for n_nodes in args.nodes:
+        result = time_steps(n_nodes, args.steps, args.lead_time)
+        results.append(result)
+        print(f"{result['nodes']:>8} nodes  {result['lanes']:>8} lanes  "
+              f"{result['step_us']:>10.1f} us/step  {result['ns_per_lane']:>8.1f} ns/lane")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+State micro-benchmark: cost of one simulation step on a dict vs. SupplyChainState.
+
+    python benchmarks/bench_state.py [--steps 20000] [--repeat 5]
+
+A "step" is the state work of main.run_simulation without the model: the
+tool calls of apply_action, restock, validate_state, the prediction
+cache key, the structured feature row and the event-log record. The
+same action/resupply/demand sequence is replayed on both representations
+and the best of `repeat` runs is reported in microseconds per step. Also
+times snapshot/restore against copying the dict.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from agents import DistributeTool, ManufactureTool, SupplyTool  # noqa: E402
+from event_log import step_event  # noqa: E402
+from features import StateEncoder  # noqa: E402
+from main import apply_action, restock  # noqa: E402
+from prediction_cache import PredictionCache  # noqa: E402
+from state import SupplyChainState  # noqa: E402
+from utils import validate_state  # noqa: E402
+
+INITIAL_STATE = {
+    "supplier_inventory": 100,
+    "manufacturer_capacity": 50,
+    "manufacturer_inventory": 0,
+    "distributor_inventory": 50,
+    "retail_inventory": 0,
+    "retailer_customer_demand": 40,
+    "backorders": 0,
+    "forecast_demand": 40,
+}
+METRICS = {"fill_rate": 0, "inventory_turnover": 0, "backorders": 0, "total_costs": 0, "average_inventory": 1}
+
+
+def make_run(state_factory, steps, seed=0):
+    rng = random.Random(seed)
+    schedule = [(rng.choice(("supply", "manufacture", "distribute")), rng.randint(10, 20), rng.randint(35, 45))
+                for _ in range(steps)]
+    tools = (SupplyTool(), ManufactureTool(), DistributeTool())
+    encoder = StateEncoder()
+    cache = PredictionCache()
+
+    def run():
+        state = state_factory(INITIAL_STATE)
+        for step, (action, resupply, demand) in enumerate(schedule):
+            validate_state(state)
+            cache.key(state)
+            encoder.encode(state)
+            moved = apply_action(state, action, *tools)
+            restock(state, resupply, demand)
+            step_event(step, action, moved, state, METRICS)
+
+    return run
+
+
+def best_us(fn, number, repeat):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label, factory in (("dict", dict), ("SupplyChainState", SupplyChainState.from_dict)):
+        run = make_run(factory, args.steps)
+        results[label] = best_us(run, 1, args.repeat) / args.steps
+        print(f"step [{label}]: {results[label]:.2f} us")
+
+    state_dict = dict(INITIAL_STATE)
+    state = SupplyChainState.from_dict(INITIAL_STATE)
+    snapshot = state.snapshot()
+    results["dict copy"] = best_us(lambda: dict(state_dict), 100000, args.repeat)
+    results["snapshot"] = best_us(state.snapshot, 100000, args.repeat)
+    results["restore"] = best_us(lambda: state.restore(snapshot), 100000, args.repeat)
+    for label in ("dict copy", "snapshot", "restore"):
+        print(f"{label}: {results[label]:.3f} us")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Training-data preparation benchmark: peak RSS and wall time vs. input size.
+
+    python benchmarks/bench_training.py                       # 10k, 100k, 1M rows
+    python benchmarks/bench_training.py --rows 5000 50000 --json results.json
+
+For each size a synthetic 'state,action' CSV is generated and prepared two
+ways, each in a fresh interpreter so peak RSS is per run:
+
+  memory  read the whole CSV, TF-IDF it and build the dense frame that
+          createModel.train_automl uploads to H2O
+  stream  createModel --stream: chunked scan plus a sparse SVMLight file
+          H2O imports directly
+
+Neither mode starts H2O; what is measured is everything up to the upload.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from utils import STATE_FIELDS  # noqa: E402
+
+ACTIONS = np.array(["supply", "manufacture", "distribute"])
+
+
+def write_synthetic_csv(path, rows, seed=0, chunk_size=100_000):
+    """Write `rows` random 'state,action' rows in the format of data.csv."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("state,action\n")
+        for start in range(0, rows, chunk_size):
+            n = min(chunk_size, rows - start)
+            values = rng.integers(0, 120, size=(n, len(STATE_FIELDS)))
+            actions = ACTIONS[rng.integers(0, len(ACTIONS), size=n)]
+            f.write("".join(
+                '"' + ", ".join(f"{field}={value}" for field, value in zip(STATE_FIELDS, row))
+                + f'",{action}\n'
+                for row, action in zip(values.tolist(), actions)
+            ))
+
+
+def _prepare(mode, data_path, chunk_size, workdir):
+    """Run one preparation mode in this process and return its summary."""
+    import pandas as pd
+    import createModel
+
+    vectorizer_path = os.path.join(workdir, "tfidf_vectorizer.pkl")
+    if mode == "memory":
+        df = pd.read_csv(data_path)
+        features, names = createModel.build_tfidf_features(df, vectorizer_path)
+        frame = createModel.to_training_frame(df, features, names)
+        return {"rows": len(frame), "features": len(names)}
+
+    encoder = createModel.StreamingEncoder(data_path, "tfidf", chunk_size, vectorizer_path)
+    output_path = os.path.join(workdir, "training_features.svmlight")
+    createModel.write_features(data_path, output_path, encoder, chunk_size)
+    return {"rows": encoder.rows, "features": len(encoder.feature_names),
+            "file_mb": round(os.path.getsize(output_path) / 2**20, 1)}
+
+
+def run_child(mode, data_path, chunk_size):
+    """Prepare in a fresh interpreter; returns wall time, peak RSS and the summary."""
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, data_path,
+             "--chunk-size", str(chunk_size), "--workdir", workdir],
+            capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        return {"ok": False, "error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--modes", nargs="+", choices=["memory", "stream"], default=["memory", "stream"])
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "CSV"), help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, data_path = args.child
+        start = time.perf_counter()
+        summary = _prepare(mode, data_path, args.chunk_size, args.workdir)
+        summary.update({
+            "ok": True,
+            "wall_s": round(time.perf_counter() - start, 3),
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+        print(json.dumps(summary))
+        return summary
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            data_path = os.path.join(tmp, f"states_{rows}.csv")
+            write_synthetic_csv(data_path, rows)
+            for mode in args.modes:
+                result = {"rows": rows, "mode": mode, **run_child(mode, data_path, args.chunk_size)}
+                results.append(result)
+                if result["ok"]:
+                    print(f"{rows:>10} rows  {mode:<6}  {result['wall_s']:>8.2f}s  "
+                          f"peak RSS {result['peak_rss_mb']:>8.1f} MB")
+                else:
+                    print(f"{rows:>10} rows  {mode:<6}  failed: {result['error']}")
+            os.remove(data_path)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Benchmark suite for the hot paths, with JSON results that can be compared between runs.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --only predict forecast --compare results.json
+    python benchmarks/suite.py --quick              # smaller sizes, e.g. for CI
+
+Benchmarks (asv style: each one sets up its inputs, then only the
+returned callable is timed, best and median of `repeat` runs):
+
+  predict.single        Predictor.predict_action, one state per call
+  predict.batch         Predictor.predict_actions on 1000 states
+  simulation.steps      run_simulation steps/sec (no sink, no sleeps: lead
+                        times are simulated), plus the fixed per-run cost,
+                        fitted over N, 2N and 4N steps; flagged "unstable"
+                        (and reported as the whole-run rate) when noise
+                        makes the fit meaningless
+  forecast.update       DemandForecast.update at large history windows
+  metrics.update        PerformanceMetrics updates at large history windows
+  features.tfidf        createModel.build_tfidf_features on data.csv x10 / x100
+  features.structured   createModel.build_structured_features, same data
+
+Everything runs offline: the predictor is the in-process NumPy backend
+with a linear model fit on data.csv (a stand-in for the H2O leader), and
+nothing writes outside a temporary directory. With --compare, each result
+is printed as a ratio to the same benchmark in an earlier JSON file, and
+the exit status is 1 if any is slower than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import pandas as pd  # noqa: E402
+
+import createModel  # noqa: E402
+from automl_predictor import Predictor  # noqa: E402
+from features import parse_state_text  # noqa: E402
+from utils import DemandForecast, PerformanceMetrics  # noqa: E402
+
+DATA_PATH = os.path.join(REPO_DIR, "data.csv")
+BENCHMARKS = {}
+
+
+def benchmark(name, params, quick_params=None):
+    """Register a setup function; it takes a param and returns (callable, units per call)."""
+
+    def register(setup):
+        BENCHMARKS[name] = (setup, tuple(params), tuple(quick_params or params))
+        return setup
+
+    return register
+
+
+def measure(fn, repeat, number=1):
+    """Seconds per call of fn: best and median of `repeat` timings of `number` calls."""
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return min(samples), statistics.median(samples)
+
+
+class Context:
+    """Inputs shared by several benchmarks, built once per suite run."""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.df = pd.read_csv(DATA_PATH)
+        self.states = [parse_state_text(text) for text in self.df["state"]]
+        self._predictor = None
+
+    @property
+    def predictor(self):
+        if self._predictor is None:
+            model_path = os.path.join(self.workdir, "action_model.npz")
+            features, _ = createModel.build_structured_features(self.df)
+            createModel.export_numpy_model(features, self.df["action"].tolist(),
+                                           encoder="structured", path=model_path)
+            self._predictor = Predictor(backend="numpy", encoder="structured", model_path=model_path)
+        return self._predictor
+
+    def scaled(self, factor):
+        return pd.concat([self.df] * factor, ignore_index=True)
+
+
+@benchmark("predict.single", params=(100,))
+def bench_predict_single(ctx, n_states):
+    predictor, states = ctx.predictor, ctx.states[:n_states]
+    return lambda: [predictor.predict_action(state) for state in states], len(states)
+
+
+@benchmark("predict.batch", params=(1000,), quick_params=(100,))
+def bench_predict_batch(ctx, batch_size):
+    predictor = ctx.predictor
+    states = (ctx.states * (batch_size // len(ctx.states) + 1))[:batch_size]
+    return lambda: predictor.predict_actions(states), batch_size
+
+
+@benchmark("simulation.steps", params=(2000,), quick_params=(200,))
+def bench_simulation(ctx, num_steps):
+    from main import run_simulation
+
+    predictor = ctx.predictor
+    return lambda: run_simulation(num_steps=num_steps, predictor=predictor, verbose=False), num_steps
+
+
+@benchmark("forecast.update", params=(10, 10_000, 1_000_000), quick_params=(10, 10_000))
+def bench_forecast(ctx, window_size):
+    forecast = DemandForecast(window_size=window_size)
+    for demand in range(window_size):  # start with a full history
+        forecast.update(demand % 50)
+    demands = [40 + i % 11 - 5 for i in range(1000)]
+
+    def run():
+        for demand in demands:
+            forecast.update(demand)
+            forecast.forecast()
+
+    return run, len(demands)
+
+
+@benchmark("metrics.update", params=(10, 10_000, 1_000_000), quick_params=(10, 10_000))
+def bench_metrics(ctx, window):
+    metrics = PerformanceMetrics(window=window)
+    levels = [{"retail": 40 + i % 11} for i in range(1000)]
+    for level in levels * (window // len(levels) + 1):  # start with a full history
+        metrics.update_inventory(level)
+
+    def run():
+        for level in levels:
+            metrics.update_inventory(level)
+            metrics.update_fill_rate(40, 38)
+            metrics.calculate_metrics()
+
+    return run, len(levels)
+
+
+@benchmark("features.tfidf", params=(10, 100), quick_params=(10,))
+def bench_tfidf(ctx, factor):
+    df = ctx.scaled(factor)
+    vectorizer_path = os.path.join(ctx.workdir, "tfidf_vectorizer.pkl")
+    return lambda: createModel.build_tfidf_features(df, vectorizer_path), len(df)
+
+
+@benchmark("features.structured", params=(10, 100), quick_params=(10,))
+def bench_structured(ctx, factor):
+    df = ctx.scaled(factor)
+    return lambda: createModel.build_structured_features(df), len(df)
+
+
+def run_benchmark(name, ctx, param, repeat):
+    setup = BENCHMARKS[name][0]
+    fn, units = setup(ctx, param)
+    best, median = measure(fn, repeat)
+    result = {
+        "name": name,
+        "param": param,
+        "units": units,
+        "best_s": best,
+        "median_s": median,
+        "per_unit_us": best / units * 1e6,
+        "units_per_s": units / best,
+    }
+    if name == "simulation.steps":
+        # Marginal cost of a step: least-squares line through runs of N, 2N and 4N
+        # steps, whose intercept is the per-run setup
+        sizes, seconds = [param], [best]
+        for factor in (2, 4):
+            fn_n, _ = setup(ctx, factor * param)
+            sizes.append(factor * param)
+            seconds.append(measure(fn_n, repeat)[0])
+        step_s, setup_s = np.polyfit(sizes, seconds, 1)
+        # Timing noise can swamp the differences; then keep the whole-run rate
+        result["unstable"] = bool(step_s <= 0 or setup_s < 0)
+        if not result["unstable"]:
+            result.update(per_unit_us=step_s * 1e6, units_per_s=1 / step_s, setup_s=setup_s)
+    return result
+
+
+def key(result):
+    return f"{result['name']}[{result['param']}]"
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", help="benchmark names or prefixes, e.g. predict")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="smaller sizes")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="with --compare, fail if any benchmark is this many times slower")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS
+             if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {key(result): result for result in json.load(f)["results"]}
+
+    results = []
+    regressions = []
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = Context(workdir)
+        for name in names:
+            _, params, quick_params = BENCHMARKS[name]
+            for param in quick_params if args.quick else params:
+                result = run_benchmark(name, ctx, param, args.repeat)
+                results.append(result)
+                line = (f"{key(result):<28} {result['per_unit_us']:>10.2f} us/unit  "
+                        f"{result['units_per_s']:>12.0f} units/s")
+                if result.get("unstable"):
+                    line += "  UNSTABLE (whole-run rate)"
+                previous = baseline.get(key(result))
+                if previous:
+                    ratio = result["per_unit_us"] / previous["per_unit_us"]
+                    line += f"  {ratio:5.2f}x vs baseline"
+                    if ratio > args.threshold:
+                        regressions.append(key(result))
+                        line += "  SLOWER"
+                print(line)
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than {args.threshold}x baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Checkpoint, resume and fork long simulation runs.
+
+A checkpoint is a flat {name: ndarray} dict of everything run_simulation
+carries from one step to the next: the state, the DemandForecast
+internals, the PerformanceMetrics and CostManager accumulators, the
+pending shipments of the EventScheduler, the RandomStreams state, the
+step count and the config. Each object exports its own part with
+getstate()/setstate(). Checkpoints are written with np.savez (no pickle,
+loaded with allow_pickle=False), atomically via a temporary file.
+
+Resuming from a checkpoint continues bit-exactly where the run stopped.
+fork() runs many what-if branches (config overrides and/or new seeds)
+from one warm snapshot in parallel, and
+VectorizedSimulation.from_checkpoint() forks it into many array replicas.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import SupplyChainConfig
+from streams import RandomStreams
+from utils import prefixed, unprefixed
+
+FORMAT_VERSION = 2
+PARTS = ("state", "forecast", "metrics", "costs", "events", "rng")
+
+
+def part(data, prefix):
+    """The arrays of one PARTS entry (e.g. "forecast"), with the prefix stripped."""
+    return unprefixed(prefix, data)
+
+
+def capture(step, config, state, demand_forecast, metrics, cost_manager, scheduler, streams):
+    """Checkpoint of a run after `step` completed steps."""
+    data = {"version": np.asarray(FORMAT_VERSION), "step": np.asarray(step),
+            "config": np.asarray(json.dumps(vars(config)))}
+    for prefix, obj in zip(PARTS, (state, demand_forecast, metrics, cost_manager, scheduler, streams)):
+        data.update(prefixed(prefix, obj.getstate()))
+    return data
+
+
+def restore(data, state, demand_forecast, metrics, cost_manager, scheduler, streams):
+    """Load a checkpoint into freshly built run objects; returns the step."""
+    if data["version"].item() != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {data['version'].item()}")
+    for prefix, obj in zip(PARTS, (state, demand_forecast, metrics, cost_manager, scheduler, streams)):
+        obj.setstate(part(data, prefix))
+    return data["step"].item()
+
+
+def checkpoint_config(data):
+    """The SupplyChainConfig a checkpoint was taken with."""
+    config = SupplyChainConfig()
+    config.update(json.loads(data["config"].item()))
+    return config
+
+
+def with_seed(data, seed):
+    """Copy of a checkpoint whose run continues with fresh RandomStreams(seed) instead of its own."""
+    data = {key: value for key, value in data.items() if not key.startswith("rng.")}
+    data.update(prefixed("rng", RandomStreams(seed).getstate()))
+    return data
+
+
+def save_checkpoint(path, data):
+    """Write a checkpoint atomically: readers never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **data)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    with np.load(path, allow_pickle=False) as f:
+        return {key: f[key] for key in f.files}
+
+
+def run_branch(checkpoint, overrides=None, seed=None, num_steps=None, predictor=None):
+    """
+    Continue one what-if branch from a checkpoint (path or loaded dict) and
+    return its final metrics. `overrides` change the config (e.g. costs or
+    demand) and `seed` reseeds the random stream; without a seed the branch
+    sees the same random draws as the original run. Branches do not
+    checkpoint (over the parent's file) unless their overrides say so.
+    """
+    from main import run_simulation
+
+    data = load_checkpoint(checkpoint) if isinstance(checkpoint, (str, os.PathLike)) else checkpoint
+    config = checkpoint_config(data)
+    config.update({"simulation": {"checkpoint_every": 0}})
+    config.update(overrides or {})
+    if seed is not None:
+        data = with_seed(data, seed)
+    return run_simulation(num_steps=num_steps, predictor=predictor, config=config,
+                          verbose=False, resume_from=data)
+
+
+def fork(checkpoint, branches, num_steps=None, max_workers=None,
+         predictor_factory=None, predictor_kwargs=None):
+    """
+    Run what-if branches from one snapshot across a process pool.
+
+    `branches` is a list of {"overrides": {...}, "seed": int} dicts (both
+    keys optional); the shared prefix is never re-simulated. Returns the
+    final metrics of each branch, in branch order.
+    """
+    from sweep import init_worker
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(predictor_factory, predictor_kwargs)) as pool:
+        futures = [pool.submit(run_branch, checkpoint, branch.get("overrides"), branch.get("seed"), num_steps)
+                   for branch in branches]
+        return [future.result() for future in futures]
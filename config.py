@@ -1,9 +1,17 @@
+import functools
+import warnings
+
+import numpy as np
+
 class SupplyChainConfig:
     def __init__(self):
         self.simulation = {
             "num_steps": 5,
             "random_seed": 42,
-            "lead_time": 0.5,
+            "lead_time": 1,  # steps between shipping raw materials and their arrival
+            "lead_time_jitter": 0,  # up to this many extra steps, drawn per shipment
+            "checkpoint_every": 0,  # save a checkpoint every N steps (0 = never, see checkpoint.py)
+            "checkpoint_path": None,
         }
 
         self.inventory = {
@@ -16,7 +24,7 @@ class SupplyChainConfig:
         }
 
         self.demand = {
-            "initial": 30,
+            "base": 40,
             "min_variation": -5,
             "max_variation": 5,
             "forecast_window": 10,
@@ -37,6 +45,34 @@ class SupplyChainConfig:
             "max_amount": 20,
         }
 
+        self.logging = {
+            "sink": "print",  # none, print, jsonl or columnar (see event_log.py)
+            "path": None,
+            "batch_size": 1000,
+            "append": False,  # add to an existing jsonl/columnar log instead of starting a new one
+        }
+
+        self.agent = {
+            "backend": "hf",  # hf (remote HfApiModel) or local (offline stand-in), see model_backends.py
+            "model_id": "meta-llama/Llama-3.3-70B-Instruct",
+            "cache_dir": None,  # on-disk response cache, shared across runs
+            "cache_max_bytes": 64 * 2**20,
+        }
+
+        self.serving = {
+            "host": "127.0.0.1",  # the scoring server (see scoring_server.py)
+            "port": 8080,
+            "max_batch_size": 64,  # states scored per predictor call
+            "max_wait_ms": 5.0,  # how long a request may wait for others to batch with
+        }
+
+        self.profiling = {
+            "phase_timers": False,  # per-phase latency spans (see profiling.py)
+            "cprofile": False,
+            "tracemalloc": False,
+            "output_dir": None,  # where timings/profiles of each run are written
+        }
+
     def update(self, new_config):
         """Update configuration with new values."""
         for section, values in new_config.items():
@@ -48,6 +84,12 @@ class SupplyChainConfig:
         """Validate configuration values."""
         assert self.simulation["num_steps"] > 0, "Number of steps must be positive"
         assert self.simulation["lead_time"] >= 0, "Lead time cannot be negative"
+        assert int(self.simulation["lead_time"]) == self.simulation["lead_time"], \
+            "Lead time must be a whole number of steps"
+        assert self.simulation["lead_time_jitter"] >= 0, "Lead time jitter cannot be negative"
+        assert self.simulation["checkpoint_every"] >= 0, "Checkpoint interval cannot be negative"
+        assert not self.simulation["checkpoint_every"] or self.simulation["checkpoint_path"], \
+            "Checkpointing needs a checkpoint_path"
         
         for key, value in self.inventory.items():
             if "initial" in key or "capacity" in key:
@@ -59,6 +101,34 @@ class SupplyChainConfig:
         for cost_type, cost in self.costs.items():
             assert cost >= 0, f"{cost_type} cost cannot be negative"
 
+        assert self.logging["sink"] in ("none", "print", "jsonl", "columnar"), \
+            f"Unknown event sink: {self.logging['sink']}"
+        assert self.logging["batch_size"] > 0, "Event log batch size must be positive"
+
+        assert self.serving["max_batch_size"] > 0, "Scoring batch size must be positive"
+        assert self.serving["max_wait_ms"] >= 0, "Scoring max wait cannot be negative"
+
+@functools.lru_cache(maxsize=None)
+def z_score(service_level):
+    """Standard normal quantile for a service level, computed once per level."""
+    from scipy.stats import norm
+    return float(norm.ppf(service_level))
+
+def _row_stats(demand_histories):
+    """Per-row (count, mean, std) of a 2-D history array; NaN pads shorter rows."""
+    histories = np.asarray(demand_histories, dtype=np.float64)
+    if histories.ndim != 2:
+        raise ValueError(f"Expected a 2-D (n_skus, window) demand history array, got shape {histories.shape}")
+    if not np.isnan(histories).any():
+        count = np.full(len(histories), histories.shape[1])
+        if histories.shape[1] == 0:
+            return count, np.zeros(len(histories)), np.zeros(len(histories))
+        return count, histories.mean(axis=1), histories.std(axis=1)
+    count = np.sum(~np.isnan(histories), axis=1)
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+        return count, np.nanmean(histories, axis=1), np.nanstd(histories, axis=1)
+
 class SafetyStockOptimizer:
     def __init__(self, service_level=0.95):
         self.service_level = service_level
@@ -74,10 +144,22 @@ class SafetyStockOptimizer:
         safety_stock = z_score * demand_std * np.sqrt(lead_time)
         return max(int(safety_stock), 0)
 
+    def calculate_safety_stock_batch(self, demand_histories, lead_time):
+        """
+        calculate_safety_stock() for every row of a (n_skus, window) array.
+        Shorter histories are padded with NaN; lead_time may be per SKU.
+        """
+        count, _, demand_std = _row_stats(demand_histories)
+        return self._safety_stock(count, demand_std, lead_time)
+
+    def _safety_stock(self, count, demand_std, lead_time):
+        safety_stock = self._get_z_score() * demand_std * np.sqrt(lead_time)
+        safety_stock = np.maximum(np.trunc(np.nan_to_num(safety_stock)), 0).astype(np.int64)
+        return np.where(count < 2, 0, safety_stock)
+
     def _get_z_score(self):
         """Get z-score for given service level."""
-        from scipy.stats import norm
-        return norm.ppf(self.service_level)
+        return z_score(self.service_level)
 
 class ReorderPointCalculator:
     @staticmethod
@@ -85,6 +167,11 @@ class ReorderPointCalculator:
         """Calculate reorder point."""
         return int(demand_rate * lead_time + safety_stock)
 
+    @staticmethod
+    def calculate_batch(demand_rate, lead_time, safety_stock):
+        """calculate() elementwise over arrays."""
+        return np.trunc(np.asarray(demand_rate) * lead_time + safety_stock).astype(np.int64)
+
 class InventoryOptimizer:
     def __init__(self, config):
         self.config = config
@@ -108,10 +195,35 @@ class InventoryOptimizer:
             "order_quantity": self._calculate_order_quantity(avg_demand)
         }
 
+    def optimize_batch(self, demand_histories, lead_time):
+        """
+        optimize() for many SKUs at once.
+
+        `demand_histories` is an (n_skus, window) array with one demand
+        history per row (NaN-padded if lengths differ) and `lead_time` a
+        scalar or per-SKU array. Returns the same keys as optimize(), each
+        an int64 array with one entry per SKU.
+        """
+        count, avg_demand, demand_std = _row_stats(demand_histories)
+        safety_stock = self.safety_stock_optimizer._safety_stock(count, demand_std, lead_time)
+        avg_demand = np.where(count > 0, avg_demand, 30)
+        return {
+            "safety_stock": safety_stock,
+            "reorder_point": self.reorder_calculator.calculate_batch(avg_demand, lead_time, safety_stock),
+            "order_quantity": self._calculate_order_quantity_batch(avg_demand),
+        }
+
     def _calculate_order_quantity(self, avg_demand):
         """Calculate economic order quantity."""
         holding_cost = self.config.costs["holding"]
         order_cost = self.config.costs["raw_material"]
         
         eoq = np.sqrt((2 * avg_demand * order_cost) / holding_cost)
-        return max(int(eoq), 1)
\ No newline at end of file
+        return max(int(eoq), 1)
+
+    def _calculate_order_quantity_batch(self, avg_demand):
+        holding_cost = self.config.costs["holding"]
+        order_cost = self.config.costs["raw_material"]
+
+        eoq = np.sqrt((2 * avg_demand * order_cost) / holding_cost)
+        return np.maximum(np.trunc(eoq), 1).astype(np.int64)
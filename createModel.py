@@ -1,58 +1,444 @@
+import argparse
+import json
+from collections import Counter
+
+import joblib
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-import h2o
-from h2o.automl import H2OAutoML
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 
-# Initialize H2O
-h2o.init()
+from automl_predictor import NumpyActionModel, save_model_encoder
+from features import StateEncoder
 
-# Load your CSV dataset (make sure your CSV has two columns: "state" and "action")
-df = pd.read_csv("data.csv")
-print("Original Data:")
-print(df.head())
+DATA_PATH = "data.csv"
+VECTORIZER_PATH = "tfidf_vectorizer.pkl"
+NUMPY_MODEL_PATH = "action_model.npz"
 
-# Use TF-IDF to transform the 'state' text into numeric features
-vectorizer = TfidfVectorizer()
-tfidf_matrix = vectorizer.fit_transform(df["state"]).toarray()
 
-import joblib
-joblib.dump(vectorizer, "tfidf_vectorizer.pkl")
+def build_tfidf_features(df, vectorizer_path=VECTORIZER_PATH):
+    """Use TF-IDF to transform the 'state' text into numeric features."""
+    vectorizer = TfidfVectorizer()
+    tfidf_matrix = vectorizer.fit_transform(df["state"])
+    joblib.dump(vectorizer, vectorizer_path)
+    return tfidf_matrix, vectorizer.get_feature_names_out()
+
+
+def build_structured_features(df):
+    """Map the 'state' strings straight onto the fixed-schema state fields."""
+    encoder = StateEncoder()
+    return encoder.encode_text(df["state"]), encoder.feature_names
+
+
+def to_training_frame(df, features, feature_names):
+    """Dense pandas frame of the features plus the 'action' column, as uploaded to H2O."""
+    # Create a DataFrame from the features
+    if hasattr(features, "toarray"):
+        features = features.toarray()
+    df_features = pd.DataFrame(features, columns=feature_names)
+
+    # Combine the features with the target label
+    return pd.concat([df_features, df["action"]], axis=1)
+
+
+def train_automl(df, features, feature_names, max_runtime_secs=600, encoder="tfidf", model_dir="."):
+    """Train an H2O AutoML model on the given features and save the leader."""
+    import h2o
+
+    # Convert the Pandas DataFrame to an H2OFrame
+    hf = h2o.H2OFrame(to_training_frame(df, features, feature_names))
+    return train_automl_frame(hf, max_runtime_secs, encoder, model_dir)
+
+
+def train_automl_frame(hf, max_runtime_secs=600, encoder="tfidf", model_dir="."):
+    """
+    Run AutoML on an H2OFrame with an 'action' column; returns (leader, leader labels).
+
+    The leader is saved in `model_dir`, with the `encoder` its features
+    came from recorded next to it (automl_predictor.save_model_encoder), so
+    a Predictor with another encoder refuses to load it.
+    """
+    import h2o
+    from h2o.automl import H2OAutoML
+
+    # Specify the response (target) column and predictor columns
+    response = "action"
+    predictors = [col for col in hf.columns if col != response]
+
+    # Convert the target column to a factor (categorical variable)
+    hf[response] = hf[response].asfactor()
+
+    # Run H2O AutoML (here we limit runtime to 10 minutes for demonstration)
+    aml = H2OAutoML(max_runtime_secs=max_runtime_secs, seed=1)
+    aml.train(x=predictors, y=response, training_frame=hf)
+
+    # View the leaderboard of models
+    lb = aml.leaderboard
+    print("Leaderboard:")
+    print(lb)
+
+    #store the model to disk
+    model_path = h2o.save_model(model=aml.leader, path=model_dir, force=True)
+    save_model_encoder(model_path, encoder)
+    print(f"Saved the leader to {model_path}; score with it via "
+          f"PREDICTOR_MODEL_PATH={model_path} PREDICTOR_ENCODER={encoder}")
+
+    # Labels predicted by the leader, used to distill it into the NumPy model
+    leader_labels = aml.leader.predict(hf)["predict"].as_data_frame()["predict"]
+    return aml.leader, leader_labels.astype(str).tolist()
+
+
+def fit_linear_model(features, labels):
+    """
+    Fit a multinomial logistic regression and return (coef, intercept, classes).
+
+    Dense features are standardised for fitting and the scaling is folded
+    back into the weights, so scoring needs no extra preprocessing step.
+    """
+    if hasattr(features, "toarray"):
+        clf = LogisticRegression(max_iter=1000)
+        clf.fit(features, labels)
+        return clf.coef_, clf.intercept_, clf.classes_.astype(str)
+
+    features = np.asarray(features, dtype=np.float64)
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1.0
+
+    clf = LogisticRegression(max_iter=1000)
+    clf.fit((features - mean) / scale, labels)
+    coef = clf.coef_ / scale
+    intercept = clf.intercept_ - coef @ mean
+    return coef, intercept, clf.classes_.astype(str)
+
+
+def export_numpy_model(features, labels, encoder="tfidf", path=NUMPY_MODEL_PATH):
+    """
+    Fit a linear model on the given features and labels and save it for the
+    in-process NumPy scoring backend.
+
+    Passing the AutoML leader's own predictions as labels distills the
+    ensemble into a model that scores without the H2O JVM.
+    """
+    coef, intercept, classes = fit_linear_model(features, labels)
+    model = NumpyActionModel(coef, intercept, classes, encoder)
+    model.save(path)
+    print(f"Exported NumPy model to {path}")
+    return model
+
+
+def read_chunks(data_path, chunk_size):
+    """Yield the 'state'/'action' CSV as DataFrames of at most chunk_size rows."""
+    yield from pd.read_csv(data_path, usecols=["state", "action"], chunksize=chunk_size)
+
+
+class StreamingEncoder:
+    """
+    Feature encoder fitted in one pass over a CSV too large to load at once.
+
+    For "tfidf" the vocabulary and idf weights are accumulated chunk by chunk
+    and give exactly the vectorizer TfidfVectorizer.fit would on the full
+    file, so the saved pickle works with the existing Predictor. For
+    "structured" the pass collects per-feature mean and scale instead.
+    Either way the labels and row count are collected too. The TF-IDF
+    vectorizer is saved to `vectorizer_path`, which must be given for
+    "tfidf" so that a scan never replaces the shipped VECTORIZER_PATH by
+    accident.
+    """
+
+    def __init__(self, data_path, encoder="tfidf", chunk_size=100_000, vectorizer_path=None):
+        if encoder != "structured" and vectorizer_path is None:
+            raise ValueError("StreamingEncoder needs a vectorizer_path to save the TF-IDF vectorizer to")
+        self.encoder = encoder
+        self.rows = 0
+        classes = set()
+
+        if encoder == "structured":
+            self.state_encoder = StateEncoder()
+            self.feature_names = self.state_encoder.feature_names
+            total = np.zeros(len(self.feature_names))
+            total_sq = np.zeros(len(self.feature_names))
+            for chunk in read_chunks(data_path, chunk_size):
+                features = self.encode(chunk["state"])
+                total += features.sum(axis=0)
+                total_sq += np.square(features).sum(axis=0)
+                classes.update(chunk["action"].astype(str))
+                self.rows += len(chunk)
+            self.mean = total / max(self.rows, 1)
+            self.scale = np.sqrt(np.maximum(total_sq / max(self.rows, 1) - np.square(self.mean), 0))
+            self.scale[self.scale == 0] = 1.0
+        else:
+            analyzer = TfidfVectorizer().build_analyzer()
+            doc_freq = Counter()
+            for chunk in read_chunks(data_path, chunk_size):
+                for text in chunk["state"]:
+                    doc_freq.update(set(analyzer(text)))
+                classes.update(chunk["action"].astype(str))
+                self.rows += len(chunk)
+
+            terms = sorted(doc_freq)
+            self.vectorizer = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(terms)})
+            self.vectorizer.fit(terms)
+            # Smoothed idf, as TfidfVectorizer computes it from the whole corpus
+            counts = np.array([doc_freq[term] for term in terms], dtype=np.float64)
+            self.vectorizer.idf_ = np.log((1 + self.rows) / (1 + counts)) + 1
+            joblib.dump(self.vectorizer, vectorizer_path)
+            self.feature_names = self.vectorizer.get_feature_names_out()
+            self.mean = self.scale = None
+
+        self.classes = sorted(classes)
+
+    def encode(self, texts):
+        """Features of a chunk of state strings (sparse for TF-IDF)."""
+        if self.encoder == "structured":
+            return self.state_encoder.encode_text(texts)
+        return self.vectorizer.transform(texts)
+
+
+def write_features(data_path, output_path, encoder, chunk_size=100_000, file_format=None):
+    """
+    Encode the CSV chunk by chunk and append it to a file H2O can import.
+
+    "svmlight" keeps features sparse and stores each label as its index into
+    encoder.classes (listed in `<output_path>.json`); "parquet" writes dense
+    feature columns named like encoder.feature_names plus the 'action'
+    labels, and needs pyarrow. Defaults to svmlight for TF-IDF features and
+    parquet for structured ones.
+    """
+    file_format = file_format or ("parquet" if encoder.encoder == "structured" else "svmlight")
+    label_index = {label: i for i, label in enumerate(encoder.classes)}
+
+    if file_format == "svmlight":
+        from sklearn.datasets import dump_svmlight_file
+
+        with open(output_path, "wb") as f:
+            for chunk in read_chunks(data_path, chunk_size):
+                labels = chunk["action"].astype(str).map(label_index).to_numpy()
+                dump_svmlight_file(encoder.encode(chunk["state"]), labels, f, zero_based=False)
+    elif file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        names = [str(name) for name in encoder.feature_names] + ["action"]
+        writer = None
+        try:
+            for chunk in read_chunks(data_path, chunk_size):
+                features = encoder.encode(chunk["state"])
+                if hasattr(features, "toarray"):
+                    features = features.toarray()
+                columns = [pa.array(features[:, i]) for i in range(features.shape[1])]
+                columns.append(pa.array(chunk["action"].astype(str).tolist()))
+                table = pa.Table.from_arrays(columns, names=names)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"Unknown feature file format: {file_format}")
+
+    with open(f"{output_path}.json", "w", encoding="utf-8") as f:
+        json.dump({"format": file_format, "rows": encoder.rows, "classes": encoder.classes,
+                   "feature_names": [str(name) for name in encoder.feature_names]}, f)
+    return file_format
+
+
+def load_feature_meta(output_path):
+    """The `<output_path>.json` description write_features() saves next to its file."""
+    with open(f"{output_path}.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def svmlight_columns(meta, ncol):
+    """
+    Names for an imported SVMLight frame of `ncol` columns (the label, then
+    features up to the highest index present), and the trailing all-zero
+    features the file does not record.
+    """
+    present = ncol - 1
+    return ["action"] + meta["feature_names"][:present], meta["feature_names"][present:]
+
+
+def svmlight_label_levels(meta, levels):
+    """Action names for the factor levels of imported class indexes ("0", "1.0", ...)."""
+    return [meta["classes"][int(float(level))] for level in levels]
+
+
+def import_training_frame(output_path):
+    """Import a write_features() file into H2O with the feature and label names restored."""
+    import h2o
+
+    meta = load_feature_meta(output_path)
+    hf = h2o.import_file(output_path)
+    if meta["format"] == "svmlight":
+        names, missing = svmlight_columns(meta, hf.ncol)
+        hf.set_names(names)
+        for name in missing:
+            hf[name] = 0
+        hf["action"] = hf["action"].asfactor()
+        hf["action"] = hf["action"].set_levels(svmlight_label_levels(meta, hf["action"].levels()[0]))
+    return hf
+
+
+def fit_linear_model_streaming(data_path, encoder, chunk_size=100_000, epochs=5):
+    """
+    Fit the linear action model with SGD over CSV chunks; returns (coef, intercept, classes).
+
+    Structured features are standardised with the scan-pass moments and the
+    scaling is folded back into the weights, as in fit_linear_model.
+    """
+    clf = SGDClassifier(loss="log_loss", random_state=1)
+    classes = np.asarray(encoder.classes)
+    for _ in range(epochs):
+        for chunk in read_chunks(data_path, chunk_size):
+            features = encoder.encode(chunk["state"])
+            if encoder.mean is not None:
+                features = (features - encoder.mean) / encoder.scale
+            clf.partial_fit(features, chunk["action"].astype(str), classes=classes)
+
+    coef, intercept = clf.coef_, clf.intercept_
+    if len(classes) == 2:
+        # Binary SGD keeps a single weight row; expand it to one row per class
+        coef = np.vstack([-coef, coef]) / 2
+        intercept = np.array([-intercept[0], intercept[0]]) / 2
+    if encoder.mean is not None:
+        coef = coef / encoder.scale
+        intercept = intercept - coef @ encoder.mean
+    return coef, intercept, clf.classes_.astype(str)
+
+
+def check_parity(df, vectorizer_path=VECTORIZER_PATH):
+    """
+    Compare the structured encoder against the legacy TF-IDF pipeline on df.
+
+    Fits the same linear model on both feature sets and reports how often
+    each matches the labels and how often the two agree with each other.
+    Also verifies that the structured encoding ignores dict key order.
+    """
+    labels = df["action"].astype(str).to_numpy()
+
+    vectorizer = joblib.load(vectorizer_path)
+    legacy = vectorizer.transform(df["state"])
+    structured, _ = build_structured_features(df)
+
+    def _predict(features):
+        coef, intercept, classes = fit_linear_model(features, labels)
+        scores = np.asarray(features @ coef.T) + intercept
+        return classes[np.argmax(scores, axis=1)]
+
+    legacy_pred = _predict(legacy)
+    structured_pred = _predict(structured)
+
+    # Reversing the field order must not change the structured features
+    reversed_texts = [", ".join(reversed(text.split(", "))) for text in df["state"]]
+    order_invariant = bool(np.array_equal(StateEncoder().encode_text(reversed_texts), structured))
+
+    report = {
+        "rows": len(df),
+        "legacy_accuracy": float(np.mean(legacy_pred == labels)),
+        "structured_accuracy": float(np.mean(structured_pred == labels)),
+        "agreement": float(np.mean(legacy_pred == structured_pred)),
+        "order_invariant": order_invariant,
+    }
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the supply chain action model.")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV with 'state' and 'action' columns")
+    parser.add_argument("--encoder", choices=["tfidf", "structured"], default="tfidf",
+                        help="feature encoding to train on")
+    parser.add_argument("--max-runtime-secs", type=int, default=600)
+    parser.add_argument("--model-dir", default=".", help="directory the AutoML leader is saved in")
+    parser.add_argument("--export-numpy", action="store_true",
+                        help="also export an in-process NumPy model")
+    parser.add_argument("--skip-automl", action="store_true",
+                        help="do not start H2O; export the NumPy model from the CSV labels")
+    parser.add_argument("--parity", action="store_true",
+                        help="compare the structured encoder with the TF-IDF pipeline and exit")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the CSV in chunks and train from an on-disk feature file")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows per chunk with --stream")
+    parser.add_argument("--features-out", default=None,
+                        help="feature file written with --stream (default training_features.<format>)")
+    parser.add_argument("--format", choices=["svmlight", "parquet"], default=None,
+                        help="feature file format with --stream (default by encoder)")
+    args = parser.parse_args(argv)
+
+    if args.stream:
+        train_streaming(args)
+        return
+
+    # Load your CSV dataset (make sure your CSV has two columns: "state" and "action")
+    df = pd.read_csv(args.data)
+    print("Original Data:")
+    print(df.head())
+
+    if args.parity:
+        check_parity(df)
+        return
+
+    if args.encoder == "structured":
+        features, feature_names = build_structured_features(df)
+    else:
+        features, feature_names = build_tfidf_features(df)
+
+    labels = df["action"].astype(str).tolist()
+    if not args.skip_automl:
+        import h2o
+
+        # Initialize H2O
+        h2o.init()
+        _, labels = train_automl(df, features, feature_names, args.max_runtime_secs, args.encoder, args.model_dir)
+
+        # Shutdown H2O
+        h2o.cluster().shutdown()
+
+    if args.export_numpy or args.skip_automl:
+        export_numpy_model(features, labels, encoder=args.encoder)
+
 
-# Create a DataFrame from the TF-IDF features
-feature_names = vectorizer.get_feature_names_out()
-df_features = pd.DataFrame(tfidf_matrix, columns=feature_names)
+def train_streaming(args):
+    """
+    Streaming counterpart of main(): nothing larger than one chunk is held in memory.
 
-# Combine the features with the target label
-df_combined = pd.concat([df_features, df["action"]], axis=1)
+    Scans the CSV to fit the encoder, writes the features to disk, and
+    either has H2O import that file for AutoML or (with --skip-automl)
+    fits the NumPy model with SGD over the chunks. The NumPy model is
+    fitted on the CSV labels rather than distilled from the AutoML leader.
+    """
+    encoder = StreamingEncoder(args.data, args.encoder, args.chunk_size, VECTORIZER_PATH)
+    print(f"Scanned {encoder.rows} rows, {len(encoder.feature_names)} features, "
+          f"classes {encoder.classes}")
 
-# Convert the Pandas DataFrame to an H2OFrame
-hf = h2o.H2OFrame(df_combined)
+    if not args.skip_automl:
+        import h2o
 
-# Specify the response (target) column and predictor columns
-response = "action"
-predictors = [col for col in hf.columns if col != response]
+        file_format = args.format or ("parquet" if args.encoder == "structured" else "svmlight")
+        output_path = args.features_out or f"training_features.{file_format}"
+        write_features(args.data, output_path, encoder, args.chunk_size, file_format)
+        print(f"Wrote features to {output_path}")
 
-# Convert the target column to a factor (categorical variable)
-hf[response] = hf[response].asfactor()
+        h2o.init()
+        train_automl_frame(import_training_frame(output_path), args.max_runtime_secs, args.encoder, args.model_dir)
+        h2o.cluster().shutdown()
 
-# Run H2O AutoML (here we limit runtime to 5 minutes for demonstration)
-aml = H2OAutoML(max_runtime_secs=600, seed=1)
-aml.train(x=predictors, y=response, training_frame=hf)
+    if args.export_numpy or args.skip_automl:
+        coef, intercept, classes = fit_linear_model_streaming(args.data, encoder, args.chunk_size)
+        model = NumpyActionModel(coef, intercept, classes, args.encoder)
+        model.save(NUMPY_MODEL_PATH)
+        print(f"Exported NumPy model to {NUMPY_MODEL_PATH}")
 
-# View the leaderboard of models
-lb = aml.leaderboard
-print("Leaderboard:")
-print(lb)
 
-#store the model to disk
-model_path = h2o.save_model(model=aml.leader, path=".", force=True)
-print(model_path)
+if __name__ == "__main__":
+    main()
 
-# Shutdown H2O
-h2o.cluster().shutdown()
 # The model is saved to disk and can be loaded for making predictions on new data.
 # The vectorizer used for transforming the text data to TF-IDF features is also saved for consistency.
 # The model can be loaded in a separate script for making predictions on new data.
 # The vectorizer can be loaded to transform the new data in the same way as the training data.
 # The new data can then be used to make predictions using the loaded model.
-# The model can be used to predict the target label for new data based on the TF-IDF features of the text data.
\ No newline at end of file
+# The model can be used to predict the target label for new data based on the TF-IDF features of the text data.
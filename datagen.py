@@ -0,0 +1,166 @@
+"""
+Synthetic decision logs: labelled training data from simulator rollouts.
+
+Each rollout is one main.run_simulation run (same tools and transitions)
+from a randomly perturbed starting inventory, in which a labelling policy
+picks every action. Each state the policy sees becomes a row in the
+"state,action" CSV format createModel.py trains on. Rollouts run in
+a process pool and rows are appended to the output as batches finish.
+
+    python datagen.py --rollouts 10000 --steps 50 --output decisions.csv
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from config import InventoryOptimizer, SupplyChainConfig
+from sweep import scenario_seeds
+from utils import STATE_FIELDS
+
+
+class ReorderPointPolicy:
+    """
+    Heuristic policy built on config.InventoryOptimizer.
+
+    Supplies raw materials while the manufacturer holds less than half the
+    reorder point for recent customer demand. Distributes when the
+    distributor and retailer together cannot cover forecast demand over the
+    lead time plus the backorders (counted up to one step of demand, so a
+    long backlog does not force a shipment every step) and the manufacturer
+    can ship a step's demand and keep its reorder point. Otherwise it puts
+    the manufacturer's idle capacity to work and manufactures.
+    """
+
+    def __init__(self, config=None, history=10):
+        self.config = config or SupplyChainConfig()
+        self.optimizer = InventoryOptimizer(self.config)
+        self.lead_time = max(int(self.config.simulation["lead_time"]), 1)
+        self.demand_history = deque(maxlen=history)
+
+    def predict_action(self, state):
+        self.demand_history.append(state["retailer_customer_demand"])
+        reorder_point = self.optimizer.optimize(list(self.demand_history), self.lead_time)["reorder_point"]
+        stock = state["manufacturer_inventory"]
+        forecast = state["forecast_demand"]
+        if stock < reorder_point / 2:
+            return "supply"
+        downstream = state["distributor_inventory"] + state["retail_inventory"]
+        if downstream < forecast * self.lead_time + min(state["backorders"], forecast) and \
+                stock >= reorder_point + forecast:
+            return "distribute"
+        return "manufacture"
+
+    def predict_actions(self, states):
+        return [self.predict_action(state) for state in states]
+
+
+POLICIES = {
+    "reorder_point": ReorderPointPolicy,
+}
+
+
+def state_text(state):
+    """A state in the "key=value, ..." form of data.csv, in STATE_FIELDS order."""
+    return ", ".join(f"{field}={state[field]}" for field in STATE_FIELDS)
+
+
+class LabellingPredictor:
+    """Predictor front that records every (state, action) the policy decides."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.rows = []
+
+    def predict_action(self, state):
+        action = self.policy.predict_action(state)
+        self.rows.append((state_text(state), action))
+        return action
+
+
+def perturbed_inventory(config, rng, jitter):
+    """Initial inventories scaled by a random factor in [1 - jitter, 1 + jitter]."""
+    return {
+        key: int(round(value * rng.uniform(1 - jitter, 1 + jitter)))
+        for key, value in config.inventory.items()
+        if key.startswith("initial_")
+    }
+
+
+def rollout(seed, num_steps, policy="reorder_point", jitter=0.5):
+    """Run one labelled simulation and return its [(state text, action), ...] rows."""
+    from main import run_simulation
+
+    rng = random.Random(seed)
+    config = SupplyChainConfig()
+    config.update({"inventory": perturbed_inventory(config, rng, jitter)})
+    factory = POLICIES[policy] if isinstance(policy, str) else policy
+
+    labeller = LabellingPredictor(factory(config))
+    run_simulation(num_steps=num_steps, predictor=labeller, config=config, verbose=False, seed=seed)
+    return labeller.rows
+
+
+def _rollout_batch(seeds, num_steps, policy, jitter):
+    return [row for seed in seeds for row in rollout(seed, num_steps, policy, jitter)]
+
+
+def generate(n_rollouts, num_steps, output_path, root_seed=0, max_workers=None,
+             policy="reorder_point", jitter=0.5, batch_size=16):
+    """
+    Write the rows of `n_rollouts` rollouts to output_path and return the row count.
+
+    `policy` is a POLICIES name or a picklable factory taking a
+    SupplyChainConfig. Rollouts go to the workers `batch_size` at a time
+    with at most a few batches per worker in flight, and rows are written
+    as batches complete, so memory stays flat however many rows are
+    generated. Row order depends on scheduling; the set of rows only on
+    root_seed.
+    """
+    seeds = scenario_seeds(root_seed, n_rollouts)
+    batches = iter([seeds[i:i + batch_size] for i in range(0, n_rollouts, batch_size)])
+    max_workers = max_workers or os.cpu_count() or 1
+
+    rows = 0
+    pending = set()
+    with open(output_path, "w", newline="", encoding="utf-8") as f, \
+            ProcessPoolExecutor(max_workers=max_workers) as pool:
+        writer = csv.writer(f)
+        writer.writerow(["state", "action"])
+        while True:
+            for batch in itertools.islice(batches, 4 * max_workers - len(pending)):
+                pending.add(pool.submit(_rollout_batch, batch, num_steps, policy, jitter))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_rows = future.result()
+                writer.writerows(batch_rows)
+                rows += len(batch_rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate labelled state,action rows from simulator rollouts.")
+    parser.add_argument("--rollouts", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=50, help="steps per rollout")
+    parser.add_argument("--output", default="decisions.csv")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="reorder_point")
+    parser.add_argument("--jitter", type=float, default=0.5,
+                        help="relative spread of the random initial inventories")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16, help="rollouts per worker task")
+    args = parser.parse_args(argv)
+
+    rows = generate(args.rollouts, args.steps, args.output, root_seed=args.seed,
+                    max_workers=args.workers, policy=args.policy, jitter=args.jitter,
+                    batch_size=args.batch_size)
+    print(f"Wrote {rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
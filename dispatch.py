@@ -0,0 +1,224 @@
+"""
+Registry-based dispatch of predicted actions to tool handlers.
+
+A handler applies one action to a state in place through the agents.py
+tools and returns the quantities moved ({"supply", "production",
+"distribution"}). Handlers are registered by action name with
+@register_action; ActionDispatcher looks the predicted action up in one
+dict lookup instead of walking an if/elif chain, and falls back to the
+default action (supply) for anything it does not know. New actions are
+added by registering a handler, without touching the step loop.
+
+The tools also have forward_batch(). A batch handler, registered with
+@register_batch_action, applies its action to the masked rows of an
+(n, len(STATE_FIELDS)) state array; run_batch() runs one per action and
+rejects actions that have none.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from agents import DistributeTool, ManufactureTool, RetailTool, SupplyTool
+from state import FIELD_INDEX
+
+DISTRIBUTOR_CAPACITY = 50
+DEFAULT_ACTION = "supply"
+
+ToolSet = namedtuple("ToolSet", ["supply", "manufacture", "distribute", "retail"])
+
+
+def default_tools():
+    return ToolSet(SupplyTool(), ManufactureTool(), DistributeTool(), RetailTool())
+
+
+ACTION_HANDLERS = {}
+BATCH_HANDLERS = {}
+
+
+def register_action(name):
+    """Decorator registering handler(state, tools) -> moved for action `name`."""
+
+    def register(handler):
+        ACTION_HANDLERS[name] = handler
+        return handler
+
+    return register
+
+
+def register_batch_action(name):
+    """
+    Decorator registering handler(states, mask, tools, **params) -> moved
+    for action `name`: it updates the rows of `states` where `mask` is set
+    in place and returns moved arrays that are zero elsewhere. params holds
+    run_batch's options (distributor_capacity).
+    """
+
+    def register(handler):
+        BATCH_HANDLERS[name] = handler
+        return handler
+
+    return register
+
+
+@register_action("supply")
+def supply(state, tools):
+    # Supplied raw materials leave the supplier now; the caller delivers them
+    # to the manufacturer once the lead time has passed (see main.receive_shipments)
+    manufacturer_demand = max(state["forecast_demand"] - state["manufacturer_inventory"], 0)
+    quantity = tools.supply.forward(manufacturer_demand, state["supplier_inventory"])
+    state["supplier_inventory"] -= quantity
+    return {"supply": quantity, "production": 0, "distribution": 0}
+
+
+@register_action("manufacture")
+def manufacture(state, tools):
+    production = tools.manufacture.forward(
+        raw_material=state["manufacturer_inventory"],
+        capacity=state["manufacturer_capacity"],
+        demand=state["retailer_customer_demand"] + state["backorders"]
+    )
+    state["manufacturer_capacity"] -= production
+    state["manufacturer_inventory"] += production
+    return {"supply": 0, "production": production, "distribution": 0}
+
+
+@register_action("distribute")
+def distribute(state, tools):
+    distributor_intake = min(state["manufacturer_inventory"], DISTRIBUTOR_CAPACITY - state["distributor_inventory"])
+    state["manufacturer_inventory"] -= distributor_intake
+    state["distributor_inventory"] += distributor_intake
+    retail_supply = tools.distribute.forward(
+        inventory=state["distributor_inventory"],
+        demand=state["retailer_customer_demand"] + state["backorders"]
+    )
+    state["distributor_inventory"] -= retail_supply
+    state["retail_inventory"] += retail_supply
+    return {"supply": 0, "production": 0, "distribution": retail_supply}
+
+
+@register_batch_action("supply")
+def supply_batch(states, mask, tools, **params):
+    supplier = states[:, FIELD_INDEX["supplier_inventory"]]
+    manufacturer_demand = np.maximum(
+        states[:, FIELD_INDEX["forecast_demand"]] - states[:, FIELD_INDEX["manufacturer_inventory"]], 0)
+    quantity = np.where(mask, tools.supply.forward_batch(manufacturer_demand, supplier), 0)
+    states[:, FIELD_INDEX["supplier_inventory"]] -= quantity
+    return {"supply": quantity}
+
+
+@register_batch_action("manufacture")
+def manufacture_batch(states, mask, tools, **params):
+    open_demand = states[:, FIELD_INDEX["retailer_customer_demand"]] + states[:, FIELD_INDEX["backorders"]]
+    production = np.where(mask, tools.manufacture.forward_batch(
+        states[:, FIELD_INDEX["manufacturer_inventory"]], states[:, FIELD_INDEX["manufacturer_capacity"]],
+        open_demand), 0)
+    states[:, FIELD_INDEX["manufacturer_capacity"]] -= production
+    states[:, FIELD_INDEX["manufacturer_inventory"]] += production
+    return {"production": production}
+
+
+@register_batch_action("distribute")
+def distribute_batch(states, mask, tools, distributor_capacity=DISTRIBUTOR_CAPACITY, **params):
+    manufacturer = states[:, FIELD_INDEX["manufacturer_inventory"]]
+    distributor = states[:, FIELD_INDEX["distributor_inventory"]]
+    open_demand = states[:, FIELD_INDEX["retailer_customer_demand"]] + states[:, FIELD_INDEX["backorders"]]
+    intake = np.where(mask, np.minimum(manufacturer, distributor_capacity - distributor), 0)
+    retail_supply = np.where(mask, tools.distribute.forward_batch(distributor + intake, open_demand), 0)
+    states[:, FIELD_INDEX["manufacturer_inventory"]] -= intake
+    states[:, FIELD_INDEX["distributor_inventory"]] += intake - retail_supply
+    states[:, FIELD_INDEX["retail_inventory"]] += retail_supply
+    return {"distribution": retail_supply}
+
+
+def fulfil_demand(state, retail_tool):
+    """
+    Retail sells to its customers through RetailTool: this step's demand
+    first, then the backorders. Unmet demand is backordered. Returns
+    (units sold to this step's demand, total units sold).
+    """
+    demand = state["retailer_customer_demand"]
+    fulfilled = retail_tool.forward(customer_demand=demand, available_stock=state["retail_inventory"])
+    backfilled = retail_tool.forward(customer_demand=state["backorders"],
+                                     available_stock=state["retail_inventory"] - fulfilled)
+    state["retail_inventory"] -= fulfilled + backfilled
+    state["backorders"] += demand - fulfilled - backfilled
+    return fulfilled, fulfilled + backfilled
+
+
+def fulfil_demand_batch(states, retail_tool):
+    """fulfil_demand() for every row of an (n, len(STATE_FIELDS)) state array, in place."""
+    demand = states[:, FIELD_INDEX["retailer_customer_demand"]]
+    retail = states[:, FIELD_INDEX["retail_inventory"]]
+    backorders = states[:, FIELD_INDEX["backorders"]]
+    fulfilled = retail_tool.forward_batch(demand, retail)
+    backfilled = retail_tool.forward_batch(backorders, retail - fulfilled)
+    sold = fulfilled + backfilled
+    states[:, FIELD_INDEX["retail_inventory"]] -= sold
+    states[:, FIELD_INDEX["backorders"]] += demand - sold
+    return fulfilled, sold
+
+
+class ActionDispatcher:
+    """
+    Applies predicted actions with one set of tools.
+
+    `handlers` and `batch_handlers` default to every @register_action and
+    @register_batch_action handler; register() adds or overrides one for
+    this dispatcher only.
+    """
+
+    def __init__(self, tools=None, handlers=None, default=DEFAULT_ACTION, batch_handlers=None):
+        self.tools = tools or default_tools()
+        self.handlers = dict(ACTION_HANDLERS if handlers is None else handlers)
+        self.batch_handlers = dict(BATCH_HANDLERS if batch_handlers is None else batch_handlers)
+        self.default = default
+        self._bind()
+
+    def _bind(self):
+        # A closure over the lookup table skips the attribute lookups of a method call
+        handlers, fallback, tools = self.handlers, self.handlers[self.default], self.tools
+
+        def apply(state, action):
+            """Apply `action` to state in place and return the quantities moved."""
+            return handlers.get(action, fallback)(state, tools)
+
+        self.apply = apply
+
+    def register(self, name, handler, batch_handler=None):
+        self.handlers[name] = handler
+        if batch_handler is not None:
+            self.batch_handlers[name] = batch_handler
+        self._bind()
+
+    def __call__(self, state, action):
+        return self.apply(state, action)
+
+    def run_batch(self, states, codes, actions=("supply", "manufacture", "distribute"),
+                  distributor_capacity=DISTRIBUTOR_CAPACITY):
+        """
+        Apply action `actions[codes[i]]` to row i of an (n, len(STATE_FIELDS))
+        int64 state array in place, through the batch handlers; codes
+        outside `actions` take the default action. Each row takes one
+        action, so every quantity comes from that row's pre-step state.
+        Returns the moved arrays. Raises ValueError, before changing any
+        row, if a row's action has no batch handler.
+        """
+        codes = np.asarray(codes)
+        n = len(states)
+        moved = {key: np.zeros(n, dtype=np.int64) for key in ("supply", "production", "distribution")}
+        masks = {}
+        known = np.zeros(n, dtype=bool)
+        for code, name in enumerate(actions):
+            mask = codes == code
+            masks[name] = masks[name] | mask if name in masks else mask
+            known |= mask
+        masks[self.default] = masks[self.default] | ~known if self.default in masks else ~known
+        masks = {name: mask for name, mask in masks.items() if mask.any()}
+        missing = [name for name in masks if name not in self.batch_handlers]
+        if missing:
+            raise ValueError(f"No batch handler registered for action(s): {', '.join(map(repr, missing))}")
+        for name, mask in masks.items():
+            for key, values in self.batch_handlers[name](states, mask, self.tools,
+                                                         distributor_capacity=distributor_capacity).items():
+                moved[key] = moved[key] + values if key in moved else values
+        return moved
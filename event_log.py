@@ -0,0 +1,220 @@
+"""
+Pluggable sinks for the per-step simulation event log.
+
+run_simulation emits one event per step: a flat dict with the step number,
+the predicted action, the quantities moved, a snapshot of the state and
+the running performance metrics (see EVENT_FIELDS). Sinks decide what
+happens to it: nothing (NullSink), human-readable output (PrintSink),
+buffered JSON lines (JsonLinesSink) or binary columns (ColumnarSink).
+File sinks start a new log at their path unless created with
+append=True. make_sink() picks one from SupplyChainConfig.logging.
+"""
+import abc
+import json
+import os
+
+import numpy as np
+
+from state import state_values
+from utils import STATE_FIELDS, print_state_changes
+
+QUANTITY_FIELDS = ("supply", "production", "distribution", "sold", "arrived")
+METRIC_FIELDS = ("fill_rate", "inventory_turnover", "total_backorders", "total_costs", "average_inventory")
+EVENT_FIELDS = ("step", "action") + QUANTITY_FIELDS + STATE_FIELDS + METRIC_FIELDS
+
+# Actions as stored in the columnar log; anything else is stored as "unknown"
+ACTION_CODES = ("supply", "manufacture", "distribute", "unknown")
+
+
+def step_event(step, action, quantities, state, metrics):
+    """Build the event record for one simulation step."""
+    event = {"step": step, "action": action}
+    for field in QUANTITY_FIELDS:
+        event[field] = quantities.get(field, 0)
+    event.update(zip(STATE_FIELDS, state_values(state)))
+    event["fill_rate"] = metrics["fill_rate"]
+    event["inventory_turnover"] = metrics["inventory_turnover"]
+    event["total_backorders"] = metrics["backorders"]
+    event["total_costs"] = metrics["total_costs"]
+    event["average_inventory"] = metrics["average_inventory"]
+    return event
+
+
+class NullSink:
+    """Discards every event."""
+
+    def start(self, state):
+        """Called with the state a run starts (or resumes) from, before its first event."""
+
+    def record(self, event):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PrintSink(NullSink):
+    """Prints each step in human-readable form, like the original per-step output."""
+
+    LABELS = {"supply": "Supply", "manufacture": "Production", "distribute": "Distribution"}
+
+    def __init__(self):
+        self._state = None
+
+    def start(self, state):
+        self._state = dict(zip(STATE_FIELDS, state_values(state)))
+
+    def record(self, event):
+        step, action = event["step"], event["action"]
+        print(f"\nStep {step + 1}")
+        if self._state is not None:
+            print("Starting state:", self._state)
+        print(f"Forecast demand: {event['forecast_demand']}")
+        print("Predicted action from AutoML:", action)
+        if action not in self.LABELS:
+            print("Unknown action predicted. Executing default supply action.")
+
+        if action == "manufacture":
+            changes = {"Goods manufactured": event["production"]}
+        elif action == "distribute":
+            changes = {"Retail supply": event["distribution"]}
+        else:
+            changes = {"Raw materials supplied": event["supply"]}
+        print_state_changes(event, step, self.LABELS.get(action, "Supply (default)"), changes)
+        if event["arrived"]:
+            print(f"Raw materials arrived at manufacturer: {event['arrived']}")
+
+        print("\nPerformance Metrics:")
+        for field in METRIC_FIELDS:
+            print(f"{field}: {event[field]}")
+        self._state = {field: event[field] for field in STATE_FIELDS}
+        print("\nEnd state:", self._state)
+
+
+class _BufferedSink(NullSink, abc.ABC):
+    """
+    Collects events in memory and writes them out every `batch_size` events.
+
+    The log at `path` is started afresh unless `append` is set, in which
+    case new events are added after the ones already there. Subclasses
+    implement _write(events), which writes one batch.
+    """
+
+    def __init__(self, path, batch_size=1000, append=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.append = append
+        self._buffer = []
+
+    def record(self, event):
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    @abc.abstractmethod
+    def _write(self, events):
+        """Write a batch of events to the log."""
+
+
+class JsonLinesSink(_BufferedSink):
+    """Writes one JSON object per event to a .jsonl file, a batch at a time."""
+
+    def __init__(self, path, batch_size=1000, append=False):
+        super().__init__(path, batch_size, append)
+        if not append:
+            open(path, "w", encoding="utf-8").close()
+
+    def _write(self, events):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(event) + "\n" for event in events))
+
+
+class ColumnarSink(_BufferedSink):
+    """
+    Writes each event field to its own raw binary file in directory `path`.
+
+    Every column is a flat little-endian array (`<field>.bin`) described by
+    `schema.json`, so a log can be memory-mapped column by column with
+    load_event_log() without reading the rest. Actions are stored as int8
+    codes into ACTION_CODES. Appending to an existing log requires its
+    schema to match.
+    """
+
+    def __init__(self, path, batch_size=1000, append=False):
+        super().__init__(path, batch_size, append)
+        os.makedirs(path, exist_ok=True)
+        schema = {field: "<i8" for field in EVENT_FIELDS}
+        schema["action"] = "<i1"
+        for field in ("fill_rate", "inventory_turnover", "total_costs", "average_inventory"):
+            schema[field] = "<f8"
+        self.schema = schema
+        header = {"columns": schema, "actions": list(ACTION_CODES)}
+        schema_path = os.path.join(path, "schema.json")
+        if append and os.path.exists(schema_path):
+            with open(schema_path, encoding="utf-8") as f:
+                if json.load(f) != header:
+                    raise ValueError(f"Cannot append to {path}: its schema differs from this sink's")
+            return
+        for name in os.listdir(path):
+            if name.endswith(".bin"):
+                os.remove(os.path.join(path, name))
+        with open(schema_path, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+
+    def _write(self, events):
+        unknown = ACTION_CODES.index("unknown")
+        for field, dtype in self.schema.items():
+            if field == "action":
+                values = [ACTION_CODES.index(e["action"]) if e["action"] in ACTION_CODES else unknown
+                          for e in events]
+            else:
+                values = [event[field] for event in events]
+            with open(os.path.join(self.path, f"{field}.bin"), "ab") as f:
+                np.asarray(values, dtype=dtype).tofile(f)
+
+
+def load_event_log(path):
+    """Memory-map a ColumnarSink directory as {field: array}; actions are decoded to names."""
+    with open(os.path.join(path, "schema.json"), encoding="utf-8") as f:
+        schema = json.load(f)
+    columns = {}
+    for field, dtype in schema["columns"].items():
+        file_path = os.path.join(path, f"{field}.bin")
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            columns[field] = np.zeros(0, dtype=dtype)
+        else:
+            columns[field] = np.memmap(file_path, dtype=dtype, mode="r")
+    columns["action"] = np.asarray(schema["actions"])[columns["action"]]
+    return columns
+
+
+SINKS = {
+    "none": NullSink,
+    "print": PrintSink,
+    "jsonl": JsonLinesSink,
+    "columnar": ColumnarSink,
+}
+
+
+def make_sink(logging_config):
+    """Create the sink described by a SupplyChainConfig.logging section."""
+    kind = logging_config.get("sink", "print")
+    if kind not in SINKS:
+        raise ValueError(f"Unknown event sink: {kind}")
+    if kind in ("none", "print"):
+        return SINKS[kind]()
+    if not logging_config.get("path"):
+        raise ValueError(f"The {kind} event sink needs a path")
+    return SINKS[kind](logging_config["path"], logging_config.get("batch_size", 1000),
+                       logging_config.get("append", False))
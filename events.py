@@ -0,0 +1,71 @@
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+# A scheduled event: `quantity` units of `kind` (e.g. "raw_materials") due at
+# simulated time `time`; `seq` keeps same-time events in scheduling order.
+Event = namedtuple("Event", ["time", "seq", "kind", "quantity"])
+
+
+class EventScheduler:
+    """
+    Discrete-event clock with a priority-queue event list.
+
+    Time is measured in simulation steps and only moves when advance() is
+    called, so waiting out a lead time costs nothing in wall-clock terms.
+    """
+
+    def __init__(self, start=0):
+        self.now = start
+        self._queue = []
+        self._next_seq = 0
+
+    def schedule(self, delay, kind, quantity):
+        """Schedule `quantity` units of `kind` to arrive `delay` steps from now."""
+        if delay < 0:
+            raise ValueError(f"Cannot schedule an event in the past (delay={delay})")
+        event = Event(self.now + delay, self._next_seq, kind, quantity)
+        self._next_seq += 1
+        heapq.heappush(self._queue, event)
+        return event
+
+    def advance(self, until):
+        """
+        Move the clock to `until` and return, in order, the events that came
+        due before it (an event at time t arrives once step t is over).
+        """
+        due = []
+        while self._queue and self._queue[0].time < until:
+            due.append(heapq.heappop(self._queue))
+        self.now = until
+        return due
+
+    def in_transit(self, kind=None):
+        """Total quantity still scheduled to arrive (optionally of one kind)."""
+        return sum(event.quantity for event in self._queue if kind is None or event.kind == kind)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def getstate(self):
+        """Clock and pending events as a flat dict of NumPy arrays (see checkpoint.py)."""
+        kinds = sorted({event.kind for event in self._queue})
+        return {
+            "clock": np.array([self.now, self._next_seq]),
+            "time": np.array([event.time for event in self._queue], dtype=np.int64),
+            "seq": np.array([event.seq for event in self._queue], dtype=np.int64),
+            "kind": np.array([kinds.index(event.kind) for event in self._queue], dtype=np.int64),
+            "kinds": np.array(kinds, dtype=str),
+            "quantity": np.array([event.quantity for event in self._queue]),
+        }
+
+    def setstate(self, data):
+        self.now, self._next_seq = data["clock"].tolist()
+        kinds = data["kinds"].tolist()
+        # A heap stored in list order is still a valid heap
+        self._queue = [
+            Event(time, seq, kinds[kind], quantity)
+            for time, seq, kind, quantity in zip(data["time"].tolist(), data["seq"].tolist(),
+                                                 data["kind"].tolist(), data["quantity"].tolist())
+        ]
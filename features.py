@@ -0,0 +1,82 @@
+import threading
+
+import numpy as np
+
+from state import SupplyChainState
+from utils import STATE_FIELDS
+
+
+def parse_state_text(text):
+    """Parse a legacy "key=value, ..." state string (as in data.csv) into a dict."""
+    state = {}
+    for pair in text.split(","):
+        key, value = pair.strip().split("=")
+        state[key] = int(value)
+    return state
+
+
+class StateEncoder:
+    """
+    Fixed-schema encoder that maps the state fields straight into a NumPy row.
+
+    Columns always follow STATE_FIELDS, so the encoding does not depend on
+    the key order of the state dict. Each thread encodes into its own
+    preallocated row, so one encoder can be shared between threads.
+    """
+
+    def __init__(self, fields=STATE_FIELDS, dtype=np.float64):
+        self.fields = tuple(fields)
+        self.dtype = dtype
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {"fields": self.fields, "dtype": self.dtype}
+
+    def __setstate__(self, data):
+        self.__init__(data["fields"], data["dtype"])
+
+    @property
+    def _row(self):
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.zeros((1, len(self.fields)), dtype=self.dtype)
+        return row
+
+    @property
+    def feature_names(self):
+        return list(self.fields)
+
+    def encode(self, state):
+        """
+        Encode one state into the calling thread's preallocated (1, n_fields) row.
+
+        The returned array is reused by the thread's next call; copy it if
+        it has to outlive that.
+        """
+        out = self._row
+        row = out[0]
+        if isinstance(state, SupplyChainState) and self.fields == STATE_FIELDS:
+            row[:] = state.snapshot()
+            return out
+        try:
+            for i, field in enumerate(self.fields):
+                row[i] = state[field]
+        except KeyError as exc:
+            raise ValueError(f"Missing state field: {exc.args[0]}") from None
+        return out
+
+    def encode_batch(self, states, out=None):
+        """Encode a sequence of states into an (n_states, n_fields) matrix."""
+        if out is None:
+            out = np.empty((len(states), len(self.fields)), dtype=self.dtype)
+        if len(states) == 0:
+            return out
+        try:
+            out[:] = [[state[field] for field in self.fields] for state in states]
+        except KeyError as exc:
+            raise ValueError(f"Missing state field: {exc.args[0]}") from None
+        return out
+
+    def encode_text(self, texts):
+        """Encode legacy "key=value, ..." strings, e.g. the 'state' column of data.csv."""
+        return self.encode_batch([parse_state_text(text) for text in texts])
@@ -1,127 +1,252 @@
 # main.py
-from smolagents import CodeAgent, HfApiModel
-import random
-import time
+import contextlib
+import functools
 
 from agents import SupplyTool, ManufactureTool, DistributeTool, RetailTool
-from utils import DemandForecast, PerformanceMetrics, CostManager, print_state_changes, validate_state
+from checkpoint import capture, checkpoint_config, load_checkpoint, restore, save_checkpoint
+from config import SupplyChainConfig
+from dispatch import ActionDispatcher, ToolSet, fulfil_demand
+from event_log import NullSink, make_sink, step_event
+from events import EventScheduler
+from model_backends import LazyAgent, make_model
+from profiling import NullTimer, PhaseTimer, RunProfiler
+from state import SupplyChainState
+from streams import RandomStreams, TraceStreams
+from utils import DemandForecast, PerformanceMetrics, CostManager, validate_state
+
+# Memoizing front for our automl predictor (the model itself is loaded on first use)
+from prediction_cache import CachedPredictor
+
+# Shared across runs in this process, so repeated states cost a dict lookup
+default_predictor = CachedPredictor()
+
+@functools.lru_cache(maxsize=8)
+def _dispatcher(supply_tool, manufacture_tool, distribute_tool, retail_tool):
+    # One dispatcher per set of tools; building tools and dispatchers costs far more than a step
+    tools = ToolSet(supply_tool, manufacture_tool, distribute_tool, retail_tool or RetailTool())
+    return ActionDispatcher(tools).apply
+
+def apply_action(state, action, supply_tool, manufacture_tool, distribute_tool, retail_tool=None):
+    """
+    Run the tool for a predicted action and update state in place.
+
+    Unknown actions fall back to supply. Returns the quantities moved:
+    {"supply": ..., "production": ..., "distribution": ...}. The
+    dispatch.ActionDispatcher for these tools is built on first use and
+    reused; run_simulation keeps its own for the whole run.
+    """
+    return _dispatcher(supply_tool, manufacture_tool, distribute_tool, retail_tool)(state, action)
+
+def restock(state, resupply, customer_demand, capacity=50):
+    """End-of-step update: reset capacity, resupply the supplier and set the new demand."""
+    state["manufacturer_capacity"] = capacity  # reset capacity
+    state["supplier_inventory"] += resupply
+    state["retailer_customer_demand"] = customer_demand
+
+def receive_shipments(state, scheduler, until):
+    """Advance the event clock and add arrived raw materials to the manufacturer."""
+    arrived = 0
+    for event in scheduler.advance(until):
+        state["manufacturer_inventory"] += event.quantity
+        arrived += event.quantity
+    return arrived
+
+def run_simulation(num_steps=None, predictor=None, config=None, verbose=True, sink=None,
+                   timer=None, profiler=None, resume_from=None, seed=None, model=None, trace=None,
+                   ledger=None):
+    """
+    Run the supply chain simulation and return its performance metrics.
+
+    Inventories, costs, resupply and demand ranges come from `config`
+    (a SupplyChainConfig, defaults if omitted). Every step is recorded as
+    one event on `sink` (see event_log.py); by default the sink is built
+    from config.logging, and `verbose=False` discards the events instead,
+    e.g. for parameter sweeps.
+
+    Time is simulated: supplied raw materials are scheduled on an
+    EventScheduler and reach the manufacturer `lead_time` steps later
+    (plus up to config.simulation["lead_time_jitter"] random steps).
+
+    Resupply, demand and lead-time noise each draw from their own stream
+    of a streams.RandomStreams rooted at `seed` (default
+    config.simulation["random_seed"]), so runs are reproducible and
+    independent of the global `random` module. A `trace` of pre-drawn
+    values (see streams.TraceStreams) replaces the streams, e.g. to replay
+    the same demand against several policies.
+
+    Each step the retailer sells to its customers (dispatch.fulfil_demand),
+    backordering what it cannot fill, and the fill rate, inventory levels
+    and CostManager costs of the step go into the returned metrics. Pass a
+    utils.CostLedger with at least num_steps rows as `ledger` to also get
+    every step's costs by category (a shorter one raises ValueError before
+    the run starts).
+
+    Pass a profiling.PhaseTimer as `timer` to collect per-phase latencies
+    (forecast, predict and its sub-phases, tool, retail, restock,
+    forecast_update, metrics, event_log)
+    and a profiling.RunProfiler as `profiler` to run under cProfile and/or
+    tracemalloc. Both are also created from config.profiling when enabled
+    there, and written to its output_dir after the run.
+
+    With config.simulation["checkpoint_every"] set, a checkpoint (see
+    checkpoint.py) is saved to its checkpoint_path every that many steps.
+    `resume_from` (a checkpoint path or loaded dict) continues such a run
+    bit-exactly from its last saved step, up to the same num_steps total;
+    its own config is used unless `config` is given.
+
+    The CodeAgent's model is `model` if given, else built from config.agent
+    (see model_backends.py), and only when an agent session actually runs.
+    """
+    if resume_from is not None and not isinstance(resume_from, dict):
+        resume_from = load_checkpoint(resume_from)
+    if config is None and resume_from is not None:
+        config = checkpoint_config(resume_from)
+    config = config or SupplyChainConfig()
+    if num_steps is None:
+        num_steps = config.simulation["num_steps"]
+    if ledger is not None and ledger.num_steps < num_steps:
+        raise ValueError(f"The cost ledger has {ledger.num_steps} rows, but the run has {num_steps} steps")
+    owns_sink = sink is None
+    if owns_sink:
+        sink = make_sink(config.logging) if verbose else NullSink()
+
+    profiling = config.profiling
+    if timer is None:
+        timer = PhaseTimer() if profiling["phase_timers"] else NullTimer()
+    if profiler is None and (profiling["cprofile"] or profiling["tracemalloc"]):
+        profiler = RunProfiler(cprofile=profiling["cprofile"], tracemalloc=profiling["tracemalloc"])
 
-# Import our automl predictor function
-from automl_predictor import predict_action
-
-def run_simulation(num_steps=5):
     # Initialize tools
     supply_tool = SupplyTool()
     manufacture_tool = ManufactureTool()
     distribute_tool = DistributeTool()
     retail_tool = RetailTool()
+    dispatch_action = ActionDispatcher(ToolSet(supply_tool, manufacture_tool, distribute_tool, retail_tool)).apply
 
     # Initialize support classes
-    model = HfApiModel(model_id="meta-llama/Llama-3.3-70B-Instruct")
-    demand_forecast = DemandForecast()
+    demand_forecast = DemandForecast(
+        window_size=config.demand["forecast_window"],
+        alpha=config.demand["smoothing_alpha"],
+        beta=config.demand["smoothing_beta"]
+    )
     metrics = PerformanceMetrics()
 
     # Cost configuration
-    costs = {
-        "raw_material": 10,
-        "manufacturing": 15,
-        "distribution": 5,
-        "holding": 2,
-        "backorder": 20
-    }
-    cost_manager = CostManager(costs)
-
-    # Initialize the central agent
-    agent = CodeAgent(
+    cost_manager = CostManager(dict(config.costs), ledger=ledger)
+
+    if predictor is None:
+        predictor = default_predictor
+
+    # The central agent; its model (config.agent) is only built once a session runs
+    agent = LazyAgent(
         tools=[supply_tool, manufacture_tool, distribute_tool, retail_tool],
-        model=model
+        model_factory=lambda: model or make_model(config.agent)
     )
 
     # Define initial state
-    state = {
-        "supplier_inventory": 100,
-        "manufacturer_capacity": 50,
-        "manufacturer_inventory": 0,
-        "distributor_inventory": 50,
-        "retail_inventory": 0,
-        "retailer_customer_demand": 40,
-        "backorders": 0,
-        "forecast_demand": 40
-    }
+    inventory = config.inventory
+    state = SupplyChainState(
+        supplier_inventory=inventory["initial_supplier"],
+        manufacturer_capacity=inventory["manufacturer_capacity"],
+        manufacturer_inventory=inventory["initial_manufacturer"],
+        distributor_inventory=inventory["initial_distributor"],
+        retail_inventory=inventory["initial_retail"],
+        retailer_customer_demand=config.demand["base"],
+        backorders=0,
+        forecast_demand=config.demand["base"]
+    )
     validate_state(state)
-
-    for step in range(num_steps):
-        print(f"\nStep {step + 1}")
-        print("Starting state:", state)
-        
-        # Update demand forecast (example)
-        state["forecast_demand"] = demand_forecast.forecast()
-        print(f"Forecast demand: {state['forecast_demand']}")
-
-        # Use our AutoML predictor to decide which action to run
-        predicted_action = predict_action(state)
-        print("Predicted action from AutoML:", predicted_action)
-
-        # Use dynamic decision to run the corresponding tool
-        if predicted_action == "supply":
-            manufacturer_demand = max(state["forecast_demand"] - state["manufacturer_inventory"], 0)
-            supply = supply_tool.forward(manufacturer_demand, state["supplier_inventory"])
-            state["supplier_inventory"] -= supply
-            print_state_changes(state, step, "Supply", {"Raw materials supplied": supply})
-            time.sleep(0.5)  # Simulate lead time
-
-        elif predicted_action == "manufacture":
-            production = manufacture_tool.forward(
-                raw_material=state["manufacturer_inventory"],
-                capacity=state["manufacturer_capacity"],
-                demand=state["retailer_customer_demand"] + state["backorders"]
-            )
-            state["manufacturer_capacity"] -= production
-            state["manufacturer_inventory"] += production
-            print_state_changes(state, step, "Production", {"Goods manufactured": production})
-
-        elif predicted_action == "distribute":
-            distributor_intake = min(state["manufacturer_inventory"], 50 - state["distributor_inventory"])
-            state["manufacturer_inventory"] -= distributor_intake
-            state["distributor_inventory"] += distributor_intake
-            retail_supply = distribute_tool.forward(
-                inventory=state["distributor_inventory"],
-                demand=state["retailer_customer_demand"] + state["backorders"]
-            )
-            state["distributor_inventory"] -= retail_supply
-            state["retail_inventory"] += retail_supply
-            print_state_changes(state, step, "Distribution", {"Retail supply": retail_supply})
-
+    resupply = config.resupply
+    demand = config.demand
+    lead_time = int(config.simulation["lead_time"])
+    lead_time_jitter = int(config.simulation["lead_time_jitter"])
+    if trace is not None:
+        streams = TraceStreams(trace)
+    else:
+        streams = RandomStreams(config.simulation["random_seed"] if seed is None else seed)
+    scheduler = EventScheduler()
+    checkpoint_every = config.simulation["checkpoint_every"]
+    start_step = 0
+    if resume_from is not None:
+        start_step = restore(resume_from, state, demand_forecast, metrics, cost_manager, scheduler, streams)
+
+    try:
+        sink.start(state)
+        with timer.activate(), (profiler or contextlib.nullcontext()):
+            for step in range(start_step, num_steps):
+                # Update demand forecast (example)
+                with timer.span("forecast"):
+                    state["forecast_demand"] = demand_forecast.forecast()
+
+                # Use our AutoML predictor to decide which action to run
+                with timer.span("predict"):
+                    predicted_action = predictor.predict_action(state)
+
+                # Use dynamic decision to run the corresponding tool
+                with timer.span("tool"):
+                    moved = dispatch_action(state, predicted_action)
+                    if moved["supply"]:
+                        delay = lead_time
+                        if lead_time_jitter:
+                            delay += streams.integers("lead_time", 0, lead_time_jitter)
+                        scheduler.schedule(delay, "raw_materials", moved["supply"])  # Simulate lead time
+
+                # Serve this step's customers, backordering what retail cannot fill
+                with timer.span("retail"):
+                    fulfilled, moved["sold"] = fulfil_demand(state, retail_tool)
+                    metrics.update_fill_rate(state["retailer_customer_demand"], fulfilled)
+
+                # Reset capacities, resupply inventories, etc.
+                with timer.span("restock"):
+                    restock(
+                        state,
+                        resupply=streams.integers("resupply", resupply["min_amount"], resupply["max_amount"]),
+                        customer_demand=max(  # update demand
+                            demand["base"] + streams.integers("demand", demand["min_variation"], demand["max_variation"]), 0
+                        ),
+                        capacity=inventory["manufacturer_capacity"],
+                    )
+                    moved["arrived"] = receive_shipments(state, scheduler, step + 1)
+                with timer.span("forecast_update"):
+                    demand_forecast.update(state["retailer_customer_demand"])
+
+                # Record the step with the performance metrics at its end
+                with timer.span("metrics"):
+                    metrics.update_costs(cost_manager.calculate_costs(
+                        state, moved["supply"], moved["production"], moved["distribution"]))
+                    metrics.update_inventory({
+                        "supplier": state["supplier_inventory"],
+                        "manufacturer": state["manufacturer_inventory"],
+                        "distributor": state["distributor_inventory"],
+                        "retail": state["retail_inventory"],
+                    })
+                    step_metrics = metrics.calculate_metrics()
+                with timer.span("event_log"):
+                    sink.record(step_event(step, predicted_action, moved, state, step_metrics))
+
+                if checkpoint_every and (step + 1) % checkpoint_every == 0:
+                    with timer.span("checkpoint"):
+                        save_checkpoint(config.simulation["checkpoint_path"],
+                                        capture(step + 1, config, state, demand_forecast,
+                                                metrics, cost_manager, scheduler, streams))
+    finally:
+        if owns_sink:
+            sink.close()
         else:
-            print("Unknown action predicted. Executing default supply action.")
-            manufacturer_demand = max(state["forecast_demand"] - state["manufacturer_inventory"], 0)
-            supply = supply_tool.forward(manufacturer_demand, state["supplier_inventory"])
-            state["supplier_inventory"] -= supply
-            print_state_changes(state, step, "Supply (default)", {"Raw materials supplied": supply})
-
-        # Other simulation steps: backorder management, cost calculations, etc.
-        # For example:
-        # ... (rest of simulation logic)
-        
-        # Update metrics, adjust state for the next step, etc.
-        # Reset capacities, resupply inventories, etc.
-        state["manufacturer_capacity"] = 50  # reset capacity
-        state["supplier_inventory"] += random.randint(10, 20)  # simulate resupply
-        state["retailer_customer_demand"] = max(40 + random.randint(-5, 5), 0)  # update demand
-        demand_forecast.update(state["retailer_customer_demand"])
-
-        # Print performance metrics at the end of the step
-        print("\nPerformance Metrics:")
-        current_metrics = metrics.calculate_metrics()
-        for metric, value in current_metrics.items():
-            print(f"{metric}: {value}")
-        print("\nEnd state:", state)
+            sink.flush()
+
+    if profiling["output_dir"]:
+        if isinstance(timer, PhaseTimer):
+            timer.write(profiling["output_dir"])
+        if profiler is not None:
+            profiler.write(profiling["output_dir"])
 
     return metrics.calculate_metrics()
 
 if __name__ == "__main__":
-    random.seed(42)  # For reproducibility
-    final_metrics = run_simulation()
+    config = SupplyChainConfig()
+    final_metrics = run_simulation(config=config)
     print("\nFinal Simulation Metrics:")
     for metric, value in final_metrics.items():
         print(f"{metric}: {value}")
+    print("Prediction cache:", default_predictor.cache.stats())
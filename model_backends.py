@@ -0,0 +1,242 @@
+"""
+Pluggable model backends for the CodeAgent.
+
+make_model() builds the agent's model from SupplyChainConfig.agent:
+
+  backend="hf"      HfApiModel (InferenceClientModel) for `model_id`, a remote call per turn
+  backend="local"   LocalRuleModel, a deterministic offline stand-in for tests
+
+With a cache_dir, the model is wrapped in a CachedModel: responses are
+stored on disk under a SHA-256 of the model id, the prompt messages,
+the generation options and the schemas of the tools offered, so an
+identical agent turn in any later run, replica or process is answered
+from local storage. The cache is bounded to max_bytes and evicts the
+least recently used responses first.
+
+LazyAgent defers building the CodeAgent (and its model) until a session
+actually runs, so simulations that never consult the agent do not pay for
+it.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+from smolagents import Model
+from smolagents.models import ChatMessage, MessageRole
+
+DEFAULT_MODEL_ID = "meta-llama/Llama-3.3-70B-Instruct"
+
+
+def _message_data(message):
+    if hasattr(message, "model_dump_json"):
+        data = json.loads(message.model_dump_json())
+        data.pop("token_usage", None)
+        return data
+    return message
+
+
+def _tool_schema(tool):
+    return {"name": tool.name, "description": tool.description,
+            "inputs": tool.inputs, "output_type": tool.output_type}
+
+
+def _prompt_text(messages):
+    """Text of the last user message (content may be a string or a list of parts)."""
+    for message in reversed(messages):
+        data = _message_data(message)
+        role = data.get("role")
+        if getattr(role, "value", role) == "user":
+            content = data.get("content") or ""
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content
+    return ""
+
+
+class LocalRuleModel(Model):
+    """
+    Deterministic offline model: answers every turn with a CodeAgent code
+    block choosing an action for the "key=value, ..." state found in the
+    last user message (supply when the manufacturer runs low, distribute
+    when the distributor does, otherwise manufacture).
+    """
+
+    STATE_PATTERN = re.compile(r"(\w+)=(-?\d+)")
+
+    def __init__(self, reorder_level=20, **kwargs):
+        super().__init__(model_id="local-rule", **kwargs)
+        self.reorder_level = reorder_level
+        self.requests = 0
+
+    def choose_action(self, state):
+        if state.get("manufacturer_inventory", 0) < self.reorder_level:
+            return "supply"
+        if state.get("distributor_inventory", 0) < self.reorder_level:
+            return "distribute"
+        return "manufacture"
+
+    def generate(self, messages, stop_sequences=None, response_format=None,
+                 tools_to_call_from=None, **kwargs):
+        self.requests += 1
+        state = {key: int(value) for key, value in self.STATE_PATTERN.findall(_prompt_text(messages))}
+        action = self.choose_action(state)
+        return ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=f"Thought: the state calls for {action}.\n<code>\nfinal_answer({action!r})\n</code>",
+        )
+
+
+class ResponseCache:
+    """
+    Size-bounded on-disk store of model responses, one JSON file per key.
+
+    Hits refresh a file's mtime, and when the total size exceeds max_bytes
+    the files with the oldest mtime are deleted first (LRU). Files are
+    written atomically, so processes can share a directory.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        return [entry.path for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        files = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        self._size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+class CachedModel(Model):
+    """Serves repeated generate() calls of the wrapped model from a ResponseCache."""
+
+    def __init__(self, model, cache):
+        super().__init__(model_id=model.model_id)
+        self.model = model
+        self.cache = cache
+
+    def cache_key(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None,
+                  **kwargs):
+        payload = {
+            "model_id": self.model_id,
+            "messages": [_message_data(message) for message in messages],
+            "stop_sequences": stop_sequences,
+            "response_format": response_format,
+            "tools": [_tool_schema(tool) for tool in tools_to_call_from or ()],
+            "kwargs": kwargs,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def generate(self, messages, stop_sequences=None, response_format=None,
+                 tools_to_call_from=None, **kwargs):
+        key = self.cache_key(messages, stop_sequences, response_format, tools_to_call_from, **kwargs)
+        data = self.cache.get(key)
+        if data is not None:
+            return ChatMessage.from_dict(data)
+        message = self.model.generate(messages, stop_sequences=stop_sequences, response_format=response_format,
+                                      tools_to_call_from=tools_to_call_from, **kwargs)
+        self.cache.put(key, _message_data(message))
+        return message
+
+    def __getattr__(self, name):
+        if name == "model":  # not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+def make_model(agent_config):
+    """The CodeAgent model described by a SupplyChainConfig.agent section."""
+    backend = agent_config["backend"]
+    if backend == "local":
+        model = LocalRuleModel()
+    elif backend == "hf":
+        try:
+            from smolagents import HfApiModel
+        except ImportError:  # renamed to InferenceClientModel in newer smolagents releases
+            from smolagents import InferenceClientModel as HfApiModel
+        model = HfApiModel(model_id=agent_config["model_id"] or DEFAULT_MODEL_ID)
+    else:
+        raise ValueError(f"Unknown agent backend: {backend}")
+    if agent_config["cache_dir"]:
+        model = CachedModel(model, ResponseCache(agent_config["cache_dir"], agent_config["cache_max_bytes"]))
+    return model
+
+
+class LazyAgent:
+    """A CodeAgent over `tools` whose model and agent are built on first use."""
+
+    def __init__(self, tools, model_factory, **agent_kwargs):
+        self.tools = tools
+        self.model_factory = model_factory
+        self.agent_kwargs = agent_kwargs
+        self._agent = None
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            from smolagents import CodeAgent
+
+            self._agent = CodeAgent(tools=list(self.tools), model=self.model_factory(), **self.agent_kwargs)
+        return self._agent
+
+    def run(self, task, **kwargs):
+        return self.agent.run(task, **kwargs)
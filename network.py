@@ -0,0 +1,238 @@
+"""
+Multi-echelon supply network: many suppliers, plants, DCs and stores.
+
+Generalises the one-of-each chain in main.py to a graph. Nodes carry
+per-node arrays (inventory, plant raw materials and capacity, store
+demand and backorders), and lanes are an edge list sorted by source.
+Each lane connects one echelon to the next: supplier -> plant -> DC ->
+store. Every step applies the tool semantics of agents.py to all nodes
+of a kind at once, through the tools' forward_batch() where a step is a
+single tool call:
+
+  RetailTool       stores fill min(customer demand + backorders, stock)
+  DistributeTool   DC -> store lanes ship min(DC inventory, store need)
+  ManufactureTool  plants produce min(capacity, raw materials, DC need)
+  DistributeTool   plant -> DC lanes ship min(plant stock, DC room)
+  SupplyTool       supplier -> plant lanes ship min(supplier inventory, plant need)
+
+A node with several outgoing lanes serves them in lane order while stock
+lasts, and a node with several incoming lanes splits its need evenly
+between them. Every operation is a gather, scatter-add (np.bincount) or
+per-source prefix sum over the lanes, so a step costs O(nodes + lanes).
+Shipments spend lead_time steps in transit, in a (lead_time + 1, n_lanes)
+ring buffer as in vector_sim.
+"""
+import numpy as np
+
+from dispatch import default_tools
+from streams import ReplicaStreams
+from vector_sim import COST_TYPES, DEFAULT_COSTS
+
+SUPPLIER, PLANT, DC, STORE = range(4)
+NODE_KINDS = ("supplier", "plant", "dc", "store")
+
+
+class SupplyNetwork:
+    """
+    Node and lane arrays of a supply network, advanced one step at a time.
+
+    `kinds` gives each node's kind (SUPPLIER, PLANT, DC or STORE) and
+    `lanes` is a sequence of (source, destination) node pairs. `inventory`
+    is the starting stock per node. `capacity` is the plant production
+    capacity (and DC storage limit), `target` the order-up-to level
+    each node replenishes towards, and `base_demand` the mean customer
+    demand of each store. Scalars apply to every node.
+    """
+
+    def __init__(self, kinds, lanes, inventory=0, capacity=50, target=50, base_demand=40,
+                 lead_time=1, costs=None):
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        n = len(self.kinds)
+        lanes = np.asarray(lanes, dtype=np.int64).reshape(-1, 2)
+
+        # Sort lanes by source so each source's lanes are one contiguous run
+        order = np.argsort(lanes[:, 0], kind="stable")
+        self.src = lanes[order, 0]
+        self.dst = lanes[order, 1]
+        if len(self.src) and not np.all(self.kinds[self.dst] == self.kinds[self.src] + 1):
+            raise ValueError("Lanes must run supplier -> plant -> DC -> store")
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(self.src, minlength=n))))
+
+        # A destination with k incoming lanes asks each for 1/k of its need;
+        # the first of them also takes the remainder
+        self.in_degree = np.bincount(self.dst, minlength=n)
+        self.first_in = np.zeros(len(self.dst), dtype=bool)
+        self.first_in[np.unique(self.dst, return_index=True)[1]] = True
+
+        self.inventory = np.array(np.broadcast_to(inventory, n), dtype=np.int64)
+        self.raw = np.zeros(n, dtype=np.int64)  # plants: raw materials awaiting production
+        self.capacity = np.array(np.broadcast_to(capacity, n), dtype=np.int64)
+        self.target = np.array(np.broadcast_to(target, n), dtype=np.int64)
+        self.base_demand = np.array(np.broadcast_to(base_demand, n), dtype=np.int64)
+        self.backorders = np.zeros(n, dtype=np.int64)
+        self.demand = np.zeros(n, dtype=np.int64)
+
+        self.lead_time = int(lead_time)
+        self.in_transit = np.zeros((self.lead_time + 1, len(self.src)), dtype=np.int64)
+        costs = DEFAULT_COSTS if costs is None else costs
+        self.costs = np.array([costs[cost_type] for cost_type in COST_TYPES], dtype=np.float64)
+        self.daily_costs = 0.0
+        self.total_costs = 0.0
+        self.total_demand = 0
+        self.fulfilled_demand = 0
+        self.steps = 0
+
+        self.tools = default_tools()
+        self._lane_masks = {kind: self.kinds[self.src] == kind for kind in (SUPPLIER, PLANT, DC)}
+        self._is = {kind: self.kinds == kind for kind in range(len(NODE_KINDS))}
+
+    @property
+    def n_nodes(self):
+        return len(self.kinds)
+
+    @property
+    def n_lanes(self):
+        return len(self.src)
+
+    @classmethod
+    def layered(cls, n_suppliers, n_plants, n_dcs, n_stores, sources_per_node=2, **kwargs):
+        """
+        A four-echelon network in which every plant, DC and store is fed by
+        up to `sources_per_node` nodes of the echelon above (round robin).
+        """
+        counts = (n_suppliers, n_plants, n_dcs, n_stores)
+        kinds = np.repeat(np.arange(4), counts)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        lanes = []
+        for kind in (PLANT, DC, STORE):
+            upstream = counts[kind - 1]
+            nodes = np.arange(counts[kind])
+            for k in range(min(sources_per_node, upstream)):
+                sources = (nodes + k) % upstream
+                lanes.append(np.column_stack((offsets[kind - 1] + sources, offsets[kind] + nodes)))
+        return cls(kinds, np.concatenate(lanes), **kwargs)
+
+    @classmethod
+    def with_nodes(cls, n_nodes, **kwargs):
+        """A layered network of about n_nodes nodes, most of them stores."""
+        n_suppliers = max(n_nodes // 200, 1)
+        n_plants = max(n_nodes // 100, 1)
+        n_dcs = max(n_nodes // 20, 1)
+        n_stores = max(n_nodes - n_suppliers - n_plants - n_dcs, 1)
+        return cls.layered(n_suppliers, n_plants, n_dcs, n_stores, **kwargs)
+
+    def _lane_requests(self, need, mask):
+        """Split each destination's need over its incoming lanes (only lanes in mask)."""
+        need_dst = need[self.dst]
+        degree = self.in_degree[self.dst]
+        requests = need_dst // degree + np.where(self.first_in, need_dst % degree, 0)
+        return np.where(mask, requests, 0)
+
+    def _allocate(self, available, requests):
+        """Serve each source's lanes in order until its available stock runs out."""
+        cumulative = np.cumsum(requests)
+        before_source = np.concatenate(([0], cumulative))[self.indptr[self.src]]
+        served_before = cumulative - requests - before_source
+        return np.clip(available[self.src] - served_before, 0, requests)
+
+    def _ship(self, sent):
+        self.in_transit[(self.steps + self.lead_time) % len(self.in_transit)] += sent
+        return np.bincount(self.src, weights=sent, minlength=self.n_nodes).astype(np.int64)
+
+    def receive_shipments(self):
+        """Deliver the lanes' shipments due this step; raw materials go to plants' raw stock."""
+        slot = self.steps % len(self.in_transit)
+        arrived = np.bincount(self.dst, weights=self.in_transit[slot], minlength=self.n_nodes).astype(np.int64)
+        self.in_transit[slot] = 0
+        is_plant = self._is[PLANT]
+        self.raw += np.where(is_plant, arrived, 0)
+        self.inventory += np.where(is_plant, 0, arrived)
+        return arrived
+
+    def pipeline(self):
+        """Units in transit towards each node."""
+        return np.bincount(self.dst, weights=self.in_transit.sum(axis=0), minlength=self.n_nodes).astype(np.int64)
+
+    def step(self, customer_demand, resupply):
+        """
+        Advance the network one step. `customer_demand` is per store and
+        `resupply` per supplier (arrays over all nodes, or scalars).
+        Shipments due by the end of the step (after lead_time steps) are
+        delivered last, as in main.run_simulation. Returns the quantities
+        moved: per-lane "shipped" and per-node "sold", "produced" and
+        "arrived".
+        """
+        is_store, is_plant = self._is[STORE], self._is[PLANT]
+        pipeline = self.pipeline()
+
+        # RetailTool at every store
+        self.demand = np.where(is_store, customer_demand, 0)
+        open_demand = self.demand + self.backorders
+        sold = self.tools.retail.forward_batch(open_demand, self.inventory) * is_store
+        self.inventory -= sold
+        self.backorders = open_demand - sold
+        self.total_demand += int(self.demand.sum())
+        self.fulfilled_demand += int(sold.sum())
+
+        # DistributeTool on DC -> store lanes
+        store_need = np.maximum(self.target + self.backorders - self.inventory - pipeline, 0)
+        to_stores = self._allocate(self.inventory, self._lane_requests(store_need, self._lane_masks[DC]))
+        self.inventory -= self._ship(to_stores)
+
+        # ManufactureTool at every plant, for what its DCs need
+        dc_need = np.where(self._is[DC],
+                           np.maximum(np.minimum(self.target, self.capacity) - self.inventory - pipeline, 0), 0)
+        plant_lanes = self._lane_masks[PLANT]
+        dc_requests = self._lane_requests(dc_need, plant_lanes)
+        plant_demand = np.bincount(self.src, weights=dc_requests, minlength=self.n_nodes).astype(np.int64)
+        produced = self.tools.manufacture.forward_batch(self.raw, self.capacity, plant_demand) * is_plant
+        self.raw -= produced
+        self.inventory += produced
+
+        # DistributeTool on plant -> DC lanes
+        to_dcs = self._allocate(self.inventory, dc_requests)
+        self.inventory -= self._ship(to_dcs)
+
+        # SupplyTool on supplier -> plant lanes: plants restock raw materials to capacity
+        raw_need = np.where(is_plant, np.maximum(self.capacity - self.raw - pipeline, 0), 0)
+        supplied = self._allocate(self.inventory, self._lane_requests(raw_need, self._lane_masks[SUPPLIER]))
+        self.inventory -= self._ship(supplied)
+        self.inventory += np.where(self._is[SUPPLIER], resupply, 0)
+
+        arrived = self.receive_shipments()
+        self.daily_costs = self.calculate_costs(supplied, produced, to_stores)
+        self.total_costs += self.daily_costs
+        self.steps += 1
+        return {"shipped": to_stores + to_dcs + supplied, "sold": sold, "produced": produced, "arrived": arrived}
+
+    def calculate_costs(self, supplied, produced, distributed):
+        """CostManager.calculate_costs() summed over the network."""
+        c = self.costs
+        held = self.inventory.sum() + self.raw.sum()
+        return float(supplied.sum() * c[0] + produced.sum() * c[1] + distributed.sum() * c[2]
+                     + held * c[3] + self.backorders.sum() * c[4])
+
+    def run(self, num_steps, seed=None, resupply_range=(10, 20), demand_variation=(-5, 5), block_size=256):
+        """
+        Run num_steps steps with store demand and supplier resupply drawn from
+        each node's own streams (streams.ReplicaStreams rooted at `seed`), so a
+        node's numbers do not depend on how many nodes the network has.
+        """
+        streams = ReplicaStreams(seed, self.n_nodes)
+        for start in range(0, num_steps, block_size):
+            steps = min(block_size, num_steps - start)
+            noise = streams.integers("demand", demand_variation[0], demand_variation[1], steps)
+            resupply = streams.integers("resupply", resupply_range[0], resupply_range[1], steps)
+            for j in range(steps):
+                self.step(np.maximum(self.base_demand + noise[:, j], 0), resupply[:, j])
+        return self.metrics()
+
+    def metrics(self):
+        fill_rate = self.fulfilled_demand / self.total_demand * 100 if self.total_demand else 0
+        return {
+            "fill_rate": round(fill_rate, 2),
+            "backorders": int(self.backorders.sum()),
+            "total_costs": round(self.total_costs, 2),
+            "inventory": int(self.inventory.sum() + self.raw.sum()),
+            "in_transit": int(self.in_transit.sum()),
+        }
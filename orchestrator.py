@@ -0,0 +1,134 @@
+"""
+Asyncio orchestration of many simulations and CodeAgent sessions.
+
+Everything that blocks (the predictor, tools, agent runs) goes through a
+bounded thread pool, and every model request is gated by a limiter that
+caps how many LLM calls are in flight at once, so one event loop can keep
+many independent runs going without flooding the model endpoint.
+"""
+import asyncio
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agents import SupplyTool, ManufactureTool, DistributeTool, RetailTool
+
+
+class ConcurrencyLimitedModel:
+    """
+    Wraps a smolagents model so at most `limit` requests run at the same time.
+
+    Attribute access is forwarded to the wrapped model, so it can be handed
+    to a CodeAgent in its place.
+    """
+
+    def __init__(self, model, limit):
+        self.model = model
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    @contextlib.contextmanager
+    def _slot(self):
+        with self._semaphore:
+            with self._lock:
+                self.in_flight += 1
+                self.requests += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+    def generate(self, *args, **kwargs):
+        with self._slot():
+            return self.model.generate(*args, **kwargs)
+
+    def generate_stream(self, *args, **kwargs):
+        # Deltas are passed on as they arrive; the slot is held until the
+        # stream is exhausted or the generator is closed
+        with self._slot():
+            yield from self.model.generate_stream(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        with self._slot():
+            return self.model(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def default_tools():
+    return [SupplyTool(), ManufactureTool(), DistributeTool(), RetailTool()]
+
+
+class AsyncOrchestrator:
+    """
+    Runs many simulations or agent sessions concurrently on one event loop.
+
+    `max_workers` bounds the thread pool used for blocking calls,
+    `max_llm_requests` caps in-flight model requests across all sessions
+    and `max_sessions` (optional) caps how many runs are active at once.
+    """
+
+    def __init__(self, model=None, max_workers=16, max_llm_requests=4, max_sessions=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orchestrator")
+        self.model = ConcurrencyLimitedModel(model, max_llm_requests) if model is not None else None
+        self.max_sessions = max_sessions
+
+    async def call(self, fn, *args, **kwargs):
+        """Run a blocking call on the bounded executor without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def _gather(self, coroutines):
+        if not self.max_sessions:
+            return await asyncio.gather(*coroutines)
+        sessions = asyncio.Semaphore(self.max_sessions)
+
+        async def bounded(coroutine):
+            async with sessions:
+                return await coroutine
+
+        return await asyncio.gather(*(bounded(coroutine) for coroutine in coroutines))
+
+    async def run_simulation(self, **kwargs):
+        from main import run_simulation
+
+        kwargs.setdefault("verbose", False)
+        return await self.call(run_simulation, **kwargs)
+
+    async def run_simulations(self, runs):
+        """
+        Run main.run_simulation once per kwargs dict in `runs`; results keep their order.
+
+        The runs share this process's predictor (automl_predictor.get_predictor),
+        which is built once and safe to score from several threads.
+        """
+        return await self._gather([self.run_simulation(**kwargs) for kwargs in runs])
+
+    async def run_agent(self, task, tools=None, **agent_kwargs):
+        """Run one CodeAgent session on the shared, concurrency-limited model."""
+        from smolagents import CodeAgent
+
+        if self.model is None:
+            raise ValueError("AsyncOrchestrator needs a model to run agent sessions")
+        agent = CodeAgent(tools=tools or default_tools(), model=self.model, **agent_kwargs)
+        return await self.call(agent.run, task)
+
+    async def run_agents(self, tasks, **agent_kwargs):
+        """Run one agent session per task concurrently; results keep their order."""
+        return await self._gather([self.run_agent(task, **agent_kwargs) for task in tasks])
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,216 @@
+"""
+Score candidate policies on shared (common random number) demand traces.
+
+    python policy_eval.py --policies reorder_point automl --replicas 200 --steps 100
+
+generate_traces() draws the resupply, demand-noise and lead-time-noise
+values of every replica once, each from its own streams
+(streams.ReplicaStreams), into a memory-mapped .npy file of shape
+(n_replicas, len(COMPONENTS), num_steps).
+evaluate() then replays each replica's trace through main.run_simulation
+(streams.TraceStreams) for every policy in a process pool. Workers map
+the file read-only, so all of them share one copy in the page cache, and
+every policy faces exactly the same demand. The seed, shape and value
+bounds of the traces are stored next to them (<traces>.json): evaluate()
+refuses traces drawn for other resupply, demand or lead-time-jitter
+bounds than the runs use, and the CLI only reuses a trace file drawn
+with the same seed and shape.
+
+The result is one row per policy with the mean and confidence interval
+of each PerformanceMetrics value over the replicas, ranked by one metric.
+Because the traces are shared, each policy's difference from the best
+one is also reported with a paired confidence interval, which is much
+tighter than comparing the two intervals.
+"""
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+from config import SupplyChainConfig
+from datagen import POLICIES
+from streams import COMPONENTS, ReplicaStreams
+
+METRICS = ("fill_rate", "inventory_turnover", "backorders", "total_costs")
+# Direction in which each metric is better, for ranking
+HIGHER_IS_BETTER = {"fill_rate": True, "inventory_turnover": True, "backorders": False, "total_costs": False}
+
+
+def automl_policy(config):
+    from automl_predictor import get_predictor
+
+    return get_predictor()
+
+
+EVAL_POLICIES = dict(POLICIES, automl=automl_policy)
+
+
+def trace_bounds(config):
+    """{component: [low, high]} that run_simulation draws each component from under `config`."""
+    return {
+        "resupply": [config.resupply["min_amount"], config.resupply["max_amount"]],
+        "demand": [config.demand["min_variation"], config.demand["max_variation"]],
+        "lead_time": [0, int(config.simulation["lead_time_jitter"])],
+    }
+
+
+def metadata_path(path):
+    return f"{path}.json"
+
+
+def load_trace_metadata(path):
+    """The {"root_seed", "n_replicas", "num_steps", "bounds"} that generate_traces() stored for `path`."""
+    try:
+        with open(metadata_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No trace metadata at {metadata_path(path)}; "
+                                "create the traces with generate_traces()") from None
+
+
+def generate_traces(path, n_replicas, num_steps, config=None, root_seed=0):
+    """Draw every replica's random inputs into a memory-mapped .npy file and return it (read-only)."""
+    config = config or SupplyChainConfig()
+    streams = ReplicaStreams(root_seed, n_replicas)
+    traces = np.lib.format.open_memmap(path, mode="w+", dtype=np.int64,
+                                       shape=(n_replicas, len(COMPONENTS), num_steps))
+    bounds = trace_bounds(config)
+    for i, name in enumerate(COMPONENTS):
+        low, high = bounds[name]
+        streams.integers(name, low, high, num_steps, out=traces[:, i])
+    traces.flush()
+    del traces
+    with open(metadata_path(path), "w") as f:
+        json.dump({"root_seed": root_seed, "n_replicas": n_replicas, "num_steps": num_steps,
+                   "bounds": bounds}, f)
+    return np.load(path, mmap_mode="r")
+
+
+def check_traces(path, config):
+    """Raise ValueError unless the traces at `path` were drawn for the bounds `config` runs with."""
+    drawn, expected = load_trace_metadata(path)["bounds"], trace_bounds(config)
+    mismatched = [name for name in COMPONENTS if drawn.get(name) != expected[name]]
+    if mismatched:
+        details = ", ".join(f"{name} drawn in {drawn.get(name)} but runs use {expected[name]}"
+                            for name in mismatched)
+        raise ValueError(f"Traces at {path} do not match the run configuration: {details}")
+
+
+def _evaluate_chunk(trace_path, policy, replicas, overrides):
+    """Run `policy` on the given replicas' traces; returns an (n, len(METRICS)) array."""
+    from main import run_simulation
+
+    traces = np.load(trace_path, mmap_mode="r")
+    config = SupplyChainConfig()
+    config.update(overrides)
+    factory = EVAL_POLICIES[policy] if isinstance(policy, str) else policy
+    results = []
+    for replica in replicas:
+        trace = traces[replica]
+        metrics = run_simulation(num_steps=trace.shape[1], predictor=factory(config), config=config,
+                                 verbose=False, trace=trace)
+        results.append([metrics[name] for name in METRICS])
+    return np.array(results, dtype=np.float64)
+
+
+def evaluate(trace_path, policies, overrides=None, max_workers=None, chunk_size=16):
+    """
+    Replay every trace in trace_path against each policy (POLICIES names or
+    picklable factories taking a SupplyChainConfig) and return
+    {policy: (n_replicas, len(METRICS)) array}. `overrides` must leave the
+    trace bounds as they were drawn (see check_traces()).
+    """
+    config = SupplyChainConfig()
+    config.update(overrides or {})
+    check_traces(trace_path, config)
+    n_replicas = np.load(trace_path, mmap_mode="r").shape[0]
+    chunks = [range(start, min(start + chunk_size, n_replicas)) for start in range(0, n_replicas, chunk_size)]
+    names = [policy if isinstance(policy, str) else getattr(policy, "__name__", repr(policy)) for policy in policies]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            (name, start): pool.submit(_evaluate_chunk, trace_path, policy, chunk, overrides or {})
+            for (name, policy), (start, chunk) in itertools.product(zip(names, policies), enumerate(chunks))
+        }
+        return {name: np.concatenate([futures[name, start].result() for start in range(len(chunks))])
+                for name in names}
+
+
+def mean_ci(values, confidence=0.95):
+    """Mean and t-distribution confidence half-width of a sample."""
+    values = np.asarray(values, dtype=np.float64)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, float("nan")
+    sem = values.std(ddof=1) / np.sqrt(len(values))
+    return mean, float(sem * stats.t.ppf((1 + confidence) / 2, len(values) - 1))
+
+
+def summarize(results, rank_by="total_costs", confidence=0.95):
+    """
+    Ranked rows, best first: {"policy", "rank", <metric>: (mean, half-width), ...,
+    "vs_best": (mean difference, half-width)} where vs_best is the paired
+    difference in rank_by from the best policy on the same traces.
+    """
+    sign = -1 if HIGHER_IS_BETTER[rank_by] else 1
+    column = METRICS.index(rank_by)
+    order = sorted(results, key=lambda name: sign * results[name][:, column].mean())
+    best = results[order[0]][:, column]
+    rows = []
+    for rank, name in enumerate(order, start=1):
+        values = results[name]
+        row = {"policy": name, "rank": rank, "replicas": len(values)}
+        row.update({metric: mean_ci(values[:, i], confidence) for i, metric in enumerate(METRICS)})
+        row["vs_best"] = mean_ci(values[:, column] - best, confidence)
+        rows.append(row)
+    return rows
+
+
+def format_table(rows, rank_by="total_costs"):
+    header = f"{'rank':>4}  {'policy':<16}" + "".join(f"{metric:>24}" for metric in METRICS) + f"{'vs best ' + rank_by:>28}"
+    lines = [header]
+    for row in rows:
+        cells = "".join(f"{f'{mean:.2f} ± {half:.2f}':>24}" for mean, half in (row[m] for m in METRICS))
+        mean, half = row["vs_best"]
+        lines.append(f"{row['rank']:>4}  {row['policy']:<16}{cells}{f'{mean:+.2f} ± {half:.2f}':>28}")
+    return "\n".join(lines)
+
+
+def traces_match(path, n_replicas, num_steps, root_seed, config=None):
+    """Whether `path` holds traces drawn with this seed, shape and config's bounds."""
+    if not (os.path.exists(path) and os.path.exists(metadata_path(path))):
+        return False
+    metadata = load_trace_metadata(path)
+    return metadata == {"root_seed": root_seed, "n_replicas": n_replicas, "num_steps": num_steps,
+                        "bounds": trace_bounds(config or SupplyChainConfig())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank policies on common-random-number demand traces.")
+    parser.add_argument("--policies", nargs="+", choices=sorted(EVAL_POLICIES), default=sorted(EVAL_POLICIES))
+    parser.add_argument("--replicas", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--traces", default="traces.npy",
+                        help="memory-mapped trace file (reused if drawn with the same seed and shape)")
+    parser.add_argument("--rank-by", choices=METRICS, default="total_costs")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="also write the ranked rows as JSON")
+    args = parser.parse_args(argv)
+
+    if not traces_match(args.traces, args.replicas, args.steps, args.seed):
+        generate_traces(args.traces, args.replicas, args.steps, root_seed=args.seed)
+    results = evaluate(args.traces, args.policies, max_workers=args.workers)
+    rows = summarize(results, args.rank_by, args.confidence)
+    print(format_table(rows, args.rank_by))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+from automl_predictor import get_predictor
+from state import SupplyChainState
+from utils import STATE_FIELDS
+
+
+class PredictionCache:
+    """
+    LRU cache of predicted actions keyed on (optionally bucketed) state.
+
+    `max_size` bounds the number of entries (least recently used are evicted
+    first) and `ttl` expires entries after that many seconds. `buckets` maps
+    state fields to bucket widths, so e.g. {"retailer_customer_demand": 5}
+    treats demands 40-44 as the same state; unlisted fields match exactly.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_size=4096, ttl=None, buckets=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.buckets = dict(buckets or {})
+        self.clock = clock
+        self.fingerprint = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def key(self, state):
+        """Cache key of a state; independent of the dict's key order."""
+        if not self.buckets and isinstance(state, SupplyChainState):
+            return state.snapshot()
+        key = []
+        for field in STATE_FIELDS:
+            value = state.get(field)
+            width = self.buckets.get(field)
+            if width and value is not None:
+                value = value // width
+            key.append(value)
+        return tuple(key)
+
+    def bind(self, fingerprint):
+        """Clear the cache if it holds predictions from a different model."""
+        if fingerprint != self.fingerprint:
+            with self._lock:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.fingerprint = fingerprint
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            action, expires_at = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return action
+
+    def put(self, key, action):
+        expires_at = self.clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (action, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedPredictor:
+    """
+    Memoizing front for a Predictor.
+
+    With no predictor given it uses the shared per-process one from
+    automl_predictor.get_predictor(). The cache is bound to the predictor's
+    fingerprint and emptied whenever a different model or vectorizer is in use.
+    """
+
+    def __init__(self, predictor=None, cache=None):
+        self._predictor = predictor
+        self.cache = cache if cache is not None else PredictionCache()
+
+    @property
+    def predictor(self):
+        predictor = self._predictor if self._predictor is not None else get_predictor()
+        self.cache.bind(getattr(predictor, "fingerprint", id(predictor)))
+        return predictor
+
+    def predict_action(self, state: dict) -> str:
+        predictor = self.predictor
+        key = self.cache.key(state)
+        action = self.cache.get(key)
+        if action is None:
+            action = predictor.predict_action(state)
+            self.cache.put(key, action)
+        return action
+
+    def predict_actions(self, states: list[dict]) -> list[str]:
+        """Serve cached states from the cache and score the rest in one batch."""
+        predictor = self.predictor
+        keys = [self.cache.key(state) for state in states]
+        actions = [self.cache.get(key) for key in keys]
+
+        # One model call for the distinct missing states
+        missing = {}
+        for key, state, action in zip(keys, states, actions):
+            if action is None and key not in missing:
+                missing[key] = state
+        if missing:
+            predicted = predictor.predict_actions(list(missing.values()))
+            for key, action in zip(missing, predicted):
+                self.cache.put(key, action)
+            fresh = dict(zip(missing, predicted))
+            actions = [fresh[key] if action is None else action
+                       for key, action in zip(keys, actions)]
+        return actions
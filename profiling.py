@@ -0,0 +1,213 @@
+"""
+Per-phase latency instrumentation and opt-in profiling for simulation runs.
+
+PhaseTimer records timing spans per named phase and summarises them as
+latency histograms with p50/p95/p99, exportable as JSON or in the
+Prometheus text exposition format. Code deep inside a run (e.g. the
+predictor) reports spans to whichever timer is active via current_timer(),
+so nothing has to be threaded through call signatures. RunProfiler wraps a
+run in cProfile and/or tracemalloc.
+"""
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+# Upper bounds (seconds) of the Prometheus histogram buckets: 1us .. 10s
+BUCKET_BOUNDS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Phase:
+    """Latency samples of one phase: exact sum/count, bucket counts and a bounded reservoir."""
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = np.zeros(len(BUCKET_BOUNDS) + 1, dtype=np.int64)
+        self.samples = np.empty(max_samples)
+        self.n_samples = 0
+
+    def add(self, seconds, rng):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[np.searchsorted(BUCKET_BOUNDS, seconds)] += 1
+        # Reservoir sampling keeps quantile estimates unbiased in bounded memory
+        if self.n_samples < len(self.samples):
+            self.samples[self.n_samples] = seconds
+            self.n_samples += 1
+        else:
+            slot = rng.randrange(self.count)
+            if slot < len(self.samples):
+                self.samples[slot] = seconds
+
+
+class PhaseTimer:
+    """Collects timing spans per phase name."""
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.phases = {}
+        self._rng = random.Random(0)
+
+    def record(self, phase, seconds):
+        entry = self.phases.get(phase)
+        if entry is None:
+            entry = self.phases[phase] = _Phase(self.max_samples)
+        entry.add(seconds, self._rng)
+
+    @contextlib.contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this the timer returned by current_timer() inside the block."""
+        token = _current_timer.set(self)
+        try:
+            yield self
+        finally:
+            _current_timer.reset(token)
+
+    def summary(self):
+        """{phase: {count, total_s, mean_s, p50_s, p95_s, p99_s, max_s}}"""
+        summary = {}
+        for phase, entry in self.phases.items():
+            samples = entry.samples[:entry.n_samples]
+            quantiles = np.quantile(samples, QUANTILES) if entry.n_samples else [0.0] * len(QUANTILES)
+            summary[phase] = {
+                "count": entry.count,
+                "total_s": entry.total,
+                "mean_s": entry.total / entry.count if entry.count else 0.0,
+                "p50_s": float(quantiles[0]),
+                "p95_s": float(quantiles[1]),
+                "p99_s": float(quantiles[2]),
+                "max_s": entry.max,
+            }
+        return summary
+
+    def to_json(self, indent=2):
+        return json.dumps(self.summary(), indent=indent)
+
+    def to_prometheus(self, name="supply_chain_phase_seconds"):
+        """Prometheus text format: one histogram per phase plus p50/p95/p99 gauges."""
+        lines = [
+            f"# HELP {name} Latency of simulation phases in seconds.",
+            f"# TYPE {name} histogram",
+        ]
+        summary = self.summary()
+        for phase, entry in self.phases.items():
+            cumulative = np.cumsum(entry.buckets)
+            for bound, count in zip(BUCKET_BOUNDS, cumulative):
+                lines.append(f'{name}_bucket{{phase="{phase}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{phase="{phase}",le="+Inf"}} {entry.count}')
+            lines.append(f'{name}_sum{{phase="{phase}"}} {entry.total:.9g}')
+            lines.append(f'{name}_count{{phase="{phase}"}} {entry.count}')
+        lines.append(f"# HELP {name}_quantile Estimated latency quantiles of simulation phases.")
+        lines.append(f"# TYPE {name}_quantile gauge")
+        for phase, stats in summary.items():
+            for q in QUANTILES:
+                value = stats[f"p{int(q * 100)}_s"]
+                lines.append(f'{name}_quantile{{phase="{phase}",quantile="{q:g}"}} {value:.9g}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir, stem="phase_timings"):
+        """Write <stem>.json and <stem>.prom into output_dir."""
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, f"{stem}.json"), "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+        with open(os.path.join(output_dir, f"{stem}.prom"), "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+
+class NullTimer:
+    """Timer that records nothing; the default when instrumentation is off."""
+
+    phases = {}
+
+    def record(self, phase, seconds):
+        pass
+
+    def span(self, phase):
+        return contextlib.nullcontext()
+
+    def activate(self):
+        return contextlib.nullcontext(self)
+
+    def summary(self):
+        return {}
+
+
+_current_timer = contextvars.ContextVar("current_timer", default=NullTimer())
+
+
+def current_timer():
+    """The timer activated for the running simulation, or a NullTimer."""
+    return _current_timer.get()
+
+
+class RunProfiler:
+    """
+    Opt-in cProfile and/or tracemalloc for one run.
+
+    Use as a context manager around the run; afterwards `report()` returns
+    the top functions by cumulative time and the top allocation sites, and
+    `write(output_dir)` saves them (plus the raw .prof for snakeviz/pstats).
+    """
+
+    def __init__(self, cprofile=True, tracemalloc=False, top=25):
+        self.use_cprofile = cprofile
+        self.use_tracemalloc = tracemalloc
+        self.top = top
+        self.profile = None
+        self.snapshot = None
+        self.peak_bytes = None
+
+    def __enter__(self):
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        if self.use_cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.use_tracemalloc:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def report(self):
+        parts = []
+        if self.profile is not None:
+            out = io.StringIO()
+            pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            parts.append(out.getvalue())
+        if self.snapshot is not None:
+            parts.append(f"tracemalloc peak: {self.peak_bytes} bytes")
+            for stat in self.snapshot.statistics("lineno")[:self.top]:
+                parts.append(str(stat))
+        return "\n".join(parts)
+
+    def write(self, output_dir, stem="run_profile"):
+        os.makedirs(output_dir, exist_ok=True)
+        if self.profile is not None:
+            self.profile.dump_stats(os.path.join(output_dir, f"{stem}.prof"))
+        with open(os.path.join(output_dir, f"{stem}.txt"), "w", encoding="utf-8") as f:
+            f.write(self.report())
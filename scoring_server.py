@@ -0,0 +1,369 @@
+"""
+Local HTTP scoring service for action predictions.
+
+    python scoring_server.py --port 8080 --max-batch-size 64 --max-wait-ms 5
+
+Other services POST states and get predict_action decisions back, without
+embedding H2O or the vectorizer themselves:
+
+  POST /predict   application/json: a list of states, {"states": [...]} or
+                  one state; answers {"actions": [...]} (or {"action": ...}).
+                  application/x-ndjson: one state per line; answers one
+                  {"action": ...} line per state.
+                  A state is a dict of STATE_FIELDS or a "key=value, ..."
+                  string as in data.csv.
+  GET  /stats     request, batch and queue-depth counters plus latency
+                  percentiles (JSON)
+  GET  /metrics   the same latencies in the Prometheus text format
+  GET  /health    {"status": "ok"}
+
+Requests are handled on their own threads and handed to a MicroBatcher,
+whose single worker thread coalesces the states of concurrent requests
+into one Predictor.predict_actions() call of at most max_batch_size
+states, waiting at most max_wait for a batch to fill. Inputs are checked
+before they are queued, so a malformed request never fails the requests
+it would have been batched with.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import SupplyChainConfig
+from features import parse_state_text
+from profiling import PhaseTimer
+from utils import STATE_FIELDS
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class _Request:
+    __slots__ = ("states", "future", "enqueued")
+
+    def __init__(self, states):
+        self.states = states
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent predict requests into batched predict_batch(states) calls.
+
+    The worker takes the oldest request, then keeps adding queued requests
+    until the batch holds max_batch_size states or max_wait seconds have
+    passed since that request arrived. A request that does not fit is held
+    over to start the next batch; one larger than max_batch_size is scored
+    on its own. Latencies go to a profiling.PhaseTimer: "queue_wait" (until
+    the request's batch starts), "score" (per batch) and "request" (from
+    submit to result).
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_wait=0.005, timer=None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timer = timer or PhaseTimer()
+        self._queue = queue.Queue()
+        self._held = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.requests = 0
+        self.states = 0
+        self.batches = 0
+        self.errors = 0
+        self.largest_batch = 0
+        self.queued_states = 0
+        self.max_queue_depth = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout=None):
+        """Score what is already queued, then stop the worker."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, states):
+        """Queue a list of states; returns a Future of their actions."""
+        request = _Request(list(states))
+        with self._lock:
+            self.requests += 1
+            self.states += len(request.states)
+            self.queued_states += len(request.states)
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize() + 1)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, states, timeout=None):
+        return self.submit(states).result(timeout)
+
+    def _collect(self):
+        """The next batch of requests, or None once closed and drained."""
+        first, self._held = self._held, None
+        if first is None:
+            first = self._queue.get()
+            if first is None:
+                return None
+        batch, size = [first], len(first.states)
+        deadline = first.enqueued + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                request = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # stop after this batch
+                break
+            if size + len(request.states) > self.max_batch_size:
+                self._held = request
+                break
+            batch.append(request)
+            size += len(request.states)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._score(batch)
+
+    def _score(self, batch):
+        states = [state for request in batch for state in request.states]
+        start = time.perf_counter()
+        with self._lock:
+            self.queued_states -= len(states)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(states))
+            for request in batch:
+                self.timer.record("queue_wait", start - request.enqueued)
+        try:
+            actions = list(self.predict_batch(states))
+        except Exception as exc:
+            with self._lock:
+                self.errors += len(batch)
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+        end = time.perf_counter()
+        with self._lock:
+            self.timer.record("score", end - start)
+            for request in batch:
+                self.timer.record("request", end - request.enqueued)
+        offset = 0
+        for request in batch:
+            request.future.set_result(actions[offset:offset + len(request.states)])
+            offset += len(request.states)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "states": self.states,
+                "batches": self.batches,
+                "errors": self.errors,
+                "mean_batch_size": round(
+                    (self.states - self.queued_states) / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "queue_depth": self._queue.qsize() + (self._held is not None),
+                "queued_states": self.queued_states,
+                "max_queue_depth": self.max_queue_depth,
+                "latency": self.timer.summary(),
+            }
+
+
+def parse_state(state):
+    """A request state as a dict of STATE_FIELDS; raises ValueError if malformed."""
+    if isinstance(state, str):
+        state = parse_state_text(state)
+    if not isinstance(state, dict):
+        raise ValueError(f"A state must be an object or a key=value string, got {type(state).__name__}")
+    missing = [field for field in STATE_FIELDS if field not in state]
+    if missing:
+        raise ValueError(f"State is missing fields: {', '.join(missing)}")
+    for field in STATE_FIELDS:
+        value = state[field]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"State field {field} must be a number, got {value!r}")
+    return state
+
+
+def parse_request(body, ndjson=False):
+    """
+    States of a request body: (states, single) where `single` is True for
+    a bare JSON state. Raises ValueError for malformed input.
+    """
+    text = body.decode("utf-8")
+    if ndjson:
+        return [parse_state(json.loads(line)) for line in text.splitlines() if line.strip()], False
+    data = json.loads(text)
+    if isinstance(data, dict) and "states" in data:
+        data = data["states"]
+    if isinstance(data, list):
+        return [parse_state(state) for state in data], False
+    return [parse_state(data)], True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SupplyChainScoring/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.scoring.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        scoring = self.server.scoring
+        if self.path == "/stats":
+            self._send(200, scoring.stats())
+        elif self.path == "/metrics":
+            self._send(200, scoring.batcher.timer.to_prometheus("scoring_seconds"), "text/plain; version=0.0.4")
+        elif self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        ndjson = content_type in NDJSON_TYPES
+        try:
+            states, single = parse_request(body, ndjson)
+        except (ValueError, UnicodeDecodeError) as exc:
+            self._send(400, {"error": str(exc)})
+            return
+        try:
+            actions = self.server.scoring.batcher.predict(states) if states else []
+        except Exception as exc:
+            self._send(500, {"error": f"Prediction failed: {exc}"})
+            return
+        if ndjson:
+            self._send(200, "".join(json.dumps({"action": action}) + "\n" for action in actions),
+                       NDJSON_TYPES[0])
+        elif single:
+            self._send(200, {"action": actions[0]})
+        else:
+            self._send(200, {"actions": actions})
+
+
+class ScoringServer:
+    """
+    HTTP front end of a MicroBatcher over `predictor` (default: the shared
+    automl_predictor.get_predictor(), created on the first batch). Port 0
+    picks a free port; `url` is where the server listens.
+    """
+
+    def __init__(self, predictor=None, host="127.0.0.1", port=0, max_batch_size=64, max_wait=0.005,
+                 verbose=False):
+        self.predictor = predictor
+        self.verbose = verbose
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size, max_wait)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.scoring = self
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config=None, predictor=None, **kwargs):
+        serving = (config or SupplyChainConfig()).serving
+        kwargs.setdefault("host", serving["host"])
+        kwargs.setdefault("port", serving["port"])
+        kwargs.setdefault("max_batch_size", serving["max_batch_size"])
+        kwargs.setdefault("max_wait", serving["max_wait_ms"] / 1000)
+        return cls(predictor, **kwargs)
+
+    def _predict_batch(self, states):
+        if self.predictor is None:
+            from automl_predictor import get_predictor
+
+            self.predictor = get_predictor()
+        return self.predictor.predict_actions(states)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self):
+        return self.batcher.stats()
+
+    def start(self):
+        """Serve on a background thread."""
+        self.batcher.start()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.httpd.serve_forever, name="scoring-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.batcher.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
+        self.batcher.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    serving = SupplyChainConfig().serving
+    parser = argparse.ArgumentParser(description="Serve batched action predictions over HTTP.")
+    parser.add_argument("--host", default=serving["host"])
+    parser.add_argument("--port", type=int, default=serving["port"])
+    parser.add_argument("--max-batch-size", type=int, default=serving["max_batch_size"])
+    parser.add_argument("--max-wait-ms", type=float, default=serving["max_wait_ms"])
+    parser.add_argument("--backend", choices=("h2o", "numpy"), help="predictor backend (default: automl_predictor's)")
+    parser.add_argument("--encoder", choices=("tfidf", "structured"))
+    parser.add_argument("--model-path")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    predictor = None
+    if args.backend or args.encoder or args.model_path:
+        from automl_predictor import Predictor
+
+        predictor = Predictor(backend=args.backend, encoder=args.encoder, model_path=args.model_path)
+    server = ScoringServer(predictor, args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000,
+                           verbose=args.verbose)
+    print(f"Scoring on {server.url} (max batch {args.max_batch_size}, max wait {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
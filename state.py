@@ -0,0 +1,197 @@
+"""
+Typed, fixed-layout simulation state.
+
+SupplyChainState keeps the eight STATE_FIELDS in __slots__ as plain ints,
+so it has no per-instance dict, snapshots to a tuple and restores from one
+in a single call, and still reads and writes like the old state dict
+(state["backorders"] += 5, dict(state), state.items(), ...), so code and
+tests written against dicts keep working.
+
+StateBatch wraps an (n, len(STATE_FIELDS)) int64 array, such as
+VectorizedSimulation.state, without copying it; its rows and columns are
+views into that array.
+"""
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from utils import STATE_FIELDS
+
+FIELD_INDEX = {field: i for i, field in enumerate(STATE_FIELDS)}
+
+
+class SupplyChainState(MutableMapping):
+    """One simulation state; fields are attributes and also mapping keys."""
+
+    __slots__ = STATE_FIELDS
+
+    def __init__(self, *values, **fields):
+        if len(values) > len(STATE_FIELDS):
+            raise ValueError(f"Expected at most {len(STATE_FIELDS)} values, got {len(values)}")
+        fields.update(zip(STATE_FIELDS, values))
+        unknown = set(fields) - set(STATE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown state fields: {sorted(unknown)}")
+        missing = [field for field in STATE_FIELDS if field not in fields]
+        if missing:
+            raise ValueError(f"Missing state fields: {missing}")
+        for field in STATE_FIELDS:
+            setattr(self, field, fields[field])
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**state)
+
+    @classmethod
+    def from_array(cls, row):
+        return cls(*np.asarray(row).tolist())
+
+    def __getitem__(self, key):
+        if key in FIELD_INDEX:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in FIELD_INDEX:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        raise TypeError("SupplyChainState fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(STATE_FIELDS)
+
+    def __len__(self):
+        return len(STATE_FIELDS)
+
+    # Faster than the generic Mapping versions, which go through __getitem__
+    def get(self, key, default=None):
+        return getattr(self, key) if key in FIELD_INDEX else default
+
+    def keys(self):
+        return STATE_FIELDS
+
+    def values(self):
+        return self.snapshot()
+
+    def items(self):
+        return zip(STATE_FIELDS, self.snapshot())
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in STATE_FIELDS)
+        return f"SupplyChainState({fields})"
+
+    def snapshot(self):
+        """The field values as a tuple in STATE_FIELDS order."""
+        return (self.supplier_inventory, self.manufacturer_capacity, self.manufacturer_inventory,
+                self.distributor_inventory, self.retail_inventory, self.retailer_customer_demand,
+                self.backorders, self.forecast_demand)
+
+    def restore(self, snapshot):
+        """Set every field from a snapshot() tuple (or array row)."""
+        (self.supplier_inventory, self.manufacturer_capacity, self.manufacturer_inventory,
+         self.distributor_inventory, self.retail_inventory, self.retailer_customer_demand,
+         self.backorders, self.forecast_demand) = snapshot
+
+    def copy(self):
+        return SupplyChainState(*self.snapshot())
+
+    def getstate(self):
+        """Checkpoint state: one 0-d array per field, so int and float fields keep their type."""
+        return {field: np.asarray(value) for field, value in zip(STATE_FIELDS, self.snapshot())}
+
+    def setstate(self, data):
+        self.restore([data[field].item() for field in STATE_FIELDS])
+
+    def to_dict(self):
+        return dict(zip(STATE_FIELDS, self.snapshot()))
+
+    def to_array(self, dtype=np.int64):
+        return np.array(self.snapshot(), dtype=dtype)
+
+
+def state_values(state):
+    """The STATE_FIELDS values of a state (SupplyChainState, StateRow or dict) as a tuple."""
+    if isinstance(state, (SupplyChainState, StateRow)):
+        return state.snapshot()
+    return tuple(map(state.__getitem__, STATE_FIELDS))
+
+
+class StateRow(MutableMapping):
+    """Dict-like view of one row of a StateBatch; writes go to the batch array."""
+
+    __slots__ = ("_row",)
+
+    def __init__(self, row):
+        self._row = row
+
+    def __getitem__(self, key):
+        return int(self._row[FIELD_INDEX[key]])
+
+    def __setitem__(self, key, value):
+        self._row[FIELD_INDEX[key]] = value
+
+    def __delitem__(self, key):
+        raise TypeError("StateRow fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(STATE_FIELDS)
+
+    def __len__(self):
+        return len(STATE_FIELDS)
+
+    def snapshot(self):
+        return tuple(self._row.tolist())
+
+
+class StateBatch:
+    """
+    Batch of states backed by one (n, len(STATE_FIELDS)) int64 array.
+
+    The array is used as is (not copied), so wrapping e.g.
+    VectorizedSimulation.state gives live views: batch[i] is a StateRow and
+    batch.column(field) a strided view of one field across the batch.
+    """
+
+    def __init__(self, array):
+        if array.ndim != 2 or array.shape[1] != len(STATE_FIELDS):
+            raise ValueError(f"Expected an (n, {len(STATE_FIELDS)}) array, got shape {array.shape}")
+        self.array = array
+
+    @classmethod
+    def zeros(cls, n):
+        return cls(np.zeros((n, len(STATE_FIELDS)), dtype=np.int64))
+
+    @classmethod
+    def from_states(cls, states):
+        """Copy states (dicts, SupplyChainStates or rows) into a new batch."""
+        array = np.empty((len(states), len(STATE_FIELDS)), dtype=np.int64)
+        for i, state in enumerate(states):
+            if hasattr(state, "snapshot"):
+                array[i] = state.snapshot()
+            else:
+                array[i] = [state[field] for field in STATE_FIELDS]
+        return cls(array)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return StateRow(self.array[index])
+
+    def __iter__(self):
+        return (StateRow(row) for row in self.array)
+
+    def column(self, field):
+        return self.array[:, FIELD_INDEX[field]]
+
+    def snapshot(self):
+        return self.array.copy()
+
+    def restore(self, snapshot):
+        self.array[...] = snapshot
+
+    def to_states(self):
+        return [SupplyChainState(*row) for row in self.array.tolist()]
@@ -0,0 +1,158 @@
+"""
+Independent random number streams for the stochastic parts of a simulation.
+
+Every component (supplier resupply, customer demand, lead-time noise) draws
+from its own numpy Generator, spawned from one root SeedSequence. Adding
+or removing draws in one component never shifts the numbers another one
+sees, and RandomStreams.spawn() gives replicas or parallel runs independent
+streams that depend only on the root seed and their position.
+
+Scalar runs draw from an IntegerStream, which fetches block_size values
+per Generator call instead of one per step. Batched runs draw from
+ReplicaStreams: every replica (or network node) has its own spawned
+streams, so its numbers do not change with the number of replicas.
+"""
+import json
+
+import numpy as np
+
+from utils import prefixed, unprefixed
+
+COMPONENTS = ("resupply", "demand", "lead_time")
+
+
+class IntegerStream:
+    """Uniform integers in [low, high] from one Generator, drawn a block at a time."""
+
+    def __init__(self, generator, block_size=256):
+        self.generator = generator
+        self.block_size = block_size
+        self._block = []
+        self._bounds = None
+        self._position = 0
+        self._block_state = None  # generator state before the current block was drawn
+
+    def _draw(self, low, high):
+        self._block_state = self.generator.bit_generator.state
+        self._block = self.generator.integers(low, high + 1, size=self.block_size).tolist()
+        self._bounds = (low, high)
+        self._position = 0
+
+    def next(self, low, high):
+        if self._position == len(self._block) or self._bounds != (low, high):
+            self._draw(low, high)
+        value = self._block[self._position]
+        self._position += 1
+        return value
+
+    def getstate(self):
+        """Checkpoint state: the generator state the current block was drawn from, and the position in it."""
+        if self._bounds is None:
+            return {"generator": np.asarray(json.dumps(self.generator.bit_generator.state))}
+        return {
+            "generator": np.asarray(json.dumps(self._block_state)),
+            "bounds": np.asarray(self._bounds),
+            "position": np.asarray(self._position),
+        }
+
+    def setstate(self, data):
+        self.generator.bit_generator.state = json.loads(data["generator"].item())
+        self._block, self._bounds, self._position = [], None, 0
+        if "bounds" in data:
+            # Redrawing the block leaves the generator exactly where it was
+            self._draw(*data["bounds"].tolist())
+            self._position = data["position"].item()
+
+
+class RandomStreams:
+    """
+    One Generator per component, all spawned from `seed` (an int, None or a
+    SeedSequence). generator(name) gives the Generator itself for batched
+    array draws; integers(name, low, high) one value of a blocked scalar stream.
+    """
+
+    def __init__(self, seed=None, components=COMPONENTS, block_size=256):
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.components = tuple(components)
+        self.block_size = block_size
+        children = self.seed_sequence.spawn(len(self.components))
+        self._generators = {name: np.random.default_rng(child) for name, child in zip(self.components, children)}
+        self._streams = {name: IntegerStream(generator, block_size) for name, generator in self._generators.items()}
+
+    def generator(self, name):
+        return self._generators[name]
+
+    def integers(self, name, low, high):
+        """One uniform integer in [low, high] (both inclusive, like random.randint)."""
+        return self._streams[name].next(low, high)
+
+    def spawn(self, n):
+        """n independent RandomStreams, e.g. one per replica or parallel run."""
+        return [RandomStreams(child, self.components, self.block_size) for child in self.seed_sequence.spawn(n)]
+
+    def getstate(self):
+        data = {}
+        for name, stream in self._streams.items():
+            data.update(prefixed(name, stream.getstate()))
+        return data
+
+    def setstate(self, data):
+        for name, stream in self._streams.items():
+            stream.setstate(unprefixed(name, data))
+
+
+class ReplicaStreams:
+    """
+    Per-replica streams for batched runs: replica i draws from
+    RandomStreams(seed).spawn(n_replicas)[i], which depends only on the root
+    seed and i. integers() draws several steps per replica at once.
+    """
+
+    def __init__(self, seed, n_replicas, components=COMPONENTS):
+        self.replicas = RandomStreams(seed, components).spawn(n_replicas)
+
+    def __len__(self):
+        return len(self.replicas)
+
+    def integers(self, name, low, high, steps, out=None):
+        """
+        (n_replicas, steps) uniform integers in [low, high]; row i holds
+        replica i's next `steps` values of component `name`. `out` may be
+        any array of that shape to write into, e.g. a memory-mapped view.
+        """
+        if out is None:
+            out = np.empty((len(self.replicas), steps), dtype=np.int64)
+        for row, streams in zip(out, self.replicas):
+            row[:] = streams.generator(name).integers(low, high + 1, size=steps)
+        return out
+
+
+class TraceStreams:
+    """
+    Replays pre-drawn values with the RandomStreams.integers() interface.
+
+    `trace` is a (len(components), num_steps) array, row i holding the
+    values of components[i] in draw order, e.g. common random numbers
+    shared by several policies (see policy_eval.py). Each component is read
+    by its own cursor; a value outside the [low, high] asked for raises
+    ValueError, as the trace was drawn for other bounds.
+    """
+
+    def __init__(self, trace, components=COMPONENTS):
+        self._rows = dict(zip(components, trace))
+        self._positions = dict.fromkeys(components, 0)
+
+    def integers(self, name, low, high):
+        position = self._positions[name]
+        self._positions[name] = position + 1
+        value = int(self._rows[name][position])
+        if not low <= value <= high:
+            raise ValueError(f"Trace value {value} of {name} at draw {position} is outside [{low}, {high}]")
+        return value
+
+    def getstate(self):
+        return {name: np.asarray(position) for name, position in self._positions.items()}
+
+    def setstate(self, data):
+        for name in self._positions:
+            self._positions[name] = data[name].item()
@@ -0,0 +1,182 @@
+"""
+Monte Carlo parameter sweeps over SupplyChainConfig.
+
+Each scenario is a set of config overrides (in SupplyChainConfig.update
+format) run through main.run_simulation in a ProcessPoolExecutor worker.
+Every scenario gets its own seed derived from one root seed, every worker
+process its own predictor, and the per-scenario PerformanceMetrics are
+streamed back as they finish and appended to a columnar results file.
+"""
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from config import SupplyChainConfig
+
+METRIC_NAMES = ("fill_rate", "inventory_turnover", "backorders", "total_costs", "average_inventory")
+
+
+def expand_grid(grid):
+    """
+    Expand {"section.key": [values, ...]} into a list of override dicts, e.g.
+    {"costs.holding": [1, 2]} -> [{"costs": {"holding": 1}}, {"costs": {"holding": 2}}].
+    """
+    names = list(grid)
+    scenarios = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        overrides = {}
+        for name, value in zip(names, values):
+            section, key = name.split(".", 1)
+            overrides.setdefault(section, {})[key] = value
+        scenarios.append(overrides)
+    return scenarios
+
+
+def flatten_overrides(overrides):
+    """{"costs": {"holding": 1}} -> {"costs.holding": 1}"""
+    return {f"{section}.{key}": value
+            for section, values in overrides.items() for key, value in values.items()}
+
+
+def scenario_seeds(root_seed, n_scenarios):
+    """One independent 32-bit seed per scenario, derived with SeedSequence.spawn."""
+    children = np.random.SeedSequence(root_seed).spawn(n_scenarios)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def init_worker(predictor_factory, predictor_kwargs):
+    """Give each worker process its own predictor instance."""
+    from automl_predictor import Predictor, set_predictor
+
+    factory = predictor_factory or Predictor
+    set_predictor(factory(**(predictor_kwargs or {})))
+
+
+def run_scenario(index, overrides, seed, num_steps=None):
+    """Run one scenario in the current process and return (index, metrics)."""
+    from main import run_simulation
+
+    config = SupplyChainConfig()
+    config.update(overrides)
+    config.validate()
+
+    metrics = run_simulation(num_steps=num_steps, config=config, verbose=False, seed=seed)
+    return index, metrics
+
+
+class SweepWriter:
+    """
+    Append-only columnar writer for sweep results.
+
+    Rows are buffered and flushed every `chunk_size` rows, either as
+    numbered `part-NNNNN.npz` files in `path` (format="npz") or as row
+    groups of a single Parquet file (format="parquet", needs pyarrow).
+    """
+
+    def __init__(self, path, format="npz", chunk_size=1000):
+        if format not in ("npz", "parquet"):
+            raise ValueError(f"Unknown sweep output format: {format}")
+        self.path = path
+        self.format = format
+        self.chunk_size = chunk_size
+        self._rows = []
+        self._parts = 0
+        self._parquet = None
+        if format == "npz":
+            os.makedirs(path, exist_ok=True)
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        columns = {name: np.asarray([row[name] for row in self._rows]) for name in self._rows[0]}
+        if self.format == "npz":
+            np.savez(os.path.join(self.path, f"part-{self._parts:05d}.npz"), **columns)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table(columns)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        self._parts += 1
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+
+def load_results(path):
+    """Load sweep results written by SweepWriter as a dict of column arrays."""
+    if os.path.isdir(path):
+        parts = sorted(name for name in os.listdir(path) if name.endswith(".npz"))
+        columns = {}
+        for name in parts:
+            with np.load(os.path.join(path, name), allow_pickle=False) as data:
+                for key in data.files:
+                    columns.setdefault(key, []).append(data[key])
+        return {key: np.concatenate(chunks) for key, chunks in columns.items()}
+
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def run_sweep(scenarios, output_path=None, num_steps=None, root_seed=0, max_workers=None,
+              format="npz", chunk_size=1000, predictor_factory=None, predictor_kwargs=None):
+    """
+    Run every scenario across a process pool and yield
+    (index, overrides, seed, metrics) as each one finishes.
+
+    At most a few scenarios per worker are in flight at a time, so sweeps
+    of 10k+ scenarios neither build all futures up front nor keep results
+    in memory; with `output_path` each row is also appended to a
+    SweepWriter. Scenario seeds depend only on root_seed and the scenario's
+    position, not on which worker runs it or when.
+    """
+    scenarios = list(scenarios)
+    seeds = scenario_seeds(root_seed, len(scenarios))
+
+    # Every row gets a column per overridden parameter; scenarios that do not
+    # override one record the default config value
+    defaults = flatten_overrides(vars(SupplyChainConfig()))
+    param_names = sorted({name for overrides in scenarios for name in flatten_overrides(overrides)})
+
+    writer = SweepWriter(output_path, format, chunk_size) if output_path else None
+    max_workers = max_workers or os.cpu_count() or 1
+
+    pending = set()
+    queued = iter(enumerate(scenarios))
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(predictor_factory, predictor_kwargs)) as pool:
+            while True:
+                for index, overrides in itertools.islice(queued, 4 * max_workers - len(pending)):
+                    pending.add(pool.submit(run_scenario, index, overrides, seeds[index], num_steps))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, metrics = future.result()
+                    overrides = scenarios[index]
+                    if writer:
+                        row = {"scenario": index, "seed": seeds[index]}
+                        params = flatten_overrides(overrides)
+                        row.update({name: params.get(name, defaults[name]) for name in param_names})
+                        row.update({name: metrics[name] for name in METRIC_NAMES})
+                        writer.write(row)
+                    yield index, overrides, seeds[index], metrics
+    finally:
+        if writer:
+            writer.close()
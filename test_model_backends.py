@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from smolagents import CodeAgent
+from smolagents.models import ChatMessage
+
+from agents import RetailTool, SupplyTool
+from model_backends import CachedModel, LazyAgent, LocalRuleModel, ResponseCache
+from orchestrator import default_tools
+
+
+class TestModelBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_agent(self, model, task):
+        return CodeAgent(tools=default_tools(), model=model, verbosity_level=0).run(task)
+
+    def test_local_model_is_deterministic(self):
+        task = "Pick an action for: manufacturer_inventory=5, distributor_inventory=40"
+        self.assertEqual(self.run_agent(LocalRuleModel(), task), "supply")
+        self.assertEqual(self.run_agent(LocalRuleModel(), task), "supply")
+        self.assertEqual(self.run_agent(LocalRuleModel(), task.replace("=40", "=10").replace("=5", "=30")),
+                         "distribute")
+
+    def test_cached_model_serves_repeated_turns(self):
+        task = "Pick an action for: manufacturer_inventory=30, distributor_inventory=40"
+        local = LocalRuleModel()
+        first = CachedModel(local, ResponseCache(self.tmpdir.name))
+        self.assertEqual(self.run_agent(first, task), "manufacture")
+        self.assertEqual(local.requests, 1)
+
+        # A new cache instance (e.g. another run or process) over the same directory
+        second = CachedModel(local, ResponseCache(self.tmpdir.name))
+        self.assertEqual(self.run_agent(second, task), "manufacture")
+        self.assertEqual(local.requests, 1)
+        self.assertEqual(second.cache.stats()["hits"], 1)
+
+    def test_key_covers_tool_schema(self):
+        model = CachedModel(LocalRuleModel(), ResponseCache(self.tmpdir.name))
+        messages = [ChatMessage(role="user", content="hello")]
+        self.assertEqual(model.cache_key(messages), model.cache_key(list(messages)))
+        self.assertNotEqual(model.cache_key(messages, tools_to_call_from=[SupplyTool()]),
+                            model.cache_key(messages, tools_to_call_from=[RetailTool()]))
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = ResponseCache(self.tmpdir.name, max_bytes=300)
+        for i in range(3):
+            cache.put(f"key{i}", {"content": "x" * 80})
+            os.utime(os.path.join(self.tmpdir.name, f"key{i}.json"), ns=(i * 10**9, i * 10**9))
+        cache.get("key0")  # refreshes key0, so key1 is now the oldest
+        cache.put("key3", {"content": "x" * 80})
+        self.assertIsNone(cache.get("key1"))
+        self.assertIsNotNone(cache.get("key0"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], 300)
+
+    def test_lazy_agent_builds_on_first_run(self):
+        built = []
+
+        def factory():
+            built.append(LocalRuleModel())
+            return built[-1]
+
+        agent = LazyAgent(default_tools(), factory, verbosity_level=0)
+        self.assertEqual(built, [])
+        self.assertEqual(agent.run("manufacturer_inventory=0"), "supply")
+        agent.run("manufacturer_inventory=0")
+        self.assertEqual(len(built), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import unittest
+
+from smolagents import Model
+from smolagents.models import ChatMessage, ChatMessageStreamDelta
+
+from orchestrator import AsyncOrchestrator, ConcurrencyLimitedModel
+from testing_helpers import RuleBasedPredictor
+
+
+class StubModel(Model):
+    """
+    Local stand-in for HfApiModel. With a `barrier`, each request waits
+    until `barrier.parties` requests are in flight at the same time.
+    """
+
+    ANSWER = ("Thought: supply what is needed.\n<code>\n"
+              "final_answer(supply_tool(demand=30, inventory=100))\n</code>")
+
+    def __init__(self, barrier=None, **kwargs):
+        super().__init__(model_id="stub", **kwargs)
+        self.barrier = barrier
+
+    def generate(self, messages, stop_sequences=None, response_format=None,
+                 tools_to_call_from=None, **kwargs):
+        if self.barrier is not None:
+            self.barrier.wait(timeout=10)
+        return ChatMessage(role="assistant", content=self.ANSWER)
+
+    def generate_stream(self, messages, **kwargs):
+        self.streamed = 0
+        for word in self.ANSWER.split(" "):
+            self.streamed += 1
+            yield ChatMessageStreamDelta(content=word + " ")
+
+
+class BarrierPredictor(RuleBasedPredictor):
+    """RuleBasedPredictor whose first prediction waits at a shared barrier."""
+
+    def __init__(self, barrier):
+        self.barrier = barrier
+        self.waited = False
+
+    def predict_action(self, state):
+        if not self.waited:
+            self.waited = True
+            self.barrier.wait()
+        return super().predict_action(state)
+
+
+class TestAsyncOrchestrator(unittest.TestCase):
+    def run_sessions(self, n_sessions, max_llm_requests, barrier=None):
+        with AsyncOrchestrator(StubModel(barrier), max_workers=16,
+                               max_llm_requests=max_llm_requests) as orchestrator:
+            results = asyncio.run(orchestrator.run_agents(
+                [f"Session {i}: how much to supply?" for i in range(n_sessions)],
+                verbosity_level=0
+            ))
+            return results, orchestrator.model
+
+    def test_agent_sessions_complete(self):
+        results, model = self.run_sessions(4, max_llm_requests=2)
+        self.assertEqual(results, [30, 30, 30, 30])
+        self.assertEqual(model.requests, 4)
+
+    def test_peak_concurrency_reaches_the_cap(self):
+        # Requests only return once `limit` of them are in flight together, so
+        # the sessions finish only if the cap is reached, and it is never exceeded
+        for limit in (1, 4, 8):
+            _, model = self.run_sessions(8, max_llm_requests=limit, barrier=threading.Barrier(limit))
+            self.assertEqual(model.max_in_flight, limit)
+            self.assertEqual(model.in_flight, 0)
+
+    def test_stream_holds_slot_while_open(self):
+        stub = StubModel()
+        model = ConcurrencyLimitedModel(stub, limit=1)
+        stream = model.generate_stream([])
+        first = next(stream)
+        self.assertEqual(first.content, "Thought: ")
+        self.assertEqual((stub.streamed, model.in_flight), (1, 1))
+        stream.close()
+        self.assertEqual(model.in_flight, 0)
+        self.assertEqual("".join(delta.content for delta in model.generate_stream([])), stub.ANSWER + " ")
+        self.assertEqual((model.requests, model.max_in_flight), (2, 1))
+
+    def test_simulations_run_concurrently(self):
+        # Each run's first prediction waits until all four runs are in it together,
+        # so the runs only finish if run_simulations overlaps them
+        barrier = threading.Barrier(4, timeout=10)
+        runs = [{"num_steps": 10, "predictor": BarrierPredictor(barrier)} for _ in range(4)]
+        with AsyncOrchestrator(max_workers=4) as orchestrator:
+            results = asyncio.run(orchestrator.run_simulations(runs))
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result["fill_rate"] > 0 for result in results))
+
+    def test_serialised_simulations_would_not_meet(self):
+        barrier = threading.Barrier(2, timeout=0.2)
+        runs = [{"num_steps": 2, "predictor": BarrierPredictor(barrier)} for _ in range(2)]
+        with AsyncOrchestrator(max_workers=1) as orchestrator:
+            with self.assertRaises(threading.BrokenBarrierError):
+                asyncio.run(orchestrator.run_simulations(runs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,449 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import automl_predictor
+from automl_predictor import Predictor
+from createModel import (StreamingEncoder, build_structured_features, export_numpy_model,
+                         fit_linear_model_streaming, import_training_frame, load_feature_meta,
+                         svmlight_columns, svmlight_label_levels, write_features)
+from features import parse_state_text
+from prediction_cache import CachedPredictor, PredictionCache
+
+
+class TestPredictor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_path = os.path.join(cls.tmpdir.name, "action_model.npz")
+        cls.df = pd.read_csv("data.csv")
+        features, _ = build_structured_features(cls.df)
+        export_numpy_model(features, cls.df["action"].tolist(),
+                           encoder="structured", path=cls.model_path)
+        cls.states = [parse_state_text(text) for text in cls.df["state"][:50]]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def make_predictor(self, encoder="structured"):
+        return Predictor(backend="numpy", encoder=encoder, model_path=self.model_path)
+
+    def test_batch_matches_single(self):
+        predictor = self.make_predictor()
+        batch = predictor.predict_actions(self.states)
+        single = [predictor.predict_action(state) for state in self.states]
+        self.assertEqual(batch, single)
+        self.assertEqual(batch, self.df["action"][:50].tolist())
+
+    def test_reports_sub_phase_spans(self):
+        from profiling import PhaseTimer
+
+        predictor = self.make_predictor()
+        timer = PhaseTimer()
+        with timer.activate():
+            predictor.predict_actions(self.states)
+            predictor.predict_action(self.states[0])
+        self.assertEqual(timer.summary()["predict.vectorize"]["count"], 2)
+        self.assertEqual(timer.summary()["predict.score"]["count"], 2)
+
+    def test_empty_batch(self):
+        self.assertEqual(self.make_predictor().predict_actions([]), [])
+
+    def test_encoder_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.make_predictor(encoder="tfidf")
+
+    def test_h2o_encoder_mismatch(self):
+        # Raised before H2O is started: the shipped leader has no record, so it is TF-IDF
+        with self.assertRaisesRegex(ValueError, "'tfidf' features"):
+            Predictor(backend="h2o", encoder="structured", model_path=automl_predictor.MODEL_PATH)
+
+        model_path = os.path.join(self.tmpdir.name, "leader")
+        automl_predictor.save_model_encoder(model_path, "structured")
+        self.assertEqual(automl_predictor.load_model_encoder(model_path), "structured")
+        with self.assertRaisesRegex(ValueError, "'structured' features"):
+            Predictor(backend="h2o", encoder="tfidf", model_path=model_path)
+
+    def test_shared_predictor_is_cached(self):
+        predictor = self.make_predictor()
+        automl_predictor.set_predictor(predictor)
+        try:
+            self.assertIs(automl_predictor.get_predictor(), predictor)
+            self.assertEqual(automl_predictor.predict_action(self.states[0]),
+                             predictor.predict_action(self.states[0]))
+        finally:
+            automl_predictor.set_predictor(None)
+
+    def test_shared_predictor_is_built_once_across_threads(self):
+        from unittest import mock
+
+        built = []
+
+        def slow_predictor():
+            time.sleep(0.05)
+            built.append(CountingPredictor())
+            return built[-1]
+
+        automl_predictor.set_predictor(None)
+        try:
+            with mock.patch.object(automl_predictor, "Predictor", slow_predictor):
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    predictors = list(pool.map(lambda _: automl_predictor.get_predictor(), range(8)))
+            self.assertEqual(len(built), 1)
+            self.assertTrue(all(predictor is built[0] for predictor in predictors))
+        finally:
+            automl_predictor.set_predictor(None)
+
+    def test_predict_action_is_thread_safe(self):
+        predictor = self.make_predictor()
+        expected = [predictor.predict_action(state) for state in self.states]
+
+        def encode_and_score(i):
+            # Another thread runs between encoding and scoring
+            row = predictor.encoder.encode(self.states[i]).copy()
+            time.sleep(0.001)
+            return predictor.encoder._row.tolist() == row.tolist(), predictor.predict_action(self.states[i])
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(encode_and_score, range(len(self.states))))
+        self.assertTrue(all(unchanged for unchanged, _ in results))
+        self.assertEqual([action for _, action in results], expected)
+
+    def test_import_does_not_load_h2o(self):
+        code = "import sys, main; print('h2o' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                                text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+    def test_tfidf_batch_matches_single(self):
+        from createModel import build_tfidf_features
+
+        vectorizer_path = os.path.join(self.tmpdir.name, "tfidf_vectorizer.pkl")
+        model_path = os.path.join(self.tmpdir.name, "tfidf_model.npz")
+        features, _ = build_tfidf_features(self.df, vectorizer_path)
+        export_numpy_model(features, self.df["action"].tolist(), encoder="tfidf", path=model_path)
+        predictor = Predictor(backend="numpy", encoder="tfidf", model_path=model_path,
+                              vectorizer_path=vectorizer_path)
+        batch = predictor.predict_actions(self.states)
+        self.assertEqual(batch, [predictor.predict_action(state) for state in self.states])
+        self.assertEqual(batch, automl_predictor.NumpyActionModel.load(model_path).predict(
+            features[:len(self.states)]))
+
+    def test_module_predict_actions_uses_shared_predictor(self):
+        predictor = self.make_predictor()
+        automl_predictor.set_predictor(predictor)
+        try:
+            self.assertEqual(automl_predictor.predict_actions(self.states),
+                             predictor.predict_actions(self.states))
+        finally:
+            automl_predictor.set_predictor(None)
+
+
+class TestNumpyActionModel(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "model.npz")
+        self.model = automl_predictor.NumpyActionModel(
+            coef=[[1.0, 0.0], [0.0, 1.0], [-1.0, -1.0]], intercept=[0.0, 0.5, 0.0],
+            classes=["supply", "manufacture", "distribute"], encoder="structured")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_predict_takes_the_highest_score(self):
+        import numpy as np
+        from scipy import sparse
+
+        features = np.array([[2.0, 1.0], [0.0, 0.0], [-3.0, -3.0]])
+        expected = ["supply", "manufacture", "distribute"]
+        self.assertEqual(self.model.predict(features), expected)
+        self.assertEqual(self.model.predict(sparse.csr_matrix(features)), expected)
+
+    def test_save_load_round_trip(self):
+        self.model.save(self.path)
+        loaded = automl_predictor.NumpyActionModel.load(self.path)
+        self.assertEqual(loaded.coef.tolist(), self.model.coef.tolist())
+        self.assertEqual(loaded.intercept.tolist(), self.model.intercept.tolist())
+        self.assertEqual(loaded.classes.tolist(), self.model.classes.tolist())
+        self.assertEqual(loaded.encoder, "structured")
+
+    def test_files_without_encoder_are_tfidf(self):
+        import numpy as np
+
+        np.savez(self.path, coef=self.model.coef, intercept=self.model.intercept, classes=self.model.classes)
+        self.assertEqual(automl_predictor.NumpyActionModel.load(self.path).encoder, "tfidf")
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            automl_predictor.NumpyActionModel.load(os.path.join(self.tmpdir.name, "missing.npz"))
+
+
+class CountingPredictor:
+    """Stand-in predictor that records how often it is called."""
+
+    def __init__(self, fingerprint="model-a"):
+        self.fingerprint = fingerprint
+        self.calls = 0
+
+    def predict_action(self, state):
+        return self.predict_actions([state])[0]
+
+    def predict_actions(self, states):
+        self.calls += 1
+        return ["supply" if s["supplier_inventory"] < 50 else "manufacture" for s in states]
+
+
+class TestPredictionCache(unittest.TestCase):
+    def setUp(self):
+        self.state = {
+            "supplier_inventory": 100,
+            "manufacturer_capacity": 50,
+            "manufacturer_inventory": 0,
+            "distributor_inventory": 50,
+            "retail_inventory": 0,
+            "retailer_customer_demand": 40,
+            "backorders": 0,
+            "forecast_demand": 40
+        }
+
+    def test_repeated_state_hits(self):
+        predictor = CountingPredictor()
+        cached = CachedPredictor(predictor)
+        for _ in range(3):
+            self.assertEqual(cached.predict_action(dict(self.state)), "manufacture")
+        self.assertEqual(predictor.calls, 1)
+        stats = cached.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_size=2)
+        for i in range(3):
+            cache.put((i,), "supply")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get((0,)))
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = PredictionCache(ttl=10, clock=lambda: now[0])
+        cache.put(("a",), "supply")
+        self.assertEqual(cache.get(("a",)), "supply")
+        now[0] = 11.0
+        self.assertIsNone(cache.get(("a",)))
+        self.assertEqual(cache.expirations, 1)
+
+    def test_bucketing(self):
+        cache = PredictionCache(buckets={"retailer_customer_demand": 5})
+        other = dict(self.state, retailer_customer_demand=44)
+        self.assertEqual(cache.key(self.state), cache.key(other))
+        self.assertNotEqual(PredictionCache().key(self.state), PredictionCache().key(other))
+
+    def test_invalidated_by_new_model(self):
+        cached = CachedPredictor(CountingPredictor("model-a"))
+        cached.predict_action(self.state)
+        cached._predictor = CountingPredictor("model-b")
+        cached.predict_action(self.state)
+        self.assertEqual(cached._predictor.calls, 1)
+        self.assertEqual(cached.cache.invalidations, 1)
+
+    def test_batch_scores_distinct_misses_once(self):
+        predictor = CountingPredictor()
+        cached = CachedPredictor(predictor)
+        low = dict(self.state, supplier_inventory=10)
+        actions = cached.predict_actions([self.state, low, self.state, low])
+        self.assertEqual(actions, ["manufacture", "supply", "manufacture", "supply"])
+        self.assertEqual(predictor.calls, 1)
+        self.assertEqual(len(cached.cache), 2)
+
+
+class TestStreamingTraining(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.df = pd.read_csv("data.csv")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_chunked_tfidf_matches_full_fit(self):
+        from sklearn.datasets import load_svmlight_file
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        encoder = StreamingEncoder("data.csv", "tfidf", chunk_size=100,
+                                   vectorizer_path=self.path("tfidf.pkl"))
+        reference = TfidfVectorizer().fit(self.df["state"])
+        self.assertEqual(list(encoder.feature_names), list(reference.get_feature_names_out()))
+
+        write_features("data.csv", self.path("features.svmlight"), encoder, chunk_size=100)
+        features, labels = load_svmlight_file(self.path("features.svmlight"), zero_based=False,
+                                              n_features=len(encoder.feature_names))
+        self.assertAlmostEqual(abs(features - reference.transform(self.df["state"])).max(), 0)
+        self.assertEqual([encoder.classes[int(label)] for label in labels], self.df["action"].tolist())
+
+    def test_tfidf_scan_needs_a_vectorizer_path(self):
+        with self.assertRaises(ValueError):
+            StreamingEncoder("data.csv", "tfidf", chunk_size=100)
+
+    def test_svmlight_import_layout(self):
+        from sklearn.datasets import load_svmlight_file
+
+        encoder = StreamingEncoder("data.csv", "tfidf", chunk_size=100,
+                                   vectorizer_path=self.path("tfidf.pkl"))
+        write_features("data.csv", self.path("features.svmlight"), encoder, chunk_size=100)
+        meta = load_feature_meta(self.path("features.svmlight"))
+        features, labels = load_svmlight_file(self.path("features.svmlight"), zero_based=False)
+        # H2O imports the label column plus one column per index up to the highest present
+        names, missing = svmlight_columns(meta, 1 + features.shape[1])
+        self.assertEqual(names, ["action"] + [str(name) for name in encoder.feature_names])
+        self.assertEqual(missing, [])
+        names, missing = svmlight_columns(meta, features.shape[1] - 1)
+        self.assertEqual(names[1:] + missing, meta["feature_names"])
+        self.assertEqual(len(missing), 2)
+
+        levels = sorted({str(label) for label in labels})  # e.g. "0.0", "1.0"
+        actions = dict(zip(levels, svmlight_label_levels(meta, levels)))
+        self.assertEqual([actions[str(label)] for label in labels], self.df["action"].tolist())
+
+    @unittest.skipUnless(shutil.which("java"), "H2O needs a Java runtime")
+    def test_import_training_frame_with_h2o(self):
+        import h2o
+
+        encoder = StreamingEncoder("data.csv", "tfidf", chunk_size=100,
+                                   vectorizer_path=self.path("tfidf.pkl"))
+        write_features("data.csv", self.path("features.svmlight"), encoder, chunk_size=100)
+        h2o.init()
+        frame = import_training_frame(self.path("features.svmlight")).as_data_frame()
+        self.assertEqual(list(frame.columns)[0], "action")
+        self.assertEqual(set(frame.columns[1:]), {str(name) for name in encoder.feature_names})
+        self.assertEqual(frame["action"].astype(str).tolist(), self.df["action"].tolist())
+
+    def test_streaming_numpy_model(self):
+        encoder = StreamingEncoder("data.csv", "structured", chunk_size=100)
+        write_features("data.csv", self.path("features.parquet"), encoder, chunk_size=100)
+        frame = pd.read_parquet(self.path("features.parquet"))
+        self.assertEqual(list(frame.columns), list(encoder.feature_names) + ["action"])
+        self.assertEqual(len(frame), len(self.df))
+
+        coef, intercept, classes = fit_linear_model_streaming("data.csv", encoder, chunk_size=100)
+        automl_predictor.NumpyActionModel(coef, intercept, classes, "structured").save(
+            self.path("action_model.npz"))
+        predictor = Predictor(backend="numpy", encoder="structured",
+                              model_path=self.path("action_model.npz"))
+        states = [parse_state_text(text) for text in self.df["state"]]
+        accuracy = (pd.Series(predictor.predict_actions(states)) == self.df["action"]).mean()
+        self.assertGreaterEqual(accuracy, 0.95)
+
+
+class BatchRecordingPredictor(CountingPredictor):
+    """CountingPredictor that records the size of every batch it scores."""
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        self.batch_sizes = []
+
+    def predict_actions(self, states):
+        self.batch_sizes.append(len(states))
+        time.sleep(self.delay)
+        return super().predict_actions(states)
+
+
+class TestScoringServer(unittest.TestCase):
+    def setUp(self):
+        self.states = [parse_state_text(text) for text in pd.read_csv("data.csv")["state"][:20]]
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))  # localhost only
+
+    def request(self, server, path, body=None, content_type="application/json"):
+        request = urllib.request.Request(server.url + path, data=body, headers={"Content-Type": content_type})
+        with self.opener.open(request, timeout=10) as response:
+            return response.status, response.headers.get("Content-Type"), response.read().decode("utf-8")
+
+    def test_json_and_ndjson_batches(self):
+        from scoring_server import ScoringServer
+
+        predictor = BatchRecordingPredictor()
+        expected = CountingPredictor().predict_actions(self.states)
+        with ScoringServer(predictor, max_wait=0) as server:
+            _, _, body = self.request(server, "/predict", json.dumps({"states": self.states}).encode())
+            self.assertEqual(json.loads(body), {"actions": expected})
+            _, _, body = self.request(server, "/predict", json.dumps(self.states[0]).encode())
+            self.assertEqual(json.loads(body), {"action": expected[0]})
+
+            ndjson = "".join(json.dumps(state) + "\n" for state in self.states[:5])
+            _, content_type, body = self.request(server, "/predict", ndjson.encode(), "application/x-ndjson")
+            self.assertEqual(content_type, "application/x-ndjson")
+            self.assertEqual([json.loads(line)["action"] for line in body.splitlines()], expected[:5])
+
+            text = "supplier_inventory=10, manufacturer_capacity=50, manufacturer_inventory=0, " \
+                   "distributor_inventory=50, retail_inventory=0, retailer_customer_demand=40, " \
+                   "backorders=0, forecast_demand=40"
+            _, _, body = self.request(server, "/predict", json.dumps([text]).encode())
+            self.assertEqual(json.loads(body), {"actions": ["supply"]})
+
+    def test_concurrent_requests_are_micro_batched(self):
+        from scoring_server import ScoringServer
+
+        predictor = BatchRecordingPredictor(delay=0.02)
+        with ScoringServer(predictor, max_batch_size=4, max_wait=0.2) as server:
+            with ThreadPoolExecutor(max_workers=12) as pool:
+                bodies = list(pool.map(
+                    lambda state: self.request(server, "/predict", json.dumps([state]).encode())[2],
+                    self.states[:12]))
+            stats = json.loads(self.request(server, "/stats")[2])
+
+        self.assertEqual([json.loads(body)["actions"][0] for body in bodies],
+                         CountingPredictor().predict_actions(self.states[:12]))
+        self.assertEqual(sum(predictor.batch_sizes), 12)
+        self.assertLessEqual(max(predictor.batch_sizes), 4)
+        self.assertLess(len(predictor.batch_sizes), 12)
+        self.assertEqual((stats["requests"], stats["states"], stats["batches"]), (12, 12, len(predictor.batch_sizes)))
+        self.assertEqual((stats["queue_depth"], stats["queued_states"]), (0, 0))
+        self.assertGreaterEqual(stats["max_queue_depth"], 1)
+        self.assertEqual(stats["latency"]["request"]["count"], 12)
+        self.assertGreater(stats["latency"]["score"]["p50_s"], 0)
+
+    def test_bad_requests_are_rejected_before_batching(self):
+        from scoring_server import ScoringServer
+
+        predictor = BatchRecordingPredictor()
+        with ScoringServer(predictor, max_wait=0) as server:
+            for body in (b"not json", json.dumps([{"supplier_inventory": 1}]).encode(),
+                         json.dumps([dict(self.states[0], backorders="many")]).encode()):
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    self.request(server, "/predict", body)
+                self.assertEqual(raised.exception.code, 400)
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                self.request(server, "/unknown")
+            self.assertEqual(raised.exception.code, 404)
+            self.assertIn("scoring_seconds", self.request(server, "/metrics")[2])
+        self.assertEqual(predictor.batch_sizes, [])
+
+    def test_batcher_holds_over_requests_that_do_not_fit(self):
+        from scoring_server import MicroBatcher
+
+        predictor = BatchRecordingPredictor()
+        batcher = MicroBatcher(predictor.predict_actions, max_batch_size=5, max_wait=10)
+        futures = [batcher.submit(self.states[:size]) for size in (3, 3, 2, 7)]
+        batcher.start()
+        results = [future.result(timeout=10) for future in futures]
+        batcher.close()
+        self.assertEqual(predictor.batch_sizes, [3, 5, 7])
+        self.assertEqual([len(result) for result in results], [3, 3, 2, 7])
+        self.assertEqual(batcher.stats()["largest_batch"], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
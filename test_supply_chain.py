@@ -1,6 +1,8 @@
 import unittest
 from agents import SupplyTool, ManufactureTool, DistributeTool, RetailTool
-from utils import DemandForecast, PerformanceMetrics, CostManager
+from utils import DemandForecast, PerformanceMetrics, CostManager, STATE_FIELDS
+from features import StateEncoder, parse_state_text
+from testing_helpers import RuleBasedPredictor, rule_based_policy
 
 class TestSupplyChainAgents(unittest.TestCase):
     def setUp(self):
@@ -83,6 +85,27 @@ class TestDemandForecast(unittest.TestCase):
         
         self.assertEqual(len(self.forecast.demand_history), 5)
 
+class TestBatchDemandForecast(unittest.TestCase):
+    def test_matches_scalar_forecast(self):
+        import random
+        from utils import BatchDemandForecast
+
+        rng = random.Random(2)
+        demands = [[rng.randint(0, 80) for _ in range(4)] for _ in range(30)]
+        scalar = [DemandForecast(window_size=5) for _ in range(4)]
+        batch = BatchDemandForecast(4, window_size=5)
+        self.assertEqual(batch.forecast().tolist(), [f.forecast() for f in scalar])
+        for row in demands:
+            for forecast, demand in zip(scalar, row):
+                forecast.update(demand)
+            batch.update(row)
+            self.assertEqual(batch.level.tolist(), [f.level for f in scalar])
+            for horizon in (1, 3):
+                self.assertEqual(batch.forecast(horizon).tolist(), [f.forecast(horizon) for f in scalar])
+        self.assertEqual(batch.forecast([1, 2, 7]).tolist(),
+                         [[f.forecast(h) for f in scalar] for h in (1, 2, 7)])
+        self.assertEqual(batch.demand_history.T.tolist(), [list(f.demand_history) for f in scalar])
+
 class TestPerformanceMetrics(unittest.TestCase):
     def setUp(self):
         self.metrics = PerformanceMetrics()
@@ -108,6 +131,27 @@ class TestPerformanceMetrics(unittest.TestCase):
         metrics = self.metrics.calculate_metrics()
         self.assertEqual(metrics["backorders"], 20)
 
+    def test_bounded_history(self):
+        metrics = PerformanceMetrics(window=3)
+        for level in range(10):
+            metrics.update_inventory({"retail": level})
+        self.assertEqual(metrics.inventory_history, [7, 8, 9])
+        self.assertEqual(metrics.calculate_metrics()["average_inventory"], 4.5)
+
+    def test_streaming_quantiles(self):
+        import random
+
+        rng = random.Random(5)
+        levels = [rng.gauss(100, 15) for _ in range(5000)]
+        metrics = PerformanceMetrics(window=None, quantiles=(0.5, 0.95))
+        for level in levels:
+            metrics.update_inventory({"retail": level})
+        levels.sort()
+        quantiles = metrics.quantiles()
+        self.assertAlmostEqual(quantiles["inventory_p50"], levels[2500], delta=1)
+        self.assertAlmostEqual(quantiles["inventory_p95"], levels[4750], delta=2)
+        self.assertEqual(metrics.inventory_history, [])
+
 class TestCostManager(unittest.TestCase):
     def setUp(self):
         self.costs = {
@@ -145,5 +189,1039 @@ class TestCostManager(unittest.TestCase):
         
         self.assertEqual(daily_costs, expected_costs)
 
+    def test_running_totals_outlive_window(self):
+        cost_manager = CostManager(self.costs, window=2)
+        state = {"supplier_inventory": 1, "manufacturer_inventory": 0,
+                 "distributor_inventory": 0, "retail_inventory": 0, "backorders": 0}
+        for supply in range(5):
+            cost_manager.calculate_costs(state, supply=supply, production=0, distribution=0)
+        self.assertEqual(cost_manager.cost_history, [32, 42])
+        self.assertEqual(cost_manager.total_costs, 110)
+        self.assertEqual(cost_manager.days, 5)
+        self.assertEqual(cost_manager.quantiles()["daily_cost_p50"], 22)
+
+    def test_ledger_records_each_day_by_category(self):
+        from utils import CostLedger
+
+        ledger = CostLedger(10)
+        cost_manager = CostManager(self.costs, ledger=ledger)
+        state = {"supplier_inventory": 1, "manufacturer_inventory": 2,
+                 "distributor_inventory": 3, "retail_inventory": 4, "backorders": 5}
+        for supply in range(4):
+            cost_manager.calculate_costs(state, supply=supply, production=1, distribution=2)
+        self.assertEqual(ledger.steps, 4)
+        self.assertEqual(ledger.entries[3, 0].tolist(), [30, 15, 10, 20, 100])
+        self.assertEqual(ledger.daily()[:, 0].tolist(), cost_manager.cost_history)
+        self.assertEqual(ledger.totals().sum(), cost_manager.total_costs)
+
+    def test_daily_costs_are_floats_with_or_without_ledger(self):
+        from utils import CostLedger
+
+        state = {"supplier_inventory": 1, "manufacturer_inventory": 0,
+                 "distributor_inventory": 0, "retail_inventory": 0, "backorders": 0}
+        plain = CostManager(self.costs).calculate_costs(state, supply=3, production=0, distribution=0)
+        ledgered = CostManager(self.costs, ledger=CostLedger(1)).calculate_costs(
+            state, supply=3, production=0, distribution=0)
+        self.assertIs(type(plain), float)
+        self.assertIs(type(ledgered), float)
+        self.assertEqual(plain, ledgered)
+
+    def test_ledger_costs_must_match_the_owner(self):
+        from utils import COST_TYPES, CostLedger
+
+        with self.assertRaises(ValueError):
+            CostManager(self.costs, ledger=CostLedger(10, costs={**self.costs, "holding": 99}))
+        ledger = CostLedger(10, costs=self.costs)
+        CostManager(self.costs, ledger=ledger)
+        self.assertEqual(ledger.costs[0].tolist(), [self.costs[key] for key in COST_TYPES])
+
+    def test_restoring_without_ledger_entries_raises(self):
+        from utils import CostLedger
+
+        saved = CostManager(self.costs).getstate()
+        with self.assertRaises(ValueError):
+            CostManager(self.costs, ledger=CostLedger(10)).setstate(saved)
+
+
+class TestCostLedger(unittest.TestCase):
+    def setUp(self):
+        from utils import CostLedger
+
+        self.ledger = CostLedger(8, n_replicas=2, costs=[[1, 1, 1, 1, 1], [2, 2, 2, 2, 2]])
+        for step in range(5):
+            self.ledger.record(step, supply=step, production=1, distribution=0,
+                               inventory=[10, 20], backorders=0)
+
+    def test_record_fills_rows_in_place(self):
+        entries = self.ledger.entries
+        self.assertEqual(entries.shape, (8, 2, 5))
+        self.ledger.record(5, 1, 1, 1, 1, 1)
+        self.assertIs(self.ledger.entries, entries)
+        self.assertEqual(entries[4].tolist(), [[4, 1, 0, 10, 0], [8, 2, 0, 40, 0]])
+        self.assertEqual(self.ledger.steps, 6)
+
+    def test_rollups(self):
+        from utils import COST_TYPES
+
+        ledger = self.ledger
+        self.assertEqual(ledger.totals().tolist(), [[10, 5, 0, 50, 0], [20, 10, 0, 200, 0]])
+        self.assertEqual(ledger.totals(1, 3, "raw_material").tolist(), [3, 6])
+        self.assertEqual(ledger.totals(categories=["holding", "raw_material"]).tolist(), [[50, 10], [200, 20]])
+        self.assertEqual(ledger.daily()[:, 0].tolist(), [11, 12, 13, 14, 15])
+        self.assertEqual(ledger.cumulative()[-1].tolist(), ledger.totals().sum(axis=1).tolist())
+        windows = ledger.rollup(2)
+        self.assertEqual(windows.shape, (3, 2, len(COST_TYPES)))
+        self.assertEqual(windows[:, 0, 0].tolist(), [1, 5, 4])  # the last window is partial
+        self.assertEqual(ledger.rollup(2, "holding")[:, 1].tolist(), [80, 80, 40])
+
+    def test_state_round_trip(self):
+        from utils import CostLedger
+
+        restored = CostLedger(8, n_replicas=2)
+        restored.setstate(self.ledger.getstate())
+        self.assertEqual(restored.steps, 5)
+        self.assertEqual(restored.entries.tolist(), self.ledger.entries.tolist())
+
+    def test_run_simulation_accounts_costs_and_fill_rate(self):
+        from utils import CostLedger
+        from datagen import ReorderPointPolicy
+        from main import run_simulation
+
+        ledger = CostLedger(30)
+        metrics = run_simulation(num_steps=30, predictor=ReorderPointPolicy(), verbose=False, seed=3,
+                                 ledger=ledger)
+        self.assertGreater(metrics["total_costs"], 0)
+        self.assertGreater(metrics["average_inventory"], 0)
+        self.assertTrue(0 < metrics["fill_rate"] <= 100)
+        self.assertEqual(ledger.steps, 30)
+        self.assertAlmostEqual(ledger.totals().sum(), metrics["total_costs"])
+
+    def test_run_simulation_rejects_a_short_ledger(self):
+        import os
+        import tempfile
+        from utils import CostLedger
+        from config import SupplyChainConfig
+        from main import run_simulation
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config = SupplyChainConfig()
+            config.update({"logging": {"sink": "jsonl", "path": os.path.join(tmp, "run.jsonl")}})
+            with self.assertRaises(ValueError):
+                run_simulation(num_steps=5, predictor=RuleBasedPredictor(), config=config, ledger=CostLedger(3))
+            self.assertFalse(os.path.exists(config.logging["path"]))  # nothing was logged
+
+    def test_vectorized_ledger_matches_daily_costs(self):
+        import numpy as np
+        from utils import CostLedger
+        from vector_sim import VectorizedSimulation
+
+        ledger = CostLedger(12, n_replicas=3)
+        sim = VectorizedSimulation(3, ledger=ledger)
+        daily = []
+        for step in range(12):
+            sim.step(lambda state: np.array([step % 3, 1, 2]), [15, 15, 15], [40, 45, 50])
+            daily.append(sim.daily_costs.tolist())
+        self.assertEqual(ledger.daily().tolist(), daily)
+        self.assertEqual(ledger.totals().sum(axis=1).tolist(), sim.total_costs.tolist())
+        self.assertTrue(((sim.fill_rate() >= 0) & (sim.fill_rate() <= 100)).all())
+
+class TestInventoryOptimizer(unittest.TestCase):
+    def test_batch_matches_scalar(self):
+        import numpy as np
+        from config import InventoryOptimizer, SupplyChainConfig
+
+        rng = np.random.default_rng(4)
+        histories = rng.integers(10, 70, size=(200, 8)).astype(float)
+        lengths = rng.integers(0, 9, size=200)
+        histories[np.arange(8) >= lengths[:, None]] = np.nan
+
+        optimizer = InventoryOptimizer(SupplyChainConfig())
+        batch = optimizer.optimize_batch(histories, lead_time=2)
+        for i, row in enumerate(histories):
+            expected = optimizer.optimize(row[~np.isnan(row)].tolist(), 2)
+            self.assertEqual({key: int(values[i]) for key, values in batch.items()}, expected)
+
+    def test_z_scores_are_cached(self):
+        from config import SafetyStockOptimizer, z_score
+
+        z_score.cache_clear()
+        optimizer = SafetyStockOptimizer(service_level=0.9)
+        for _ in range(5):
+            optimizer.calculate_safety_stock([10, 20, 30], lead_time=1)
+        self.assertEqual(z_score.cache_info().misses, 1)
+        self.assertAlmostEqual(z_score(0.9), 1.2816, places=4)
+
+class TestStateEncoder(unittest.TestCase):
+    def setUp(self):
+        self.encoder = StateEncoder()
+        self.state = {
+            "supplier_inventory": 100,
+            "manufacturer_capacity": 50,
+            "manufacturer_inventory": 0,
+            "distributor_inventory": 50,
+            "retail_inventory": 10,
+            "retailer_customer_demand": 40,
+            "backorders": 5,
+            "forecast_demand": 45
+        }
+
+    def test_encode_follows_schema(self):
+        row = self.encoder.encode(self.state)
+        self.assertEqual(row.shape, (1, len(STATE_FIELDS)))
+        self.assertEqual(row[0].tolist(), [100, 50, 0, 50, 10, 40, 5, 45])
+
+    def test_key_order_does_not_matter(self):
+        reordered = dict(reversed(list(self.state.items())))
+        batch = self.encoder.encode_batch([self.state, reordered])
+        self.assertEqual(batch[0].tolist(), batch[1].tolist())
+
+    def test_missing_field(self):
+        del self.state["backorders"]
+        with self.assertRaises(ValueError):
+            self.encoder.encode(self.state)
+
+    def test_parse_state_text(self):
+        text = ", ".join(f"{key}={value}" for key, value in self.state.items())
+        self.assertEqual(parse_state_text(text), self.state)
+
+    def test_parity_with_tfidf_pipeline(self):
+        import pandas as pd
+        from createModel import check_parity
+
+        report = check_parity(pd.read_csv("data.csv"))
+        self.assertTrue(report["order_invariant"])
+        self.assertGreaterEqual(report["agreement"], 0.95)
+
+class TestEventScheduler(unittest.TestCase):
+    def test_shipments_arrive_after_lead_time(self):
+        from events import EventScheduler
+
+        scheduler = EventScheduler()
+        scheduler.schedule(2, "raw_materials", 10)
+        scheduler.schedule(0, "raw_materials", 5)
+        self.assertEqual([e.quantity for e in scheduler.advance(1)], [5])
+        self.assertEqual(scheduler.in_transit("raw_materials"), 10)
+        self.assertEqual(scheduler.advance(2), [])
+        self.assertEqual([e.quantity for e in scheduler.advance(3)], [10])
+        self.assertEqual(len(scheduler), 0)
+
+    def test_negative_delay(self):
+        from events import EventScheduler
+
+        with self.assertRaises(ValueError):
+            EventScheduler().schedule(-1, "raw_materials", 1)
+
+    def test_run_simulation_does_not_sleep(self):
+        import time
+        from config import SupplyChainConfig
+        from main import run_simulation
+
+        config = SupplyChainConfig()
+        config.update({"simulation": {"lead_time": 5}})
+        start = time.perf_counter()
+        metrics = run_simulation(num_steps=50, predictor=RuleBasedPredictor(), config=config, verbose=False)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertGreater(metrics["fill_rate"], 0)  # retail is restocked and sells
+
+    def test_run_simulation_honours_zero_steps(self):
+        from main import run_simulation
+
+        predictor = RuleBasedPredictor()
+        predictor.predict_action = predictor.predict_actions = lambda *args: self.fail("predicted a step")
+        metrics = run_simulation(num_steps=0, predictor=predictor, verbose=False)
+        self.assertEqual(metrics["total_costs"], 0)
+
+class TestEventLog(unittest.TestCase):
+    def run_logged(self, sink_kind, path, num_steps=12, append=False):
+        from config import SupplyChainConfig
+        from main import run_simulation
+
+        config = SupplyChainConfig()
+        config.update({"logging": {"sink": sink_kind, "path": path, "batch_size": 5, "append": append}})
+        run_simulation(num_steps=num_steps, predictor=RuleBasedPredictor(), config=config)
+
+    def test_jsonl_sink(self):
+        import json
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.jsonl")
+            self.run_logged("jsonl", path)
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual([e["step"] for e in events], list(range(12)))
+        self.assertIn(events[0]["action"], ("supply", "manufacture", "distribute"))
+        self.assertIn("supplier_inventory", events[0])
+
+    def test_columnar_sink_round_trip(self):
+        import os
+        import tempfile
+        from event_log import EVENT_FIELDS, load_event_log
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events")
+            self.run_logged("columnar", path)
+            columns = load_event_log(path)
+            self.assertEqual(set(columns), set(EVENT_FIELDS))
+            self.assertEqual(columns["step"].tolist(), list(range(12)))
+            self.assertEqual(columns["action"][0], "supply")
+            del columns
+
+    def test_buffered_sink_flushes_in_batches(self):
+        import os
+        import tempfile
+        from event_log import JsonLinesSink
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.jsonl")
+            sink = JsonLinesSink(path, batch_size=3)
+            for step in range(2):
+                sink.record({"step": step})
+            self.assertEqual(os.path.getsize(path), 0)
+            sink.record({"step": 2})
+            self.assertGreater(os.path.getsize(path), 0)
+            sink.close()
+
+    def test_file_sinks_start_a_new_log_unless_appending(self):
+        import json
+        import os
+        import tempfile
+        from event_log import ColumnarSink, load_event_log
+
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl, columnar = os.path.join(tmp, "events.jsonl"), os.path.join(tmp, "events")
+            for kind, path in (("jsonl", jsonl), ("columnar", columnar)):
+                self.run_logged(kind, path, num_steps=4)
+                self.run_logged(kind, path, num_steps=3)
+            with open(jsonl) as f:
+                self.assertEqual([json.loads(line)["step"] for line in f], [0, 1, 2])
+            self.assertEqual(load_event_log(columnar)["step"].tolist(), [0, 1, 2])
+
+            self.run_logged("jsonl", jsonl, num_steps=2, append=True)
+            self.run_logged("columnar", columnar, num_steps=2, append=True)
+            with open(jsonl) as f:
+                self.assertEqual([json.loads(line)["step"] for line in f], [0, 1, 2, 0, 1])
+            self.assertEqual(load_event_log(columnar)["step"].tolist(), [0, 1, 2, 0, 1])
+
+            with open(os.path.join(columnar, "schema.json"), "w") as f:
+                json.dump({"columns": {"step": "<i4"}, "actions": []}, f)
+            with self.assertRaises(ValueError):
+                ColumnarSink(columnar, append=True)
+
+    def test_buffered_sinks_must_write(self):
+        from event_log import _BufferedSink
+
+        class Unfinished(_BufferedSink):
+            pass
+
+        with self.assertRaises(TypeError):
+            Unfinished("unused.log")
+
+    def test_print_sink_shows_starting_state(self):
+        from contextlib import redirect_stdout
+        from io import StringIO
+        from main import run_simulation
+
+        output = StringIO()
+        with redirect_stdout(output):
+            run_simulation(num_steps=2, predictor=RuleBasedPredictor())
+        lines = output.getvalue().splitlines()
+        starts = [line for line in lines if line.startswith("Starting state:")]
+        ends = [line for line in lines if line.startswith("End state:")]
+        self.assertEqual(len(starts), 2)
+        self.assertIn("'supplier_inventory': 100", starts[0])
+        self.assertEqual(starts[1].split(":", 1)[1], ends[0].split(":", 1)[1])
+
+    def test_make_sink_requires_path(self):
+        from event_log import make_sink, NullSink
+
+        self.assertIsInstance(make_sink({"sink": "none"}), NullSink)
+        with self.assertRaises(ValueError):
+            make_sink({"sink": "jsonl", "path": None})
+
+class TestVectorizedSimulation(unittest.TestCase):
+    ACTIONS = ["supply", "manufacture", "distribute", "unknown"]
+
+    def run_scalar(self, state, costs, actions, resupplies, demands, lead_time=1):
+        """Reference run through the step functions used by main.run_simulation."""
+        from main import apply_action, restock, receive_shipments
+        from dispatch import fulfil_demand
+        from events import EventScheduler
+
+        tools = (SupplyTool(), ManufactureTool(), DistributeTool())
+        retail_tool = RetailTool()
+        forecast = DemandForecast()
+        cost_manager = CostManager(costs)
+        scheduler = EventScheduler()
+        states = []
+        for step, (action, resupply, demand) in enumerate(zip(actions, resupplies, demands)):
+            state["forecast_demand"] = forecast.forecast()
+            moved = apply_action(state, action, *tools)
+            if moved["supply"]:
+                scheduler.schedule(lead_time, "raw_materials", moved["supply"])
+            fulfil_demand(state, retail_tool)
+            restock(state, resupply, demand)
+            receive_shipments(state, scheduler, step + 1)
+            forecast.update(demand)
+            cost_manager.calculate_costs(state, **moved)
+            states.append([state[field] for field in STATE_FIELDS])
+        return states, cost_manager.cost_history
+
+    def test_single_replica_matches_scalar(self):
+        import random
+        from vector_sim import VectorizedSimulation, DEFAULT_STATE, DEFAULT_COSTS
+
+        rng = random.Random(7)
+        steps = 40
+        actions = [rng.choice(self.ACTIONS) for _ in range(steps)]
+        resupplies = [rng.randint(10, 20) for _ in range(steps)]
+        demands = [max(40 + rng.randint(-5, 5), 0) for _ in range(steps)]
+        for lead_time in (0, 1, 3):
+            expected_states, expected_costs = self.run_scalar(
+                dict(DEFAULT_STATE), DEFAULT_COSTS, actions, resupplies, demands, lead_time
+            )
+
+            sim = VectorizedSimulation(1, lead_time=lead_time)
+            for i in range(steps):
+                sim.step(lambda state: [actions[i]], [resupplies[i]], [demands[i]])
+                self.assertEqual(sim.state[0].tolist(), expected_states[i])
+                self.assertEqual(sim.daily_costs[0], expected_costs[i])
+
+    def test_replicas_are_independent(self):
+        import random
+        import numpy as np
+        from vector_sim import VectorizedSimulation, DEFAULT_STATE, DEFAULT_COSTS, COST_TYPES
+
+        steps, n = 20, 3
+        rng = random.Random(11)
+        actions = [[rng.choice(self.ACTIONS) for _ in range(n)] for _ in range(steps)]
+        resupplies = [[rng.randint(10, 20) for _ in range(n)] for _ in range(steps)]
+        demands = [[rng.randint(30, 50) for _ in range(n)] for _ in range(steps)]
+        initial = [dict(DEFAULT_STATE, supplier_inventory=50 * (r + 1)) for r in range(n)]
+        costs = [dict(DEFAULT_COSTS, holding=r + 1) for r in range(n)]
+
+        sim = VectorizedSimulation(
+            n,
+            initial_state=[[s[f] for f in STATE_FIELDS] for s in initial],
+            costs=[[c[t] for t in COST_TYPES] for c in costs]
+        )
+        for i in range(steps):
+            sim.step(lambda state: np.array(actions[i]), resupplies[i], demands[i])
+
+        for r in range(n):
+            expected_states, expected_costs = self.run_scalar(
+                dict(initial[r]), costs[r],
+                [a[r] for a in actions], [x[r] for x in resupplies], [d[r] for d in demands]
+            )
+            self.assertEqual(sim.state[r].tolist(), expected_states[-1])
+            self.assertEqual(sim.total_costs[r], sum(expected_costs))
+
+class TestSweep(unittest.TestCase):
+    def test_expand_grid(self):
+        from sweep import expand_grid
+
+        scenarios = expand_grid({"costs.holding": [1, 2], "resupply.max_amount": [20, 30]})
+        self.assertEqual(len(scenarios), 4)
+        self.assertEqual(scenarios[0], {"costs": {"holding": 1}, "resupply": {"max_amount": 20}})
+
+    def test_seeds_are_deterministic_and_distinct(self):
+        from sweep import scenario_seeds
+
+        seeds = scenario_seeds(123, 50)
+        self.assertEqual(seeds, scenario_seeds(123, 50))
+        self.assertEqual(len(set(seeds)), 50)
+
+    def test_run_sweep_streams_and_writes_columns(self):
+        import tempfile
+        from sweep import expand_grid, load_results, run_sweep
+
+        scenarios = expand_grid({
+            "simulation.lead_time": [0],
+            "costs.holding": [1, 2, 3],
+            "demand.max_variation": [5, 10]
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            results = list(run_sweep(scenarios, output_path=tmp, num_steps=3, root_seed=1,
+                                     max_workers=2, chunk_size=4,
+                                     predictor_factory=RuleBasedPredictor))
+            columns = load_results(tmp)
+
+        self.assertEqual(sorted(index for index, *_ in results), list(range(6)))
+        self.assertEqual(sorted(columns["scenario"].tolist()), list(range(6)))
+        self.assertIn("costs.holding", columns)
+        self.assertIn("fill_rate", columns)
+
+class TestProfiling(unittest.TestCase):
+    def test_phase_timer_percentiles(self):
+        import json
+        from profiling import PhaseTimer
+
+        timer = PhaseTimer(max_samples=50)
+        for i in range(1, 101):
+            timer.record("forecast", i / 1000)
+        stats = json.loads(timer.to_json())["forecast"]
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["total_s"], 5.05)
+        self.assertAlmostEqual(stats["max_s"], 0.1)
+        self.assertLessEqual(stats["p50_s"], stats["p95_s"])
+        self.assertLessEqual(stats["p95_s"], stats["p99_s"])
+
+    def test_prometheus_export(self):
+        from profiling import PhaseTimer
+
+        timer = PhaseTimer()
+        timer.record("predict", 0.002)
+        timer.record("predict", 0.2)
+        text = timer.to_prometheus()
+        self.assertIn('supply_chain_phase_seconds_bucket{phase="predict",le="0.005"} 1', text)
+        self.assertIn('supply_chain_phase_seconds_bucket{phase="predict",le="+Inf"} 2', text)
+        self.assertIn('supply_chain_phase_seconds_count{phase="predict"} 2', text)
+        self.assertIn('supply_chain_phase_seconds_quantile{phase="predict",quantile="0.99"}', text)
+
+    def test_run_simulation_phases_and_profile(self):
+        import os
+        import tempfile
+        from config import SupplyChainConfig
+        from main import run_simulation
+        from profiling import PhaseTimer
+
+        timer = PhaseTimer()
+        run_simulation(num_steps=20, predictor=RuleBasedPredictor(), verbose=False, timer=timer)
+        for phase in ("forecast", "predict", "tool", "restock", "forecast_update", "metrics", "event_log"):
+            self.assertEqual(timer.summary()[phase]["count"], 20)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config = SupplyChainConfig()
+            config.update({"profiling": {"phase_timers": True, "cprofile": True,
+                                         "tracemalloc": True, "output_dir": tmp}})
+            run_simulation(num_steps=5, predictor=RuleBasedPredictor(), config=config, verbose=False)
+            written = set(os.listdir(tmp))
+        self.assertEqual(written, {"phase_timings.json", "phase_timings.prom",
+                                   "run_profile.prof", "run_profile.txt"})
+
+class TestDataGen(unittest.TestCase):
+    def test_reorder_point_policy(self):
+        from datagen import ReorderPointPolicy
+
+        policy = ReorderPointPolicy()
+        state = {"supplier_inventory": 100, "manufacturer_capacity": 50, "manufacturer_inventory": 0,
+                 "distributor_inventory": 50, "retail_inventory": 0, "retailer_customer_demand": 40,
+                 "backorders": 0, "forecast_demand": 40}
+        self.assertEqual(policy.predict_action(state), "supply")
+        state.update({"manufacturer_inventory": 100, "distributor_inventory": 10})
+        self.assertEqual(policy.predict_action(state), "distribute")
+        state["distributor_inventory"] = 50
+        self.assertEqual(policy.predict_action(state), "manufacture")
+        state.update({"distributor_inventory": 40, "retail_inventory": 45, "backorders": 5000})
+        self.assertEqual(policy.predict_action(state), "manufacture")  # a long backlog counts one step
+
+    def test_rollouts_label_every_action_and_sell(self):
+        from collections import Counter
+        from datagen import LabellingPredictor, ReorderPointPolicy
+        from main import run_simulation
+
+        actions = Counter()
+        for seed in range(10):
+            labeller = LabellingPredictor(ReorderPointPolicy())
+            metrics = run_simulation(num_steps=50, predictor=labeller, verbose=False, seed=seed)
+            actions.update(action for _, action in labeller.rows)
+            self.assertGreater(metrics["fill_rate"], 40)
+        self.assertEqual(set(actions), {"supply", "manufacture", "distribute"})
+
+    def test_generate_streams_training_rows(self):
+        import os
+        import tempfile
+        import pandas as pd
+        from datagen import generate
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, f"decisions{i}.csv") for i in range(2)]
+            rows = [generate(6, 10, path, root_seed=3, max_workers=2, batch_size=2) for path in paths]
+            first, second = (pd.read_csv(path) for path in paths)
+
+        self.assertEqual(rows, [60, 60])
+        self.assertEqual(list(first.columns), ["state", "action"])
+        self.assertTrue(set(first["action"]) <= {"supply", "manufacture", "distribute"})
+        self.assertEqual(sorted(first["state"] + first["action"]), sorted(second["state"] + second["action"]))
+        features = StateEncoder().encode_text(first["state"])
+        self.assertEqual(features.shape, (60, len(STATE_FIELDS)))
+
+class TestSupplyChainState(unittest.TestCase):
+    def setUp(self):
+        from state import SupplyChainState
+
+        self.values = dict(zip(STATE_FIELDS, range(1, len(STATE_FIELDS) + 1)))
+        self.state = SupplyChainState.from_dict(self.values)
+
+    def test_behaves_like_the_state_dict(self):
+        from utils import validate_state
+
+        state = self.state
+        state["backorders"] += 5
+        self.assertEqual(state.backorders, 12)
+        self.assertEqual(dict(state), {**self.values, "backorders": 12})
+        self.assertEqual(state, {**self.values, "backorders": 12})
+        self.assertIsNone(state.get("unknown"))
+        with self.assertRaises(KeyError):
+            state["unknown"] = 1
+        self.assertFalse(hasattr(state, "__dict__"))
+        validate_state(state)
+
+    def test_snapshot_restore(self):
+        snapshot = self.state.snapshot()
+        self.state.retail_inventory = 99
+        self.state.restore(snapshot)
+        self.assertEqual(self.state.to_dict(), self.values)
+
+    def test_agents_and_predictors_accept_it(self):
+        from main import apply_action
+        from prediction_cache import PredictionCache
+
+        tools = (SupplyTool(), ManufactureTool(), DistributeTool())
+        as_dict = dict(self.values)
+        self.assertEqual(apply_action(self.state, "distribute", *tools),
+                         apply_action(as_dict, "distribute", *tools))
+        self.assertEqual(self.state.to_dict(), as_dict)
+        self.assertEqual(StateEncoder().encode(self.state).tolist(), StateEncoder().encode(as_dict).tolist())
+        cache = PredictionCache()
+        self.assertEqual(cache.key(self.state), cache.key(as_dict))
+
+    def test_batch_views_share_memory(self):
+        from vector_sim import VectorizedSimulation
+
+        sim = VectorizedSimulation(3)
+        batch = sim.state_batch()
+        batch[1]["retail_inventory"] = 7
+        self.assertEqual(sim.state[1, STATE_FIELDS.index("retail_inventory")], 7)
+        batch.column("backorders")[:] = 4
+        self.assertEqual(sim.states()[2]["backorders"], 4)
+        snapshot = batch.snapshot()
+        sim.state[:] = 0
+        batch.restore(snapshot)
+        self.assertEqual(batch.to_states()[1].retail_inventory, 7)
+
+class TestSupplyNetwork(unittest.TestCase):
+    def test_single_chain_follows_tool_semantics(self):
+        from network import SupplyNetwork
+
+        network = SupplyNetwork.layered(1, 1, 1, 1, inventory=[100, 0, 50, 0], lead_time=1)
+        moved = network.step(customer_demand=40, resupply=15)
+        # The store is empty, the DC ships its 50 and the supplier 50 raw materials
+        self.assertEqual(moved["sold"].tolist(), [0, 0, 0, 0])
+        self.assertEqual(network.backorders.tolist(), [0, 0, 0, 40])
+        self.assertEqual(moved["shipped"].tolist(), [50, 0, 50])
+        self.assertEqual(network.inventory.tolist(), [65, 0, 0, 0])
+
+        network.step(customer_demand=40, resupply=15)
+        self.assertEqual(network.inventory.tolist(), [80, 0, 0, 50])
+        self.assertEqual(network.raw.tolist(), [0, 50, 0, 0])
+
+        moved = network.step(customer_demand=30, resupply=15)
+        self.assertEqual(moved["sold"].tolist(), [0, 0, 0, 50])
+        self.assertEqual(moved["produced"].tolist(), [0, 50, 0, 0])
+
+    def test_sources_serve_lanes_in_order(self):
+        from network import SupplyNetwork, DC, STORE
+
+        # One DC with 30 units and three stores needing 20 each
+        network = SupplyNetwork([DC, STORE, STORE, STORE], [(0, 1), (0, 2), (0, 3)],
+                                inventory=[30, 0, 0, 0], target=20, lead_time=0)
+        moved = network.step(customer_demand=0, resupply=0)
+        self.assertEqual(moved["shipped"].tolist(), [20, 10, 0])
+        self.assertEqual(network.inventory.tolist(), [0, 20, 10, 0])
+
+    def test_units_are_conserved(self):
+        import numpy as np
+        from network import SupplyNetwork, SUPPLIER
+
+        network = SupplyNetwork.with_nodes(300, inventory=100, lead_time=2)
+        start = network.inventory.sum()
+        rng = np.random.default_rng(3)
+        resupplied = sold = 0
+        for _ in range(30):
+            resupply = rng.integers(10, 21, size=network.n_nodes)
+            moved = network.step(rng.integers(35, 46, size=network.n_nodes), resupply)
+            resupplied += resupply[network.kinds == SUPPLIER].sum()
+            sold += moved["sold"].sum()
+        held = network.inventory.sum() + network.raw.sum() + network.in_transit.sum()
+        self.assertEqual(held + sold, start + resupplied)
+        self.assertEqual(network.fulfilled_demand, sold)
+
+    def test_lanes_must_go_downstream(self):
+        from network import SupplyNetwork, SUPPLIER, STORE
+
+        with self.assertRaises(ValueError):
+            SupplyNetwork([SUPPLIER, STORE], [(0, 1)])
+
+class TestCheckpoint(unittest.TestCase):
+    def logging_config(self, path, **simulation):
+        from config import SupplyChainConfig
+
+        config = SupplyChainConfig()
+        config.update({"simulation": dict(simulation, lead_time=2, lead_time_jitter=1),
+                       "logging": {"sink": "jsonl", "path": path, "batch_size": 1}})
+        return config
+
+    def read_events(self, path):
+        import json
+
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def run_seeded(self, config, num_steps, seed=7):
+        from main import run_simulation
+
+        return run_simulation(num_steps=num_steps, predictor=RuleBasedPredictor(), config=config, seed=seed)
+
+    def test_resume_is_bit_exact(self):
+        import os
+        import tempfile
+        from checkpoint import load_checkpoint
+        from main import run_simulation
+
+        with tempfile.TemporaryDirectory() as tmp:
+            straight_path = os.path.join(tmp, "straight.jsonl")
+            self.run_seeded(self.logging_config(straight_path), 20)
+            checkpoint_path = os.path.join(tmp, "run.npz")
+            self.run_seeded(self.logging_config(os.path.join(tmp, "first.jsonl"), checkpoint_every=5,
+                                                checkpoint_path=checkpoint_path), 10)
+            self.assertEqual(load_checkpoint(checkpoint_path)["step"].item(), 10)
+
+            resumed_path = os.path.join(tmp, "resumed.jsonl")
+            run_simulation(num_steps=20, predictor=RuleBasedPredictor(), config=self.logging_config(resumed_path),
+                           resume_from=checkpoint_path, seed=12345)  # the checkpoint's streams must win
+            straight = self.read_events(straight_path)
+            resumed = self.read_events(resumed_path)
+
+        self.assertEqual([event["step"] for event in resumed], list(range(10, 20)))
+        self.assertEqual(resumed, straight[10:])
+
+    def test_accumulators_round_trip(self):
+        from events import EventScheduler
+        from utils import P2Quantile
+
+        state = {"supplier_inventory": 10, "manufacturer_inventory": 3, "distributor_inventory": 5,
+                 "retail_inventory": 1, "backorders": 2}
+        metrics = PerformanceMetrics(window=4)
+        costs = CostManager({"raw_material": 10, "manufacturing": 15, "distribution": 5,
+                             "holding": 2, "backorder": 20}, window=4)
+        scheduler = EventScheduler()
+        for level in range(10):
+            metrics.update_inventory({"retail": level})
+            metrics.update_fill_rate(40, 35 + level % 5)
+            costs.calculate_costs(state, level, 3, 2)
+            scheduler.schedule(level % 3, "raw_materials", level)
+
+        for obj, fresh in ((metrics, PerformanceMetrics(window=4)),
+                           (costs, CostManager(dict(costs.base_costs), window=4)),
+                           (scheduler, EventScheduler())):
+            fresh.setstate(obj.getstate())
+            expected = obj.getstate()
+            self.assertEqual({key: value.tolist() for key, value in fresh.getstate().items()},
+                             {key: value.tolist() for key, value in expected.items()})
+        self.assertEqual(list(scheduler.advance(3)), list(fresh.advance(3)))
+
+        estimator = P2Quantile(0.5)
+        for x in (3, 1, 4):
+            estimator.add(x)
+        fresh = P2Quantile(0.5)
+        fresh.setstate(estimator.getstate())
+        self.assertEqual(fresh.value(), estimator.value())
+
+    def test_fork_branches(self):
+        import os
+        import tempfile
+        from checkpoint import fork, load_checkpoint
+        from vector_sim import VectorizedSimulation
+
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint_path = os.path.join(tmp, "warm.npz")
+            self.run_seeded(self.logging_config(os.path.join(tmp, "warm.jsonl"), checkpoint_every=6,
+                                                checkpoint_path=checkpoint_path), 6)
+            branches = [{}, {}, {"overrides": {"costs": {"holding": 5}}, "seed": 3}]
+            results = fork(checkpoint_path, branches, num_steps=12, max_workers=2,
+                           predictor_factory=RuleBasedPredictor)
+            data = load_checkpoint(checkpoint_path)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], results[1])  # no seed: the same random stream
+
+        sim = VectorizedSimulation.from_checkpoint(data, 4)
+        self.assertEqual((sim.steps, sim.lead_time), (6, 2))
+        expected_state = [data["state." + field].item() for field in STATE_FIELDS]
+        self.assertEqual(sim.state.tolist(), [expected_state] * 4)
+        self.assertEqual(sim.in_transit.sum(axis=0).tolist(), [data["events.quantity"].sum()] * 4)
+        sim.run(lambda state: ["supply"] * len(state), 3, seed=0)
+        self.assertEqual(sim.steps, 9)
+
+    def test_vectorized_fork_keeps_forecast_window(self):
+        import os
+        import tempfile
+        from checkpoint import load_checkpoint
+        from vector_sim import VectorizedSimulation
+
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint_path = os.path.join(tmp, "warm.npz")
+            config = self.logging_config(os.path.join(tmp, "warm.jsonl"), checkpoint_every=6,
+                                         checkpoint_path=checkpoint_path)
+            config.update({"demand": {"forecast_window": 3}})
+            self.run_seeded(config, 6)
+            data = load_checkpoint(checkpoint_path)
+        sim = VectorizedSimulation.from_checkpoint(data, 2)
+        history = data["forecast.history"].tolist()
+        self.assertEqual(len(history), 3)
+        sim.demand_forecast.update([50, 50])
+        self.assertEqual(sim.demand_forecast.demand_history.T.tolist(), [history[1:] + [50]] * 2)
+
+class TestRandomStreams(unittest.TestCase):
+    def test_streams_are_reproducible_and_independent(self):
+        from streams import RandomStreams
+
+        a, b = RandomStreams(5), RandomStreams(5)
+        demand = [a.integers("demand", -5, 5) for _ in range(300)]
+        for _ in range(50):
+            b.integers("lead_time", 0, 3)  # extra draws elsewhere do not shift demand
+        self.assertEqual([b.integers("demand", -5, 5) for _ in range(300)], demand)
+        self.assertTrue(all(-5 <= value <= 5 for value in demand))
+        self.assertNotEqual([a.integers("resupply", -5, 5) for _ in range(300)], demand)
+
+        replicas = RandomStreams(5).spawn(3)
+        draws = [stream.generator("demand").integers(0, 1000, size=5).tolist() for stream in replicas]
+        self.assertEqual(draws, [stream.generator("demand").integers(0, 1000, size=5).tolist()
+                                 for stream in RandomStreams(5).spawn(3)])
+        self.assertEqual(len({tuple(d) for d in draws}), 3)
+
+    def test_replica_draws_do_not_depend_on_replica_count(self):
+        import numpy as np
+        from network import SupplyNetwork
+        from streams import ReplicaStreams
+        from vector_sim import VectorizedSimulation
+
+        few, many = ReplicaStreams(5, 2), ReplicaStreams(5, 6)
+        self.assertEqual(few.integers("demand", -5, 5, 40).tolist(), many.integers("demand", -5, 5, 40)[:2].tolist())
+
+        def policy(state):
+            return np.where(state[:, 2] < 20, 0, 1)
+
+        small, large = VectorizedSimulation(2), VectorizedSimulation(5)
+        small.run(policy, 30, seed=3, block_size=7)
+        large.run(policy, 30, seed=3)
+        self.assertEqual(small.state.tolist(), large.state[:2].tolist())
+
+        a, b = SupplyNetwork.with_nodes(20), SupplyNetwork.with_nodes(20)
+        self.assertEqual(a.run(12, seed=1, block_size=5), b.run(12, seed=1))
+
+    def test_state_round_trip_mid_block(self):
+        from streams import RandomStreams
+
+        streams = RandomStreams(9, block_size=8)
+        for _ in range(5):
+            streams.integers("resupply", 10, 20)
+        resumed = RandomStreams(0, block_size=8)
+        resumed.setstate(streams.getstate())
+        self.assertEqual([resumed.integers("resupply", 10, 20) for _ in range(20)],
+                         [streams.integers("resupply", 10, 20) for _ in range(20)])
+
+    def test_lead_time_noise_leaves_demand_unchanged(self):
+        from config import SupplyChainConfig
+        from event_log import NullSink
+        from main import run_simulation
+
+        class MemorySink(NullSink):
+            def __init__(self):
+                self.events = []
+
+            def record(self, event):
+                self.events.append(event)
+
+        demands = []
+        for jitter in (0, 2):
+            config = SupplyChainConfig()
+            config.update({"simulation": {"lead_time_jitter": jitter}})
+            sink = MemorySink()
+            run_simulation(num_steps=15, predictor=RuleBasedPredictor(), config=config, sink=sink, seed=3)
+            demands.append([event["retailer_customer_demand"] for event in sink.events])
+        self.assertEqual(demands[0], demands[1])
+
+class TestActionDispatcher(unittest.TestCase):
+    def test_forward_batch_matches_forward(self):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        a, b, c = rng.integers(0, 100, size=(3, 50))
+        cases = [(SupplyTool(), (a, b)), (ManufactureTool(), (a, b, c)),
+                 (DistributeTool(), (a, b)), (RetailTool(), (a, b))]
+        for tool, args in cases:
+            expected = [tool.forward(*row) for row in zip(*(arg.tolist() for arg in args))]
+            self.assertEqual(tool.forward_batch(*args).tolist(), expected)
+
+    def test_registry_and_fallback(self):
+        from dispatch import ActionDispatcher
+        from state import SupplyChainState
+        from vector_sim import DEFAULT_STATE
+
+        dispatch = ActionDispatcher()
+        state = SupplyChainState.from_dict(DEFAULT_STATE)
+        self.assertEqual(dispatch(state, "unknown"), {"supply": 40, "production": 0, "distribution": 0})
+        self.assertEqual(state["supplier_inventory"], 60)
+
+        def sell(state, tools):
+            sold = tools.retail.forward(state["retailer_customer_demand"], state["retail_inventory"])
+            state["retail_inventory"] -= sold
+            return {"supply": 0, "production": 0, "distribution": 0}
+
+        dispatch.register("sell", sell)
+        state["retail_inventory"] = 25
+        dispatch(state, "sell")
+        self.assertEqual(state["retail_inventory"], 0)
+
+    def test_run_batch_matches_handlers(self):
+        import numpy as np
+        from dispatch import ActionDispatcher
+        from state import StateBatch
+        from vector_sim import ACTIONS
+
+        rng = np.random.default_rng(1)
+        batch = StateBatch(rng.integers(0, 80, size=(200, len(STATE_FIELDS))))
+        codes = rng.integers(0, len(ACTIONS) + 1, size=200)  # includes an unknown code
+        states = batch.to_states()
+        dispatch = ActionDispatcher()
+        expected = [dispatch(state, ACTIONS[code] if code < len(ACTIONS) else "unknown")
+                    for state, code in zip(states, codes.tolist())]
+
+        moved = dispatch.run_batch(batch.array, codes)
+        self.assertEqual(batch.array.tolist(), [list(state.snapshot()) for state in states])
+        for key in ("supply", "production", "distribution"):
+            self.assertEqual(moved[key].tolist(), [m[key] for m in expected])
+
+    def test_apply_action_reuses_its_dispatcher(self):
+        from unittest import mock
+        import main
+        from vector_sim import DEFAULT_STATE
+
+        tools = (SupplyTool(), ManufactureTool(), DistributeTool())
+        main.apply_action(dict(DEFAULT_STATE), "supply", *tools)
+        with mock.patch.object(main, "RetailTool", side_effect=AssertionError("built a RetailTool")):
+            for action in ("supply", "manufacture", "distribute"):
+                main.apply_action(dict(DEFAULT_STATE), action, *tools)
+
+    def test_run_batch_uses_registered_batch_handlers(self):
+        import numpy as np
+        from dispatch import ActionDispatcher
+        from state import FIELD_INDEX, StateBatch
+        from vector_sim import DEFAULT_STATE
+
+        def hold(state, tools):
+            return {"supply": 0, "production": 0, "distribution": 0}
+
+        def hold_batch(states, mask, tools, **params):
+            return {}
+
+        batch = StateBatch(np.array([[DEFAULT_STATE[field] for field in STATE_FIELDS]] * 3))
+        before = batch.array.copy()
+        dispatch = ActionDispatcher()
+        dispatch.register("hold", hold)
+        with self.assertRaisesRegex(ValueError, "hold"):
+            dispatch.run_batch(batch.array, [0, 1, 1], ("supply", "hold"))
+
+        dispatch.register("hold", hold, hold_batch)
+        moved = dispatch.run_batch(batch.array, [0, 1, 1], ("supply", "hold"))
+        self.assertEqual(moved["supply"].tolist(), [40, 0, 0])
+        self.assertEqual(batch.array[1:].tolist(), before[1:].tolist())
+        self.assertEqual(batch.array[0, FIELD_INDEX["supplier_inventory"]], 60)
+
+class TestPolicyEval(unittest.TestCase):
+    def test_traces_are_shared_and_replayed(self):
+        import os
+        import tempfile
+        import numpy as np
+        from config import SupplyChainConfig
+        from event_log import NullSink
+        from main import run_simulation
+        from policy_eval import evaluate, generate_traces, METRICS
+
+        class MemorySink(NullSink):
+            def __init__(self):
+                self.events = []
+
+            def record(self, event):
+                self.events.append(event)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces.npy")
+            traces = generate_traces(path, n_replicas=6, num_steps=12, root_seed=4)
+            self.assertEqual(traces.shape, (6, 3, 12))
+            self.assertTrue(np.array_equal(traces, generate_traces(os.path.join(tmp, "again.npy"), 6, 12,
+                                                                   root_seed=4)))
+            fewer = generate_traces(os.path.join(tmp, "fewer.npy"), 3, 12, root_seed=4)
+            self.assertTrue(np.array_equal(fewer, traces[:3]))  # per-replica streams
+            self.assertTrue(((traces[:, 0] >= 10) & (traces[:, 0] <= 20)).all())
+
+            sink = MemorySink()
+            run_simulation(num_steps=12, predictor=RuleBasedPredictor(), sink=sink, trace=traces[2])
+            base = SupplyChainConfig().demand["base"]
+            self.assertEqual([event["retailer_customer_demand"] for event in sink.events],
+                             np.maximum(base + traces[2, 1], 0).tolist())
+
+            results = evaluate(path, ["reorder_point", rule_based_policy], max_workers=2, chunk_size=4)
+        self.assertEqual(set(results), {"reorder_point", "rule_based_policy"})
+        self.assertEqual(results["reorder_point"].shape, (6, len(METRICS)))
+
+    def test_summarize_ranks_with_paired_intervals(self):
+        import numpy as np
+        from policy_eval import METRICS, summarize
+
+        rng = np.random.default_rng(0)
+        shared = rng.normal(100, 20, size=50)  # common random numbers: the same noise for both
+        costs = {"cheap": shared, "dear": shared + 5 + rng.normal(0, 0.1, size=50)}
+        results = {}
+        for name, total in costs.items():
+            values = np.zeros((50, len(METRICS)))
+            values[:, METRICS.index("total_costs")] = total
+            results[name] = values
+
+        rows = summarize(results, rank_by="total_costs")
+        self.assertEqual([row["policy"] for row in rows], ["cheap", "dear"])
+        mean, half = rows[1]["total_costs"]
+        diff, diff_half = rows[1]["vs_best"]
+        self.assertAlmostEqual(diff, 5, delta=0.1)
+        self.assertLess(diff_half, 0.1)
+        self.assertGreater(half, diff_half * 10)
+        self.assertEqual(rows[0]["vs_best"][0], 0)
+
+    def test_traces_must_match_the_run(self):
+        import os
+        import tempfile
+        from contextlib import redirect_stdout
+        from io import StringIO
+        from main import run_simulation
+        from policy_eval import evaluate, generate_traces, load_trace_metadata, main
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces.npy")
+            traces = generate_traces(path, n_replicas=2, num_steps=5, root_seed=1)
+            for overrides in ({"simulation": {"lead_time_jitter": 2}}, {"demand": {"min_variation": -1}}):
+                with self.assertRaises(ValueError):
+                    evaluate(path, [rule_based_policy], overrides=overrides)
+            with self.assertRaises(ValueError):  # resupply values drawn in [10, 20] replayed for [30, 40]
+                run_simulation(num_steps=5, predictor=RuleBasedPredictor(), verbose=False, trace=traces[0],
+                               config=self.config_with(resupply={"min_amount": 30, "max_amount": 40}))
+
+            # The CLI redraws traces for another seed or shape instead of reusing the file
+            for replicas, steps, seed in ((2, 5, 1), (3, 4, 1), (3, 4, 2)):
+                with redirect_stdout(StringIO()):
+                    main(["--policies", "reorder_point", "--traces", path, "--replicas", str(replicas),
+                          "--steps", str(steps), "--seed", str(seed), "--workers", "1"])
+                metadata = load_trace_metadata(path)
+                self.assertEqual((metadata["n_replicas"], metadata["num_steps"], metadata["root_seed"]),
+                                 (replicas, steps, seed))
+
+    def config_with(self, **sections):
+        from config import SupplyChainConfig
+
+        config = SupplyChainConfig()
+        config.update(sections)
+        return config
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""Stand-ins shared by the test modules."""
+
+
+class RuleBasedPredictor:
+    """
+    Picklable stand-in for the AutoML predictor.
+
+    Supplies when the manufacturer runs low, restocks the distributor and
+    retail when either falls below forecast demand and the manufacturer
+    can ship that much, and manufactures otherwise, so the chain sells.
+    """
+
+    def predict_action(self, state):
+        if state["manufacturer_inventory"] < 20:
+            return "supply"
+        low = min(state["distributor_inventory"], state["retail_inventory"]) < state["forecast_demand"]
+        if low and state["manufacturer_inventory"] >= state["forecast_demand"]:
+            return "distribute"
+        return "manufacture"
+
+    def predict_actions(self, states):
+        return [self.predict_action(state) for state in states]
+
+
+def rule_based_policy(config):
+    """Picklable policy factory for policy_eval."""
+    return RuleBasedPredictor()
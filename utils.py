@@ -1,5 +1,40 @@
 from collections import deque
 
+import numpy as np
+
+# Fixed field order of the simulation state, shared by the feature encoder
+# and the array-backed simulation code.
+STATE_FIELDS = (
+    "supplier_inventory",
+    "manufacturer_capacity",
+    "manufacturer_inventory",
+    "distributor_inventory",
+    "retail_inventory",
+    "retailer_customer_demand",
+    "backorders",
+    "forecast_demand",
+)
+
+# Cost categories, in the column order of cost tables and CostLedger
+COST_TYPES = ("raw_material", "manufacturing", "distribution", "holding", "backorder")
+
+def _scalars_state(obj, names):
+    """Checkpoint {name: 0-d array} of plain int/float attributes."""
+    return {name: np.asarray(getattr(obj, name)) for name in names}
+
+def _set_scalars(obj, data, names):
+    for name in names:
+        setattr(obj, name, data[name].item())
+
+def prefixed(prefix, data):
+    """Nest a getstate() dict under `prefix`: {"prefix.key": value}."""
+    return {f"{prefix}.{key}": value for key, value in data.items()}
+
+def unprefixed(prefix, data):
+    """The getstate() dict nested under `prefix` by prefixed()."""
+    start = len(prefix) + 1
+    return {key[start:]: value for key, value in data.items() if key.startswith(prefix + ".")}
+
 class DemandForecast:
     def __init__(self, window_size=10, alpha=0.3, beta=0.1):
         self.demand_history = deque(maxlen=window_size)
@@ -26,13 +61,226 @@ class DemandForecast:
         forecast = self.level + steps_ahead * self.trend
         return max(int(forecast), 0)
 
+    def getstate(self):
+        """Checkpoint state as a flat dict of NumPy arrays (see checkpoint.py)."""
+        data = {"history": np.asarray(list(self.demand_history))}
+        if self.level is not None:
+            data.update(_scalars_state(self, ("level", "trend")))
+        return data
+
+    def setstate(self, data):
+        self.demand_history.clear()
+        self.demand_history.extend(data["history"].tolist())
+        if "level" in data:
+            _set_scalars(self, data, ("level", "trend"))
+        else:
+            self.level = self.trend = None
+
+class BatchDemandForecast:
+    """
+    DemandForecast for many demand series (e.g. SKU x store) at once.
+
+    Level, trend and the last `window_size` demands of every series are
+    NumPy arrays, and update()/forecast() handle all series in one call.
+    For each series the results are exactly those of a DemandForecast fed
+    the same demands.
+    """
+
+    def __init__(self, n_series, window_size=10, alpha=0.3, beta=0.1):
+        self.alpha = alpha
+        self.beta = beta
+        self.level = np.zeros(n_series)
+        self.trend = np.zeros(n_series)
+        self.updates = 0
+        self._history = np.zeros((window_size, n_series))
+        self._next = 0
+
+    @classmethod
+    def from_state(cls, data, n_series, window_size=10, alpha=0.3, beta=0.1):
+        """Every series starting from one DemandForecast.getstate() (e.g. from a checkpoint)."""
+        forecast = cls(n_series, window_size=window_size, alpha=alpha, beta=beta)
+        if "level" in data:
+            history = data["history"][-window_size:]
+            forecast._history[:len(history)] = history[:, None]
+            forecast._next = len(history) % window_size
+            forecast.updates = len(history)
+            forecast.level = np.full(n_series, data["level"].item(), dtype=np.float64)
+            forecast.trend = np.full(n_series, data["trend"].item(), dtype=np.float64)
+        return forecast
+
+    @property
+    def n_series(self):
+        return len(self.level)
+
+    @property
+    def demand_history(self):
+        """(min(updates, window_size), n_series) array of recent demands, oldest first."""
+        window = len(self._history)
+        if self.updates < window:
+            return self._history[:self.updates].copy()
+        return np.concatenate((self._history[self._next:], self._history[:self._next]))
+
+    def update(self, actual_demand):
+        """Add one demand observation per series (an array of n_series values or a scalar)."""
+        actual_demand = np.broadcast_to(np.asarray(actual_demand, dtype=np.float64), self.level.shape)
+        self._history[self._next] = actual_demand
+        self._next = (self._next + 1) % len(self._history)
+
+        if self.updates == 0:
+            self.level = actual_demand.copy()
+            self.trend = np.zeros(self.n_series)
+        else:
+            last_level = self.level
+            self.level = self.alpha * actual_demand + (1 - self.alpha) * (self.level + self.trend)
+            self.trend = self.beta * (self.level - last_level) + (1 - self.beta) * self.trend
+        self.updates += 1
+
+    def forecast(self, steps_ahead=1):
+        """
+        Forecast every series `steps_ahead` steps out, as int64. A sequence
+        of horizons gives one row per horizon: shape (len(steps_ahead), n_series).
+        """
+        steps_ahead = np.asarray(steps_ahead)
+        if self.updates == 0:
+            return np.full(steps_ahead.shape + self.level.shape, 30, dtype=np.int64)
+        if steps_ahead.ndim:
+            steps_ahead = steps_ahead[:, None]
+        forecast = np.trunc(self.level + steps_ahead * self.trend)
+        return np.maximum(forecast, 0).astype(np.int64)
+
+class RingBuffer:
+    """Fixed-size float array holding the most recent `capacity` values."""
+
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % len(self._data)
+        self._count = min(self._count + 1, len(self._data))
+
+    def __len__(self):
+        return self._count
+
+    def values(self):
+        """Buffered values, oldest first."""
+        if self._count < len(self._data):
+            return self._data[:self._count].copy()
+        return np.concatenate((self._data[self._next:], self._data[:self._next]))
+
+    def getstate(self):
+        return {"data": self._data.copy(), "position": np.array([self._next, self._count])}
+
+    def setstate(self, data):
+        self._data = data["data"].copy()
+        self._next, self._count = data["position"].tolist()
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P-square algorithm
+    (Jain & Chlamtac, 1985): five markers, O(1) memory and update time.
+    """
+
+    def __init__(self, q):
+        self.q = q
+        self._initial = []
+        self._heights = None
+
+    def add(self, x):
+        if self._heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                q = self.q
+                self._heights = sorted(self._initial)
+                self._positions = [1, 2, 3, 4, 5]
+                self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+                self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+            return
+
+        h, n = self._heights, self._positions
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if h[i] <= x < h[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+                )
+                if h[i - 1] < parabolic < h[i + 1]:
+                    h[i] = parabolic
+                else:
+                    h[i] += d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def getstate(self):
+        if self._heights is None:
+            return {"initial": np.asarray(self._initial, dtype=np.float64)}
+        return {
+            "heights": np.asarray(self._heights, dtype=np.float64),
+            "positions": np.asarray(self._positions, dtype=np.int64),
+            "desired": np.asarray(self._desired, dtype=np.float64),
+        }
+
+    def setstate(self, data):
+        if "heights" in data:
+            self._initial = []
+            self._heights = data["heights"].tolist()
+            self._positions = data["positions"].tolist()
+            self._desired = data["desired"].tolist()
+            q = self.q
+            self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+        else:
+            self._initial = data["initial"].tolist()
+            self._heights = None
+
+    def value(self):
+        if self._heights is None:
+            return float(np.quantile(self._initial, self.q)) if self._initial else 0.0
+        return self._heights[2]
+
+def _quantile_summary(name, estimators):
+    return {f"{name}_p{round(q * 100)}": round(estimator.value(), 2) for q, estimator in estimators.items()}
+
 class PerformanceMetrics:
-    def __init__(self):
+    """
+    Running performance metrics for a simulation.
+
+    Everything is kept as running sums, so updates and calculate_metrics()
+    are O(1) however long the run. `inventory_history` holds only the last
+    `window` inventory levels (None keeps none), and quantiles() gives
+    streaming estimates of the inventory level distribution.
+    """
+
+    def __init__(self, window=1000, quantiles=(0.5, 0.95)):
         self.total_demand = 0
         self.fulfilled_demand = 0
         self.backorders = 0
-        self.inventory_history = []
+        self.inventory_count = 0
+        self.inventory_sum = 0
         self.total_costs = 0
+        self.recent_inventory = RingBuffer(window) if window else None
+        self.inventory_quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    @property
+    def inventory_history(self):
+        """The most recent total inventory levels, oldest first."""
+        return self.recent_inventory.values().tolist() if self.recent_inventory is not None else []
         
     def update_fill_rate(self, demand, fulfilled):
         self.total_demand += demand
@@ -41,14 +289,19 @@ class PerformanceMetrics:
         
     def update_inventory(self, inventory_levels):
         total_inventory = sum(inventory_levels.values())
-        self.inventory_history.append(total_inventory)
+        self.inventory_count += 1
+        self.inventory_sum += total_inventory
+        if self.recent_inventory is not None:
+            self.recent_inventory.append(total_inventory)
+        for estimator in self.inventory_quantiles.values():
+            estimator.add(total_inventory)
         
     def update_costs(self, new_costs):
         self.total_costs += new_costs
         
     def calculate_metrics(self):
         fill_rate = (self.fulfilled_demand / self.total_demand * 100) if self.total_demand > 0 else 0
-        avg_inventory = sum(self.inventory_history) / len(self.inventory_history) if self.inventory_history else 1
+        avg_inventory = self.inventory_sum / self.inventory_count if self.inventory_count else 1
         inventory_turnover = self.fulfilled_demand / avg_inventory if avg_inventory > 0 else 0
         
         return {
@@ -59,23 +312,207 @@ class PerformanceMetrics:
             "average_inventory": round(avg_inventory, 2)
         }
 
+    def quantiles(self):
+        """Streaming quantile estimates of the total inventory level, e.g. {"inventory_p95": ...}."""
+        return _quantile_summary("inventory", self.inventory_quantiles)
+
+    _SCALARS = ("total_demand", "fulfilled_demand", "backorders", "inventory_count",
+                "inventory_sum", "total_costs")
+
+    def getstate(self):
+        data = _scalars_state(self, self._SCALARS)
+        if self.recent_inventory is not None:
+            data.update(prefixed("recent", self.recent_inventory.getstate()))
+        for i, estimator in enumerate(self.inventory_quantiles.values()):
+            data.update(prefixed(f"quantile{i}", estimator.getstate()))
+        return data
+
+    def setstate(self, data):
+        _set_scalars(self, data, self._SCALARS)
+        if self.recent_inventory is not None:
+            self.recent_inventory.setstate(unprefixed("recent", data))
+        for i, estimator in enumerate(self.inventory_quantiles.values()):
+            estimator.setstate(unprefixed(f"quantile{i}", data))
+
+class CostLedger:
+    """
+    Per-step, per-category costs of one or more replicas.
+
+    `entries` is preallocated as a (num_steps, n_replicas, len(COST_TYPES))
+    float64 array and record() fills one step's row in place, so recording
+    allocates nothing. Rollups are sums over slices of that array: totals()
+    over a window of steps, rollup() over consecutive fixed-size windows and
+    cumulative() as running totals.
+
+    `costs` is the unit cost of each category (a dict, or an array broadcast
+    to one row per replica; default 1). A CostManager or VectorizedSimulation
+    recording into the ledger sets its own with bind_costs(), which raises
+    ValueError if the ledger was built with different ones.
+    """
+
+    def __init__(self, num_steps, n_replicas=1, costs=None):
+        self.entries = np.zeros((num_steps, n_replicas, len(COST_TYPES)))
+        self.costs = self._cost_rows(np.ones(len(COST_TYPES)) if costs is None else costs)
+        self._costs_given = costs is not None
+        self.steps = 0
+
+    def _cost_rows(self, costs):
+        if isinstance(costs, dict):
+            costs = [costs[cost_type] for cost_type in COST_TYPES]
+        return np.array(np.broadcast_to(np.asarray(costs, dtype=np.float64),
+                                         (self.n_replicas, len(COST_TYPES))))
+
+    def bind_costs(self, costs):
+        """Record at the unit `costs` of the ledger's owner from now on."""
+        costs = self._cost_rows(costs)
+        if self._costs_given and not np.array_equal(costs, self.costs):
+            raise ValueError("CostLedger was built with costs that differ from its owner's; "
+                             "leave out the ledger's costs or pass the same ones")
+        self.costs[:] = costs
+
+    @property
+    def num_steps(self):
+        return self.entries.shape[0]
+
+    @property
+    def n_replicas(self):
+        return self.entries.shape[1]
+
+    def record(self, step, supply, production, distribution, inventory, backorders):
+        """
+        Cost the quantities of step `step` (scalars or one value per replica)
+        into its row and return the (n_replicas, len(COST_TYPES)) row.
+        """
+        row = self.entries[step]
+        row[:, 0] = supply
+        row[:, 1] = production
+        row[:, 2] = distribution
+        row[:, 3] = inventory
+        row[:, 4] = backorders
+        np.multiply(row, self.costs, out=row)
+        if step >= self.steps:
+            self.steps = step + 1
+        return row
+
+    def _columns(self, categories):
+        if categories is None:
+            return slice(None)
+        if isinstance(categories, str):
+            return COST_TYPES.index(categories)
+        return [COST_TYPES.index(category) for category in categories]
+
+    def totals(self, start=0, stop=None, categories=None):
+        """
+        Costs of steps [start, stop) summed per replica and category, as an
+        (n_replicas, n_categories) array, or (n_replicas,) for one category name.
+        """
+        stop = self.steps if stop is None else stop
+        return self.entries[start:stop, :, self._columns(categories)].sum(axis=0)
+
+    def daily(self, categories=None):
+        """(steps, n_replicas) cost of each recorded step over `categories` (default all)."""
+        entries = self.entries[:self.steps, :, self._columns(categories)]
+        return entries if entries.ndim == 2 else entries.sum(axis=2)
+
+    def rollup(self, window, categories=None):
+        """
+        Costs summed over consecutive windows of `window` steps, as an
+        (n_windows, n_replicas, n_categories) array; the last window may be partial.
+        """
+        entries = self.entries[:self.steps]
+        n_windows = -(-self.steps // window)
+        padded = np.zeros((n_windows * window,) + entries.shape[1:])
+        padded[:self.steps] = entries
+        sums = padded.reshape(n_windows, window, *entries.shape[1:]).sum(axis=1)
+        return sums[..., self._columns(categories)]
+
+    def cumulative(self, categories=None):
+        """(steps, n_replicas) running total cost over `categories` (default all)."""
+        return np.cumsum(self.daily(categories), axis=0)
+
+    def getstate(self):
+        return {"entries": self.entries[:self.steps].copy(), "costs": self.costs.copy()}
+
+    def setstate(self, data):
+        entries = data["entries"]
+        self.entries[:len(entries)] = entries
+        self.entries[len(entries):] = 0
+        self.costs[:] = data["costs"]
+        self.steps = len(entries)
+
 class CostManager:
-    def __init__(self, base_costs):
+    """
+    Daily cost calculation with running totals.
+
+    Like PerformanceMetrics, only the last `window` daily costs are kept
+    (`cost_history`); `total_costs`, `days` and quantiles() cover the whole run.
+    With a CostLedger, each day's costs are also recorded per category in
+    the ledger's row `days`, at base_costs. calculate_costs() returns the
+    day's cost as a float either way.
+    """
+
+    def __init__(self, base_costs, window=1000, quantiles=(0.5, 0.95), ledger=None):
         self.base_costs = base_costs
-        self.cost_history = []
+        self.total_costs = 0.0
+        self.days = 0
+        self.recent_costs = RingBuffer(window) if window else None
+        self.cost_quantiles = {q: P2Quantile(q) for q in quantiles}
+        self.ledger = ledger
+        if ledger is not None:
+            ledger.bind_costs(base_costs)
+
+    @property
+    def cost_history(self):
+        """The most recent daily costs, oldest first."""
+        return self.recent_costs.values().tolist() if self.recent_costs is not None else []
     
     def calculate_costs(self, state, supply, production, distribution):
-        daily_costs = (
-            supply * self.base_costs["raw_material"] +
-            production * self.base_costs["manufacturing"] +
-            distribution * self.base_costs["distribution"] +
-            (state["supplier_inventory"] + state["manufacturer_inventory"] + 
-             state["distributor_inventory"] + state["retail_inventory"]) * self.base_costs["holding"] +
-            state["backorders"] * self.base_costs["backorder"]
-        )
-        self.cost_history.append(daily_costs)
+        inventory = (state["supplier_inventory"] + state["manufacturer_inventory"] +
+                     state["distributor_inventory"] + state["retail_inventory"])
+        if self.ledger is not None:
+            row = self.ledger.record(self.days, supply, production, distribution, inventory, state["backorders"])
+            daily_costs = float(row.sum())
+        else:
+            daily_costs = float(
+                supply * self.base_costs["raw_material"] +
+                production * self.base_costs["manufacturing"] +
+                distribution * self.base_costs["distribution"] +
+                inventory * self.base_costs["holding"] +
+                state["backorders"] * self.base_costs["backorder"]
+            )
+        self.total_costs += daily_costs
+        self.days += 1
+        if self.recent_costs is not None:
+            self.recent_costs.append(daily_costs)
+        for estimator in self.cost_quantiles.values():
+            estimator.add(daily_costs)
         return daily_costs
 
+    def quantiles(self):
+        """Streaming quantile estimates of the daily cost, e.g. {"daily_cost_p50": ...}."""
+        return _quantile_summary("daily_cost", self.cost_quantiles)
+
+    def getstate(self):
+        data = _scalars_state(self, ("total_costs", "days"))
+        if self.recent_costs is not None:
+            data.update(prefixed("recent", self.recent_costs.getstate()))
+        if self.ledger is not None:
+            data.update(prefixed("ledger", self.ledger.getstate()))
+        for i, estimator in enumerate(self.cost_quantiles.values()):
+            data.update(prefixed(f"quantile{i}", estimator.getstate()))
+        return data
+
+    def setstate(self, data):
+        _set_scalars(self, data, ("total_costs", "days"))
+        if self.recent_costs is not None:
+            self.recent_costs.setstate(unprefixed("recent", data))
+        if self.ledger is not None:
+            if "ledger.entries" not in data:
+                raise ValueError("The saved costs have no ledger to restore into this CostManager's")
+            self.ledger.setstate(unprefixed("ledger", data))
+        for i, estimator in enumerate(self.cost_quantiles.values()):
+            estimator.setstate(unprefixed(f"quantile{i}", data))
+
 def print_state_changes(state, step, action, changes):
     print(f"\n--- Step {step + 1}: {action} ---")
     for key, value in changes.items():
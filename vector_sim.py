@@ -0,0 +1,246 @@
+import numpy as np
+
+from checkpoint import checkpoint_config, part
+from dispatch import ActionDispatcher, fulfil_demand_batch
+from state import StateBatch
+from streams import ReplicaStreams
+from utils import COST_TYPES, STATE_FIELDS, BatchDemandForecast
+
+# Column of each state field in the (n_replicas, n_fields) state array
+(SUPPLIER_INVENTORY, MANUFACTURER_CAPACITY, MANUFACTURER_INVENTORY,
+ DISTRIBUTOR_INVENTORY, RETAIL_INVENTORY, CUSTOMER_DEMAND, BACKORDERS,
+ FORECAST_DEMAND) = range(len(STATE_FIELDS))
+
+# Action codes; anything else is treated like the default supply action
+ACTIONS = ("supply", "manufacture", "distribute")
+SUPPLY, MANUFACTURE, DISTRIBUTE = range(len(ACTIONS))
+
+DEFAULT_STATE = {
+    "supplier_inventory": 100,
+    "manufacturer_capacity": 50,
+    "manufacturer_inventory": 0,
+    "distributor_inventory": 50,
+    "retail_inventory": 0,
+    "retailer_customer_demand": 40,
+    "backorders": 0,
+    "forecast_demand": 40,
+}
+
+DEFAULT_COSTS = {
+    "raw_material": 10,
+    "manufacturing": 15,
+    "distribution": 5,
+    "holding": 2,
+    "backorder": 20,
+}
+
+
+def encode_actions(actions):
+    """Map action names (or codes) to action codes; unknown names become SUPPLY."""
+    actions = np.asarray(actions)
+    if actions.dtype.kind in "iu":
+        return actions
+    codes = np.full(actions.shape, SUPPLY, dtype=np.int64)
+    for code, name in enumerate(ACTIONS):
+        codes[actions == name] = code
+    return codes
+
+
+def _per_replica(values, fields, n_replicas, dtype):
+    """Broadcast a dict (shared by all replicas) or an array to (n_replicas, len(fields))."""
+    if isinstance(values, dict):
+        values = [values[field] for field in fields]
+    values = np.asarray(values, dtype=dtype)
+    return np.array(np.broadcast_to(values, (n_replicas, len(fields))))
+
+
+class VectorizedSimulation:
+    """
+    Many independent replicas of the run_simulation model advanced in lock-step.
+
+    The state fields are columns of an int64 array with one row per replica,
+    demand is forecast for all replicas by one utils.BatchDemandForecast,
+    and CostManager costs and fill-rate counts are computed for all
+    replicas at once. With a utils.CostLedger of n_replicas columns as
+    `ledger`, every step's costs are also recorded there by category.
+    Raw materials in transit sit in a (lead_time + 1, n_replicas) ring buffer
+    indexed by arrival step, the array counterpart of the EventScheduler.
+    For a single replica fed the same actions and random draws it reproduces
+    main.apply_action / main.restock / main.receive_shipments exactly.
+    """
+
+    def __init__(self, n_replicas, initial_state=None, costs=None, alpha=0.3, beta=0.1,
+                 capacity=50, distributor_capacity=50, base_demand=40, lead_time=1, ledger=None):
+        self.n_replicas = n_replicas
+        if initial_state is None:
+            initial_state = DEFAULT_STATE
+        if costs is None:
+            costs = DEFAULT_COSTS
+        self.state = _per_replica(initial_state, STATE_FIELDS, n_replicas, np.int64)
+        self.costs = _per_replica(costs, COST_TYPES, n_replicas, np.float64)
+        self.capacity = capacity
+        self.distributor_capacity = distributor_capacity
+        self.base_demand = base_demand
+        self.lead_time = int(lead_time)
+        self.in_transit = np.zeros((self.lead_time + 1, n_replicas), dtype=np.int64)
+        self.dispatch = ActionDispatcher()
+
+        # DemandForecast state, one series per replica
+        self.demand_forecast = BatchDemandForecast(n_replicas, alpha=alpha, beta=beta)
+
+        self.daily_costs = np.zeros(n_replicas)
+        self.total_costs = np.zeros(n_replicas)
+        self.total_demand = np.zeros(n_replicas, dtype=np.int64)
+        self.fulfilled_demand = np.zeros(n_replicas, dtype=np.int64)
+        self.ledger = ledger
+        if ledger is not None:
+            ledger.bind_costs(self.costs)
+        self.steps = 0
+
+    @classmethod
+    def from_checkpoint(cls, data, n_replicas, **kwargs):
+        """
+        Fork a run_simulation checkpoint (see checkpoint.py) into n_replicas
+        identical replicas: state, forecast, raw materials in transit, step
+        count and costs so far. Parameters default to the checkpoint's config.
+        """
+        config = checkpoint_config(data)
+        kwargs.setdefault("costs", config.costs)
+        kwargs.setdefault("alpha", config.demand["smoothing_alpha"])
+        kwargs.setdefault("beta", config.demand["smoothing_beta"])
+        kwargs.setdefault("capacity", config.inventory["manufacturer_capacity"])
+        kwargs.setdefault("base_demand", config.demand["base"])
+        kwargs.setdefault("lead_time", config.simulation["lead_time"])
+        state = part(data, "state")
+        sim = cls(n_replicas, initial_state={field: state[field].item() for field in STATE_FIELDS}, **kwargs)
+
+        sim.demand_forecast = BatchDemandForecast.from_state(
+            part(data, "forecast"), n_replicas, window_size=config.demand["forecast_window"],
+            alpha=sim.demand_forecast.alpha, beta=sim.demand_forecast.beta
+        )
+        sim.steps = data["step"].item()
+        events = part(data, "events")
+        kinds = events["kinds"].tolist()
+        for time, kind, quantity in zip(events["time"].tolist(), events["kind"].tolist(), events["quantity"].tolist()):
+            if kinds[kind] == "raw_materials":
+                sim.in_transit[time % len(sim.in_transit)] += quantity
+        sim.total_costs[:] = data["costs.total_costs"].item()
+        sim.total_demand[:] = data["metrics.total_demand"].item()
+        sim.fulfilled_demand[:] = data["metrics.fulfilled_demand"].item()
+        return sim
+
+    def forecast(self, steps_ahead=1):
+        """DemandForecast.forecast() for every replica."""
+        return self.demand_forecast.forecast(steps_ahead)
+
+    def update_forecast(self, actual_demand):
+        """DemandForecast.update() for every replica."""
+        self.demand_forecast.update(actual_demand)
+
+    def apply_actions(self, actions):
+        """
+        Apply one action per replica in place and return the quantities moved.
+
+        Each quantity is computed from the pre-step state for every replica
+        with the tools' forward_batch() and masked by the replicas that took
+        that action, mirroring the handlers of dispatch.ActionDispatcher.
+        """
+        return self.dispatch.run_batch(self.state, encode_actions(actions), ACTIONS, self.distributor_capacity)
+
+    def fulfil_demand(self):
+        """dispatch.fulfil_demand() for every replica; counts the fill rate and returns units sold."""
+        demand = self.state[:, CUSTOMER_DEMAND].copy()
+        fulfilled, sold = fulfil_demand_batch(self.state, self.dispatch.tools.retail)
+        self.total_demand += demand
+        self.fulfilled_demand += fulfilled
+        return sold
+
+    def fill_rate(self):
+        """PerformanceMetrics fill rate (percent of demand filled on arrival) of every replica."""
+        return np.divide(self.fulfilled_demand * 100.0, self.total_demand,
+                         out=np.zeros(self.n_replicas), where=self.total_demand > 0)
+
+    def calculate_costs(self, supply, production, distribution):
+        """CostManager.calculate_costs() for every replica."""
+        s = self.state
+        inventory = (s[:, SUPPLIER_INVENTORY] + s[:, MANUFACTURER_INVENTORY]
+                     + s[:, DISTRIBUTOR_INVENTORY] + s[:, RETAIL_INVENTORY])
+        if self.ledger is not None:
+            return self.ledger.record(self.steps, supply, production, distribution,
+                                      inventory, s[:, BACKORDERS]).sum(axis=1)
+        c = self.costs
+        return (supply * c[:, 0] + production * c[:, 1] + distribution * c[:, 2]
+                + inventory * c[:, 3] + s[:, BACKORDERS] * c[:, 4])
+
+    def restock(self, resupply, customer_demand):
+        """main.restock() for every replica."""
+        s = self.state
+        s[:, MANUFACTURER_CAPACITY] = self.capacity
+        s[:, SUPPLIER_INVENTORY] += resupply
+        s[:, CUSTOMER_DEMAND] = customer_demand
+
+    def ship(self, supply):
+        """Put supplied raw materials in transit, arriving lead_time steps from now."""
+        self.in_transit[(self.steps + self.lead_time) % len(self.in_transit)] += supply
+
+    def receive_shipments(self):
+        """main.receive_shipments() for every replica: deliver what arrives this step."""
+        slot = self.steps % len(self.in_transit)
+        arrived = self.in_transit[slot].copy()
+        self.state[:, MANUFACTURER_INVENTORY] += arrived
+        self.in_transit[slot] = 0
+        return arrived
+
+    def step(self, policy, resupply, customer_demand):
+        """
+        Advance every replica one step: forecast, choose actions with
+        `policy(state_array)`, apply them, serve customers, restock, receive
+        arrived shipments and update the forecast. Returns the action codes taken.
+        """
+        self.state[:, FORECAST_DEMAND] = self.forecast()
+        codes = encode_actions(policy(self.state))
+        moved = self.apply_actions(codes)
+        self.ship(moved["supply"])
+        self.fulfil_demand()
+        self.restock(resupply, customer_demand)
+        self.receive_shipments()
+        self.update_forecast(self.state[:, CUSTOMER_DEMAND])
+
+        self.daily_costs = self.calculate_costs(**moved)
+        self.total_costs += self.daily_costs
+        self.steps += 1
+        return codes
+
+    def run(self, policy, num_steps, seed=None, resupply_range=(10, 20), demand_variation=(-5, 5),
+            block_size=256):
+        """
+        Run num_steps steps. Each replica draws its resupply and demand noise
+        from its own streams (streams.ReplicaStreams rooted at `seed`), so a
+        replica sees the same numbers however many replicas run; draws are
+        made for block_size steps at a time.
+        """
+        streams = ReplicaStreams(seed, self.n_replicas)
+        for start in range(0, num_steps, block_size):
+            steps = min(block_size, num_steps - start)
+            resupply = streams.integers("resupply", resupply_range[0], resupply_range[1], steps)
+            noise = streams.integers("demand", demand_variation[0], demand_variation[1], steps)
+            for j in range(steps):
+                self.step(policy, resupply[:, j], np.maximum(self.base_demand + noise[:, j], 0))
+        return self.state
+
+    def states(self):
+        """Current states as a list of dicts, one per replica."""
+        return [dict(zip(STATE_FIELDS, row)) for row in self.state.tolist()]
+
+    def state_batch(self):
+        """Zero-copy StateBatch view of the current states."""
+        return StateBatch(self.state)
+
+
+def predictor_policy(predictor):
+    """Policy that scores all replicas with one predictor.predict_actions() call."""
+
+    def policy(state):
+        return predictor.predict_actions([dict(zip(STATE_FIELDS, row)) for row in state.tolist()])
+
+    return policy